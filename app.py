@@ -9,32 +9,28 @@
 
 import streamlit as st
 
-# 检查并安装必要的依赖
-try:
-    import jieba
-except ImportError:
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "jieba"])
-    import jieba
+from pages import load_page
+from tokenizer_cache import prewarm
 
-# 导入页面模块
-from pages.prompt_generator import prompt_generator_page
-from pages.translation_result import translation_result_processor_page
-from pages.batch_translation import batch_translation_page
-from pages.term_lookup import term_lookup_page
-from pages.excel_replace import excel_replace_page
-from pages.excel_sreplace import excel_sreplace_page
-from pages.excel_comparison import excel_comparison_page
-from pages.excel_abc import excel_ABC_page
-from pages.danmu import danmu_page
-from pages.ytdlp_downloader import ytdlp_downloader_app
-from pages.excel_matchpro import excel_matchpro_page
-from pages.grand_match import grand_match
-from pages.jacky import jacky_page
-from pages.format_factory import format_factory_page
-from pages.file_scanner import file_scanner_page
-from pages.profile_analysis import profile_analysis_page
+# 侧边栏选项 -> 页面函数名；页面模块在首次进入该页面时才导入
+PAGES = {
+    "📝 提示词生成器": "prompt_generator_page",
+    "📊 翻译结果处理": "translation_result_processor_page",
+    "🔄 批量翻译工具": "batch_translation_page",
+    "术语查找": "term_lookup_page",
+    "excel查找替换": "excel_replace_page",
+    "excel高级替换": "excel_sreplace_page",
+    "Jacky的主页": "jacky_page",
+    "🔍 Excel表格对比": "excel_comparison_page",
+    "🔍 ExcelABC操作": "excel_ABC_page",
+    "🔍 抓弹幕（只支持nikoniko)": "danmu_page",
+    "blbl视频弹幕评论下载": "ytdlp_downloader_app",
+    "文件夹单向匹配程序": "excel_matchpro_page",
+    "模板一键匹配": "grand_match",
+    "🏭 格式工厂": "format_factory_page",
+    "📁 文件扫描仪": "file_scanner_page",
+    "📑 文献综述分析": "profile_analysis_page",
+}
 
 
 def main():
@@ -447,30 +443,16 @@ def main():
     </style>
     """, unsafe_allow_html=True)
 
+    # 后台加载 jieba 词典（缺少时自动安装），不阻塞侧边栏和页面渲染
+    prewarm(install_missing=True)
+
     # 侧边栏页面选择
     st.sidebar.title("🎮 多API Excel智能翻译工具")
     st.sidebar.markdown("---\n")
 
     page = st.sidebar.radio(
         "选择功能页面",
-        [
-            "📝 提示词生成器",
-            "📊 翻译结果处理",
-            "🔄 批量翻译工具",
-            "术语查找",
-            "excel查找替换",
-            "excel高级替换",
-            "Jacky的主页",
-            "🔍 Excel表格对比",
-            "🔍 ExcelABC操作",
-            "🔍 抓弹幕（只支持nikoniko)",
-            "blbl视频弹幕评论下载",
-            "文件夹单向匹配程序",
-            "模板一键匹配",
-            "🏭 格式工厂",
-            "📁 文件扫描仪",
-            "📑 文献综述分析"
-        ],
+        list(PAGES),
         index=0
     )
 
@@ -496,39 +478,8 @@ def main():
     - 自动批量翻译
     """)
 
-    # 根据选择显示不同页面
-    if page == "📝 提示词生成器":
-        prompt_generator_page()
-    elif page == "📊 翻译结果处理":
-        translation_result_processor_page()
-    elif page == "🔄 批量翻译工具":
-        batch_translation_page()
-    elif page == "术语查找":
-        term_lookup_page()
-    elif page == "excel查找替换":
-        excel_replace_page()
-    elif page == "excel高级替换":
-        excel_sreplace_page()
-    elif page == "Jacky的主页":
-        jacky_page()
-    elif page == "🔍 Excel表格对比":
-        excel_comparison_page()
-    elif page == "🔍 ExcelABC操作":
-        excel_ABC_page()
-    elif page == "🔍 抓弹幕（只支持nikoniko)":
-        danmu_page()
-    elif page == "blbl视频弹幕评论下载":
-        ytdlp_downloader_app()
-    elif page == "文件夹单向匹配程序":
-        excel_matchpro_page()
-    elif page == "模板一键匹配":
-        grand_match()
-    elif page == "🏭 格式工厂":
-        format_factory_page()
-    elif page == "📁 文件扫描仪":
-        file_scanner_page()
-    elif page == "📑 文献综述分析":
-        profile_analysis_page()
+    # 根据选择导入并显示对应页面
+    load_page(PAGES[page])()
 
 
 if __name__ == "__main__":
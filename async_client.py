@@ -0,0 +1,236 @@
+# async_client.py - 基于 asyncio 的并发 chat/completions 客户端
+#
+# 用一个事件循环承载成百上千个进行中的请求，并发量由槽位队列（等价于信号量）控制，
+# 重试退避使用 asyncio.sleep，不阻塞任何线程。
+
+import asyncio
+import random
+import ssl
+
+import certifi
+import httpx
+
+from chat_stream import DEFAULT_STREAM_IDLE_TIMEOUT, STREAM_CONNECT_TIMEOUT, aread_chat_stream
+from token_budget import get_token_counter
+
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_TIMEOUT = 60.0
+# 每个 httpx.AsyncClient 承载的连接数上限。httpcore 的连接池在每次请求进出时都会
+# 遍历全部连接和排队请求，单个池放几百个连接会让事件循环被 CPU 占满，因此分片。
+CONNECTIONS_PER_SHARD = 8
+
+
+def chat_completions_url(base_url):
+    """把 OpenAI 风格的 base_url（…/v1）转换为 chat/completions 完整地址"""
+    base_url = base_url.rstrip("/")
+    if base_url.endswith("/chat/completions"):
+        return base_url
+    return f"{base_url}/chat/completions"
+
+
+class AsyncChatClient:
+    """异步 chat/completions 客户端
+
+    max_concurrency: 同时进行中的请求上限
+    timeout: 单个请求的超时（秒），超时后按重试逻辑处理
+    rate_limiter: 可选的共享 RateLimiter，发请求前异步申请预算，并接收响应状态反馈
+    usage_stats: 可选的 UsageStats，记录每次成功请求的 Token 用量
+    stream: 流式接收回复，此时不再限制总耗时，两块数据之间超过 stream_idle_timeout 秒才算超时
+    stream_progress: 可选的 StreamProgress，上报流式接收进度
+    """
+
+    def __init__(self, api_url, api_key, model=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, max_retries=3, rate_limiter=None, usage_stats=None,
+                 stream=False, stream_idle_timeout=DEFAULT_STREAM_IDLE_TIMEOUT, stream_progress=None):
+        self.api_url = api_url
+        self.model = model
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter
+        self.usage_stats = usage_stats
+        self.stream = stream
+        self.stream_idle_timeout = stream_idle_timeout
+        self.stream_progress = stream_progress
+
+        self._slots = None
+        self._clients = []
+        self._tasks = set()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def open(self):
+        if self._clients:
+            return
+        shard_count = -(-self.max_concurrency // CONNECTIONS_PER_SHARD)
+        # 并发槽位队列代替信号量：每个槽位绑定一个分片，分片内的请求数不会超过其连接数
+        self._slots = asyncio.Queue()
+        for slot in range(self.max_concurrency):
+            self._slots.put_nowait(slot % shard_count)
+        # 所有分片共用一个 SSL 上下文，避免每个客户端重复加载 CA 证书
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        for shard in range(shard_count):
+            size = len(range(shard, self.max_concurrency, shard_count))
+            limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+            self._clients.append(httpx.AsyncClient(limits=limits, timeout=self.timeout, verify=ssl_context))
+
+    async def aclose(self):
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.aclose()
+
+    async def chat(self, messages, model=None, temperature=0.2, max_tokens=None, timeout=None, max_retries=None):
+        """发送一次请求（含重试），返回回复文本；最终失败时抛出最后一次异常
+
+        max_retries 为 None 时使用客户端默认值；调用方自行处理重试时可传 0。
+        """
+        await self.open()
+        data = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature
+        }
+        if max_tokens:
+            data["max_tokens"] = max_tokens
+        if self.stream:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}  # 最后一块返回 usage
+        request_timeout = timeout or self.timeout
+        counter = get_token_counter()
+        estimated_tokens = sum(counter.count(m.get("content", "")) for m in messages)
+
+        retries = self.max_retries if max_retries is None else max_retries
+        delay = 1.0
+        for attempt in range(retries + 1):
+            try:
+                shard = await self._slots.get()
+                try:
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.acquire_async(estimated_tokens)
+                    if self.stream:
+                        content, result = await self._stream_chat(self._clients[shard], data)
+                    else:
+                        response = await asyncio.wait_for(
+                            self._clients[shard].post(self.api_url, headers=self.headers, json=data, timeout=request_timeout),
+                            timeout=request_timeout
+                        )
+                finally:
+                    self._slots.put_nowait(shard)
+                if not self.stream:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.observe(response.status_code, response.headers)
+                    response.raise_for_status()
+                    result = response.json()
+                    content = result["choices"][0]["message"]["content"].strip()
+                if self.usage_stats is not None:
+                    self.usage_stats.record_response(
+                        result, "".join(str(m.get("content", "")) for m in messages), content
+                    )
+                return content
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.rate_limiter is not None and isinstance(e, (httpx.TransportError, asyncio.TimeoutError)):
+                    # HTTP 错误已在上面按状态码记录，这里只记录超时 / 网络错误
+                    self.rate_limiter.observe_exception(e)
+                if attempt >= retries:
+                    raise
+                # 退避期间已归还槽位，其他请求可以继续
+                if self.rate_limiter is not None:
+                    await asyncio.sleep(self.rate_limiter.retry_delay(attempt))
+                else:
+                    await asyncio.sleep(min(delay, 60) + random.uniform(0, 0.5))
+                    delay *= 2
+
+    async def _stream_chat(self, client, data):
+        """流式发送一次请求，返回 (回复文本, 含 usage 的结果)；读超时即两块数据之间的空闲超时"""
+        timeout = httpx.Timeout(self.stream_idle_timeout, connect=STREAM_CONNECT_TIMEOUT)
+        progress = self.stream_progress
+        stream_id = progress.start() if progress is not None else None
+        on_delta = (lambda received: progress.update(stream_id, received)) if progress is not None else None
+        try:
+            async with client.stream("POST", self.api_url, headers=self.headers, json=data, timeout=timeout) as response:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.observe(response.status_code, response.headers)
+                response.raise_for_status()
+                reader = await aread_chat_stream(response.aiter_lines(), on_delta)
+                if not reader.complete:
+                    # 连接在结束标志之前断开，按网络错误重试
+                    raise httpx.RemoteProtocolError("流式回复在结束标志之前中断，回复不完整")
+        finally:
+            if progress is not None:
+                progress.finish(stream_id)
+        return reader.content.strip(), reader.result()
+
+    async def run_many(self, requests, on_result=None):
+        """并发执行多个请求，按输入顺序返回结果列表
+
+        requests: [{"messages": [...], "model": ..., ...}, ...]（参数同 chat）
+        on_result(index, result, error): 每个请求完成时回调（在事件循环线程中执行）
+        单个请求的失败以异常对象的形式放入结果列表，不影响其他请求。
+        """
+        results = [None] * len(requests)
+
+        async def run_one(index, request):
+            try:
+                result, error = await self.chat(**request), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result, error = None, e
+            results[index] = error if error is not None else result
+            if on_result is not None:
+                on_result(index, result, error)
+
+        tasks = [asyncio.ensure_future(run_one(i, request)) for i, request in enumerate(requests)]
+        self._tasks.update(tasks)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            self._tasks.difference_update(tasks)
+        return results
+
+    def cancel(self):
+        """取消所有进行中的请求（需在事件循环线程中调用）"""
+        for task in list(self._tasks):
+            task.cancel()
+
+
+def run_chat_requests(api_url, api_key, requests, model=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                      timeout=DEFAULT_TIMEOUT, max_retries=3, rate_limiter=None,
+                      on_result=None, cancel_event=None):
+    """同步入口：在当前线程中启动事件循环执行所有请求，返回按输入顺序排列的结果
+
+    cancel_event: 可选的 threading.Event，被设置后取消剩余请求（已取消的项为 CancelledError）
+    """
+    async def main():
+        async with AsyncChatClient(api_url, api_key, model, max_concurrency, timeout,
+                                   max_retries, rate_limiter) as client:
+            run_task = asyncio.ensure_future(client.run_many(requests, on_result))
+            if cancel_event is None:
+                return await run_task
+
+            while not run_task.done():
+                if cancel_event.is_set():
+                    client.cancel()
+                    break
+                await asyncio.sleep(0.1)
+            try:
+                return await run_task
+            except asyncio.CancelledError:
+                return [asyncio.CancelledError()] * len(requests)
+
+    return asyncio.run(main())
+
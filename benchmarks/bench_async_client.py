@@ -0,0 +1,138 @@
+# benchmarks/bench_async_client.py - 异步客户端基准测试
+#
+# 启动本地桩服务器（模拟 chat/completions 接口，每个请求注入固定延迟），对比：
+#   1) 线程池 + 共享 requests.Session（每个进行中的请求占用一个线程）
+#   2) async_client.AsyncChatClient（单线程事件循环，信号量限制并发）
+# 在相同并发上限下的总耗时、吞吐和进程线程数峰值。
+#
+# 运行: python benchmarks/bench_async_client.py [请求次数] [并发上限] [延迟毫秒]
+
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_client import run_chat_requests
+from http_client import get_http_session
+
+RESPONSE_BODY = json.dumps({
+    "choices": [{"message": {"role": "assistant", "content": "Hello"}}]
+}).encode("utf-8")
+
+
+class LatencyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.2
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # 默认 backlog 只有 5，高并发建连时会被重置
+
+
+def serve(latency, port_queue):
+    LatencyHandler.latency = latency
+    server = StubServer(("127.0.0.1", 0), LatencyHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_stub_server(latency):
+    """在独立进程中启动桩服务器，避免服务端线程与客户端争用 GIL 干扰测量"""
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(latency, port_queue), daemon=True)
+    process.start()
+    return process, port_queue.get(timeout=10)
+
+
+def peak_thread_sampler():
+    """后台采样本进程线程数峰值，返回 (停止函数, 结果容器)"""
+    result = {"peak": 0}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            result["peak"] = max(result["peak"], threading.active_count() - 1)
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+
+    def stop_sampling():
+        stop.set()
+        thread.join()
+
+    return stop_sampling, result
+
+
+def payload():
+    return {"model": "stub", "messages": [{"role": "user", "content": "你好"}]}
+
+
+def run_threads(url, count, concurrency):
+    session = get_http_session(pool_maxsize=concurrency)
+
+    def one_request(_):
+        response = session.post(url, json=payload(), timeout=30)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one_request, range(count)))
+
+
+def run_async(url, count, concurrency):
+    requests_list = [{"messages": payload()["messages"]} for _ in range(count)]
+    return run_chat_requests(url, "stub", requests_list, model="stub",
+                             max_concurrency=concurrency, timeout=30, max_retries=0)
+
+
+def measure(name, func, url, count, concurrency):
+    stop_sampling, threads = peak_thread_sampler()
+    start = time.perf_counter()
+    results = func(url, count, concurrency)
+    total = time.perf_counter() - start
+    stop_sampling()
+    failures = sum(1 for r in results if not isinstance(r, str))
+    print(f"{name:<10} 总耗时 {total:.2f}s  吞吐 {count / total:.1f} req/s  "
+          f"客户端线程峰值 {threads['peak']}  失败 {failures}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    server, port = start_stub_server(latency_ms / 1000.0)
+    url = f"http://127.0.0.1:{port}/v1/chat/completions"
+    print(f"桩服务器: {url}  请求次数: {count}  并发上限: {concurrency}  注入延迟: {latency_ms:.0f} ms")
+    print(f"理论下限: {count / concurrency * latency_ms / 1000:.2f}s")
+
+    measure("线程池", run_threads, url, count, concurrency)
+    measure("asyncio", run_async, url, count, concurrency)
+
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
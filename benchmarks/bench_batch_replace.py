@@ -0,0 +1,120 @@
+# benchmarks/bench_batch_replace.py - 对照表批量替换基准测试
+#
+# 生成一批本地化表格和一份 旧词→新词 对照表，对比：
+#   - 原来的做法：每组词语各走一遍 excel_sreplace 的流程（扫描整个文件夹，命中的工作簿
+#     逐个加载、替换、保存）
+#   - excel_batch：所有词语编译成一个匹配器，每个文件扫描一次，每个工作簿只保存一次
+# 并校验两种方式替换后的全部单元格内容完全一致，以及每组词语的替换次数统计正确。
+#
+# 运行: python benchmarks/bench_batch_replace.py [文件数] [词语组数] [每个文件行数]
+
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+
+from bench_term_loaders import CJK_CHARS
+from excel_batch import TermReplacer, load_term_pairs, replace_in_workbook, scan_term_pairs, term_pair_report
+from excel_scan import scan_files, substring_matcher
+
+
+def make_corpus(folder, file_count, pair_count, rows, seed=42):
+    rng = random.Random(seed)
+    olds = [f"旧称{i:03d}" for i in range(pair_count)]
+    for i in range(file_count):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(["ID", "中文", "English", "数量"])
+        for r in range(rows):
+            zh = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(4, 12)))
+            if rng.random() < 0.3:
+                zh += rng.choice(olds) + "".join(rng.choice(CJK_CHARS) for _ in range(3))
+            ws.append([f"TXT_{i}_{r}", zh, f"Item {r}", r])
+        wb.save(folder / f"loc_{i:04d}.xlsx")
+
+    table = openpyxl.Workbook()
+    table.active.append(["搜索词", "替换为"])
+    for i, old in enumerate(olds):
+        table.active.append([old, f"新称{i:03d}"])
+    table.save(folder / "pairs.xlsx")
+
+
+def legacy_replace(files, pairs):
+    """逐组词语：扫描整个文件夹，再逐个加载、替换、保存命中的工作簿"""
+    for search, replace in pairs:
+        for path, sheet_names, hits, error in scan_files(files, substring_matcher(search), data_only=False,
+                                                         use_processes=False):
+            if not hits:
+                continue
+            wb = openpyxl.load_workbook(path)
+            for sheet_idx, row_idx, col_idx, _, _ in hits:
+                cell = wb[sheet_names[sheet_idx]].cell(row=row_idx, column=col_idx)
+                cell.value = re.sub(re.escape(search), replace, str(cell.value), flags=re.IGNORECASE)
+            wb.save(path)
+            wb.close()
+
+
+def batch_replace(files, pairs):
+    replacer = TermReplacer(pairs)
+    found, errors = scan_term_pairs(files, replacer)
+    assert not errors, errors
+    replaced = {}
+    for path, cells in found.items():
+        counts = replace_in_workbook(path, [(sheet, row, col) for sheet, row, col, _, _ in cells],
+                                     replacer, backup=False)
+        for pair_idx, count in counts.items():
+            replaced[pair_idx] = replaced.get(pair_idx, 0) + count
+    return term_pair_report(replacer, found, replaced)
+
+
+def snapshot(files):
+    values = {}
+    for path in files:
+        wb = openpyxl.load_workbook(path, read_only=True)
+        values[Path(path).name] = [row for ws in wb for row in ws.iter_rows(values_only=True)]
+        wb.close()
+    return values
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    pair_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = Path(tmp) / "legacy"
+        batch_dir = Path(tmp) / "batch"
+        for folder in (legacy_dir, batch_dir):
+            folder.mkdir()
+            make_corpus(folder, file_count, pair_count, rows)
+        pairs = load_term_pairs(str(batch_dir / "pairs.xlsx"))
+        legacy_files = sorted(str(f) for f in legacy_dir.glob("loc_*.xlsx"))
+        batch_files = sorted(str(f) for f in batch_dir.glob("loc_*.xlsx"))
+        print(f"文件: {file_count}  每个文件 {rows} 行  对照表: {len(pairs)} 组")
+
+        start = time.perf_counter()
+        legacy_replace(legacy_files, pairs)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        report = batch_replace(batch_files, pairs)
+        batch_time = time.perf_counter() - start
+
+        assert snapshot(legacy_files) == snapshot(batch_files), "对照表批量替换结果与逐组替换不一致"
+        assert (report["替换次数"] == report["命中次数"]).all()
+        assert not any(cell for row in snapshot(batch_files).values() for r in row for cell in r
+                       if isinstance(cell, str) and "旧称" in cell)
+        print(f"逐组扫描替换:     {legacy_time:.2f}s")
+        print(f"对照表一次替换:   {batch_time:.2f}s  加速比 {legacy_time / batch_time:.1f}x"
+              f"（结果一致，共替换 {report['替换次数'].sum()} 处）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_context_window.py - 上下文历史基准测试
+#
+# 对比旧版上下文（list + pop(0) 淘汰，每行重新渲染全部 N 条记录）与 ContextWindow
+# 环形缓冲区（加入时渲染一次，构建时只拼接缓存片段）的耗时，校验渲染结果一致，
+# 并展示 Token 预算对长文本上下文长度的限制效果。
+#
+# 运行: python benchmarks/bench_context_window.py [行数] [上下文条数]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_window import ContextWindow
+
+
+class LegacyContext:
+    """旧版实现（与重构前的 add_to_context / build_context_prompt 一致）"""
+
+    def __init__(self, context_size):
+        self.context_size = context_size
+        self.history = []
+
+    def add(self, original, translation, role):
+        self.history.append((original, translation, role))
+        if len(self.history) > self.context_size:
+            self.history.pop(0)
+
+    def build(self, language):
+        if not self.history:
+            return ""
+        context_str = f"\n\n### 重要上下文参考（{language}翻译）：\n"
+        for i, (orig, trans, role) in enumerate(self.history, 1):
+            role_info = f" [{role}]" if role else ""
+            context_str += f"前文{i}{role_info}:\n原文: {orig}\n{language}译文: {trans}\n\n"
+        return context_str
+
+
+def make_rows(row_count, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(row_count):
+        length = rng.choice([10, 20, 40, 80, 600])  # 偶尔出现很长的段落
+        rows.append(("台词" * length, "line " * length, rng.choice(["", "角色A", "角色B"])))
+    return rows
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    context_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = make_rows(row_count)
+    print(f"行数: {row_count}  上下文条数: {context_size}")
+
+    legacy = LegacyContext(context_size)
+    start = time.perf_counter()
+    legacy_prompts = []
+    for original, translation, role in rows:
+        legacy_prompts.append(legacy.build("英文"))
+        legacy.add(original, translation, role)
+    legacy_time = time.perf_counter() - start
+
+    window = ContextWindow(context_size)
+    start = time.perf_counter()
+    window_prompts = []
+    for original, translation, role in rows:
+        window_prompts.append(window.render("英文"))
+        window.append(original, translation, role, "英文")
+    window_time = time.perf_counter() - start
+
+    assert legacy_prompts == window_prompts, "上下文提示不一致"
+    print(f"旧版 list + 全量渲染: {legacy_time * 1e6 / row_count:.1f} µs/行")
+    print(f"环形缓冲 + 片段缓存: {window_time * 1e6 / row_count:.1f} µs/行  加速比 {legacy_time / max(window_time, 1e-9):.1f}x（结果一致）")
+
+    budget = 2000
+    budgeted = ContextWindow(context_size, max_tokens=budget)
+    lengths = []
+    for original, translation, role in rows:
+        lengths.append(len(budgeted.render("英文")))
+        budgeted.append(original, translation, role, "英文")
+    print(f"上下文平均长度: 不限 {sum(map(len, window_prompts)) / row_count:.0f} 字符，"
+          f"预算 {budget} Token {sum(lengths) / row_count:.0f} 字符（最大 {max(lengths)}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# benchmarks/bench_excel_index.py - Excel 全文索引搜索基准测试
+#
+# 生成一批本地化表格（中文 / 日文 / 英文混合，默认 200 个文件），对比：
+#   - multithreaded_search：每次搜索都重新打开全部工作簿逐格匹配
+#   - 全文索引：首次建立索引的耗时、之后每次搜索（增量检查 + 索引查找 + 候选校验）的耗时
+# 并校验：
+#   - 各种搜索词（单字、中日文子串、大小写不敏感 / 敏感、全词匹配、无结果）下两种方式的结果完全一致
+#   - 修改一个文件后只重新解析该文件，搜索结果反映修改；删除文件后其索引被清除
+#
+# 运行: python benchmarks/bench_excel_index.py [文件数] [每个文件行数]
+
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+
+from bench_term_loaders import CJK_CHARS
+from excel_index import ExcelIndex
+from pages.excel_replace import ExcelSearchReplace, multithreaded_search
+
+KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのアイウエオカキクケコ"
+WORDS = ["Sword", "shield", "POTION", "Quest", "Dragon", "Σοφία", "Ωmega", "straße", "İstanbul"]
+
+QUERIES = [
+    ("sword", False, False),
+    ("Sword", True, False),
+    ("quest", False, True),
+    ("ΣΟΦΊΑ", False, False),
+    ("istanbul", False, False),
+    ("あい", False, False),
+    ("ア", False, False),
+    ("龍", False, False),
+    ("不存在的词语", False, False),
+]
+
+
+class _Silent:
+    def progress(self, value):
+        pass
+
+    def text(self, value):
+        pass
+
+
+def make_corpus(folder, file_count, rows, seed=42):
+    rng = random.Random(seed)
+    for i in range(file_count):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "文本"
+        ws.append(["ID", "中文", "日本語", "English"])
+        for r in range(rows):
+            zh = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(4, 20)))
+            ja = "".join(rng.choice(KANA) for _ in range(rng.randint(4, 12)))
+            en = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+            ws.append([f"TXT_{i}_{r}", zh, ja, en if rng.random() < 0.3 else rng.randint(0, 99999)])
+        wb.create_sheet("备注").append(["龍" if rng.random() < 0.1 else "说明", None, "Dragon quest"])
+        wb.save(folder / f"loc_{i:04d}.xlsx")
+
+
+def legacy_search(tool, term, case_sensitive, whole_word):
+    total = multithreaded_search(tool, term, case_sensitive, whole_word, _Silent(), _Silent())
+    return tool.search_results, total
+
+
+def build_regex(term, case_sensitive, whole_word):
+    pattern = r'\b' + re.escape(term) + r'\b' if whole_word else re.escape(term)
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "excel"
+        folder.mkdir()
+        make_corpus(folder, file_count, rows)
+        tool = ExcelSearchReplace()
+        tool.find_excel_files(folder)
+        print(f"文件: {len(tool.excel_files)}  每个文件 {rows} 行  搜索词: {len(QUERIES)} 个")
+
+        start = time.perf_counter()
+        expected = [legacy_search(tool, *query) for query in QUERIES]
+        legacy_time = time.perf_counter() - start
+
+        index = ExcelIndex(os.path.join(tmp, "excel_index.db"))
+        start = time.perf_counter()
+        index.refresh(tool.excel_files, root=folder)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        indexed = []
+        for term, case_sensitive, whole_word in QUERIES:
+            index.refresh(tool.excel_files, root=folder)
+            indexed.append(index.search(tool.excel_files, build_regex(term, case_sensitive, whole_word), term))
+        indexed_time = time.perf_counter() - start
+
+        for query, (results, total), (legacy_results, legacy_total) in zip(QUERIES, indexed, expected):
+            assert total == legacy_total and results == legacy_results, f"索引搜索结果与逐个扫描不一致: {query}"
+        print(f"逐个打开工作簿扫描: {legacy_time:.2f}s（每次搜索 {legacy_time / len(QUERIES):.2f}s）")
+        print(f"首次建立索引:       {build_time:.2f}s")
+        print(f"索引搜索:           {indexed_time:.2f}s（每次搜索 {indexed_time / len(QUERIES):.3f}s，"
+              f"含增量检查），加速比 {legacy_time / max(indexed_time, 1e-9):.0f}x，结果一致")
+
+        # 修改一个文件：只重新解析该文件
+        changed = tool.excel_files[0]
+        wb = openpyxl.load_workbook(changed)
+        wb["文本"]["B2"] = "新增的独特词条"
+        wb.save(changed)
+        stats = index.refresh(tool.excel_files, root=folder)
+        assert stats['indexed'] == 1 and stats['unchanged'] == len(tool.excel_files) - 1, stats
+        results, total = index.search(tool.excel_files, build_regex("独特词条", False, False), "独特词条")
+        assert total == 1 and str(changed) in results, "修改后的内容未进入索引"
+
+        # 删除一个文件：其索引被清除
+        os.remove(changed)
+        tool.find_excel_files(folder)
+        stats = index.refresh(tool.excel_files, root=folder)
+        assert stats['removed'] == 1 and index.stats()['files'] == len(tool.excel_files), stats
+        print(f"增量更新正常：修改 1 个文件只重新解析 1 个，删除的文件已移出索引（{index.stats()}）")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_glossary_snapshot.py - 术语库快照重载基准测试
+#
+# 对比从 DataFrame 完整加载多语言术语库（load_term_base_multilang）与
+# 从预编译快照加载（磁盘 pickle / 进程内缓存）的耗时，并校验匹配结果一致。
+#
+# 运行: python benchmarks/bench_glossary_snapshot.py [术语行数] [语言数]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jieba
+
+import glossary_snapshot
+from bench_term_loaders import CJK_CHARS, make_glossary
+from glossary_snapshot import load_snapshot, save_snapshot, snapshot_key
+from translator import MultiAPIExcelTranslator
+
+
+def new_translator():
+    return MultiAPIExcelTranslator("", "Custom", "http://localhost", "bench")
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    language_count = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+    df, languages = make_glossary(row_count, language_count)
+    target_cols = {language: language for language in languages}
+    jieba.setLogLevel(60)
+    jieba.initialize()
+    print(f"术语行数: {len(df)}  语言数: {len(languages)}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        key = snapshot_key("0" * 64, "原文", target_cols)
+
+        built = new_translator()
+        start = time.perf_counter()
+        built.load_term_base_multilang(df, "原文", target_cols)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        path = save_snapshot(built.glossary_snapshot(key), directory)
+        save_time = time.perf_counter() - start
+
+        # 模拟新进程：清空进程内缓存后从磁盘读取
+        glossary_snapshot._snapshots.clear()
+        glossary_snapshot._registered_words.clear()
+        reloaded = new_translator()
+        start = time.perf_counter()
+        reloaded.load_glossary_snapshot(load_snapshot(key, directory))
+        disk_time = time.perf_counter() - start
+
+        shared = new_translator()
+        start = time.perf_counter()
+        shared.load_glossary_snapshot(load_snapshot(key, directory))
+        memory_time = time.perf_counter() - start
+
+        rng = random.Random(7)
+        samples = [entry['source'] for entry in rng.sample(built.term_base_dict[languages[0]], 200)]
+        texts = ["，".join(rng.sample(samples, 4)) + "".join(rng.choice(CJK_CHARS) for _ in range(6)) for _ in range(200)]
+        for language in languages:
+            for text in texts:
+                expected = built.find_matched_terms(text, language)
+                assert reloaded.find_matched_terms(text, language) == expected, "匹配结果不一致"
+                assert shared.find_matched_terms(text, language) == expected, "匹配结果不一致"
+
+        print(f"完整加载（清洗 + 分词注册 + 编译）: {build_time:.2f}s")
+        print(f"写入快照: {save_time:.2f}s（{os.path.getsize(path) / 1024 / 1024:.1f} MB）")
+        print(f"快照加载（磁盘，含分词注册）:     {disk_time * 1000:.0f} ms")
+        print(f"快照加载（进程内共享）:           {memory_time * 1000:.2f} ms（匹配结果一致）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_http_pool.py - 连接池基准测试
+#
+# 启动本地 HTTP/1.1 桩服务器（模拟 chat/completions 接口），对比：
+#   1) 每次 requests.post（旧版 _translate_single_attempt 的做法，每次新建连接）
+#   2) http_client.get_http_session() 共享连接池（keep-alive）
+# 的单请求平均延迟。可选参数：请求次数、并发线程数。
+#
+# 运行: python benchmarks/bench_http_pool.py [请求次数] [并发线程数]
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from http_client import get_http_session
+
+RESPONSE_BODY = json.dumps({
+    "choices": [{"message": {"role": "assistant", "content": "Hello"}}]
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    disable_nagle_algorithm = True  # 避免响应头与响应体分包时触发延迟 ACK
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def run(post, url, count, workers):
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "你好"}]}
+    latencies = []
+    lock = threading.Lock()
+
+    def one_request(_):
+        start = time.perf_counter()
+        response = post(url, json=payload, timeout=10)
+        response.raise_for_status()
+        response.json()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one_request, range(count)))
+    total = time.perf_counter() - start
+    return total, latencies
+
+
+def report(name, total, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:<14} 总耗时 {total:.2f}s  平均 {statistics.mean(latencies) * 1000:.2f} ms  "
+          f"p50 {p50:.2f} ms  p95 {p95:.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    server = start_stub_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    print(f"桩服务器: {url}  请求次数: {count}  并发: {workers}")
+
+    total, latencies = run(requests.post, url, count, workers)
+    report("无连接池", total, latencies)
+
+    session = get_http_session(pool_maxsize=workers)
+    total, latencies = run(session.post, url, count, workers)
+    report("共享连接池", total, latencies)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
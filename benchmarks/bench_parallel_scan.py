@@ -0,0 +1,117 @@
+# benchmarks/bench_parallel_scan.py - 多进程工作簿解析基准测试
+#
+# 生成几百个本地化表格（大部分是小文件，另有几个超大工作簿），对比：
+#   - excel_replace 原来的 multithreaded_search（线程池，受 GIL 限制）与多进程 multiprocess_search
+#   - excel_sreplace 原来的逐个文件串行扫描与 scan_files 多进程扫描
+# 并校验两种方式的匹配结果完全一致。多进程的耗时包含进程池启动；本机只有 1 个 CPU 时
+# 多进程不会更快，加速比取决于可用 CPU 数。
+#
+# 运行: python benchmarks/bench_parallel_scan.py [小文件数] [进程数]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+
+from bench_term_loaders import CJK_CHARS
+from excel_scan import plan_chunks, scan_files, substring_matcher
+from pages.excel_replace import ExcelSearchReplace, multiprocess_search, multithreaded_search
+from tokenizer_cache import available_cpus
+
+WORDS = ["Sword", "shield", "POTION", "Quest", "Dragon"]
+
+
+class _Silent:
+    def progress(self, value):
+        pass
+
+    def text(self, value):
+        pass
+
+
+def make_corpus(folder, small_count, giant_count=3, seed=42):
+    rng = random.Random(seed)
+    sizes = [rng.randint(20, 200) for _ in range(small_count)] + [8000] * giant_count
+    for i, rows in enumerate(sizes):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(["ID", "中文", "English", "公式"])
+        for r in range(rows):
+            zh = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(4, 20)))
+            en = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+            ws.append([f"TXT_{i}_{r}", zh, en, f"=LEN(B{r + 2})" if r % 50 == 0 else None])
+        wb.save(folder / f"loc_{i:04d}.xlsx")
+
+
+def legacy_sreplace_scan(excel_files, search_term, case_sensitive):
+    """excel_sreplace 页面原来的串行扫描"""
+    results = {}
+    for file_path in excel_files:
+        wb = openpyxl.load_workbook(file_path, read_only=True)
+        file_matches = []
+        for sheet_name in wb.sheetnames:
+            sheet = wb[sheet_name]
+            for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                for col_idx, cell_value in enumerate(row, start=1):
+                    if cell_value is not None:
+                        cell_str = str(cell_value)
+                        found = search_term in cell_str if case_sensitive else search_term.lower() in cell_str.lower()
+                        if found:
+                            file_matches.append({'sheet': sheet_name, 'row': row_idx, 'col': col_idx, 'value': cell_str})
+        if file_matches:
+            results[str(file_path)] = file_matches
+        wb.close()
+    return results
+
+
+def main():
+    small_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else max(available_cpus(), 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        make_corpus(folder, small_count)
+        tool = ExcelSearchReplace()
+        tool.find_excel_files(folder)
+        chunks = plan_chunks(tool.excel_files, workers)
+        total_mb = sum(f.stat().st_size for f in tool.excel_files) / 1e6
+        print(f"文件: {len(tool.excel_files)}（{total_mb:.1f} MB）  进程数: {workers}（本机可用 CPU: {available_cpus()}）"
+              f"  分块: {len(chunks)}（首块含最大的 {len(chunks[0])} 个文件，末块含 {len(chunks[-1])} 个小文件）")
+
+        start = time.perf_counter()
+        multithreaded_search(tool, "sword", False, False, _Silent(), _Silent())
+        thread_time = time.perf_counter() - start
+        expected = tool.search_results
+
+        start = time.perf_counter()
+        multiprocess_search(tool, "sword", False, False, _Silent(), _Silent())
+        process_time = time.perf_counter() - start
+        assert tool.search_results == expected, "多进程搜索结果与多线程不一致"
+        print(f"excel_replace 多线程搜索: {thread_time:.2f}s")
+        print(f"excel_replace 多进程搜索: {process_time:.2f}s  加速比 {thread_time / process_time:.1f}x（结果一致）")
+
+        start = time.perf_counter()
+        expected = legacy_sreplace_scan(tool.excel_files, "LEN", True)
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = {}
+        for path, sheet_names, hits, error in scan_files(tool.excel_files, substring_matcher("LEN", True),
+                                                         data_only=False, workers=workers):
+            assert error is None, error
+            if hits:
+                found[path] = [{'sheet': sheet_names[s], 'row': r, 'col': c, 'value': v} for s, r, c, v, _ in hits]
+        process_time = time.perf_counter() - start
+        assert found == expected and found, "多进程扫描结果与串行扫描不一致"
+        print(f"excel_sreplace 串行扫描:  {serial_time:.2f}s")
+        print(f"excel_sreplace 多进程扫描: {process_time:.2f}s  加速比 {serial_time / process_time:.1f}x（结果一致）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_prompt_assembly.py - 单行提示词拼接基准测试
+#
+# 对比旧版 build_translation_prompt（每行重新生成语言规范、查找角色性格、拼接整段提示词）
+# 与缓存静态前缀 / 角色信息块后只拼接动态部分的耗时，并校验：
+#   - 同一语言和自定义要求下，所有提示词共享逐字节相同的静态前缀
+#   - 各段内容与旧版一致（仅调整了段落顺序，静态部分移到最前）
+#
+# 运行: python benchmarks/bench_prompt_assembly.py [行数] [角色数] [说话人数]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from bench_role_index import make_roles
+from translator import MultiAPIExcelTranslator
+
+LANGUAGES = ["英文", "日文", "韩文", "法文"]
+CUSTOM_REQUIREMENTS = "保持游戏风格，人名使用音译。"
+
+
+def legacy_build_translation_prompt(translator, text, target_language, custom_requirements="", role=None):
+    """旧版实现（与重构前的 build_translation_prompt 一致，不含上下文和术语）"""
+    role_personality_prompt = translator.build_role_personality_prompt(role) if role else ""
+    language_requirements = translator.get_language_specific_requirements(target_language)
+
+    role_prompt = ""
+    if role and not pd.isna(role) and str(role).strip() != "":
+        role_prompt = f"\n当前文本的说话人: {role}\n"
+
+    return f"""
+请将以下文本翻译成{target_language}。
+
+## 角色信息：
+{role_prompt}{role_personality_prompt}
+
+## {target_language}翻译规范（优先级最低）：
+{language_requirements}
+
+## 用户自定义要求（优先级第一高）：
+{custom_requirements}
+
+## 待翻译文本：
+{text}
+"""
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    role_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    speaker_count = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+
+    # 剧本中的说话人反复出现：从有限的说话人集合中抽取每行的说话人
+    roles, speakers = make_roles(role_count, speaker_count)
+    rng = random.Random(7)
+    rows = [
+        (f"第{i}行台词" * rng.randint(1, 5), rng.choice(speakers), rng.choice(LANGUAGES))
+        for i in range(row_count)
+    ]
+
+    translator = MultiAPIExcelTranslator("", "Custom", "http://localhost", "bench")
+    translator.role_personality_dict = {role: f"性格描述{i}" * 10 for i, role in enumerate(roles)}
+    translator.enable_fuzzy_match = True
+    print(f"行数: {len(rows)}  官方角色: {len(roles)}  说话人: {len(set(role for _, role, _ in rows))}")
+
+    start = time.perf_counter()
+    for text, role, language in rows:
+        legacy_build_translation_prompt(translator, text, language, CUSTOM_REQUIREMENTS, role)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prompts = [
+        translator.build_translation_prompt(text, language, CUSTOM_REQUIREMENTS, role)
+        for text, role, language in rows
+    ]
+    cached_time = time.perf_counter() - start
+
+    for (text, role, language), prompt in zip(rows[:2000], prompts):
+        prefix = translator.get_static_prompt_prefix(language, CUSTOM_REQUIREMENTS)
+        assert prompt.startswith(prefix), "静态前缀不一致"
+        legacy = legacy_build_translation_prompt(translator, text, language, CUSTOM_REQUIREMENTS, role)
+        role_section = legacy[legacy.index("## 角色信息："):legacy.index(f"## {language}翻译规范")].rstrip("\n")
+        assert role_section in prompt, "角色信息不一致"
+
+    print(f"旧版逐行拼接: {legacy_time * 1e6 / len(rows):.1f} µs/行")
+    print(f"缓存静态部分: {cached_time * 1e6 / len(rows):.1f} µs/行  加速比 {legacy_time / max(cached_time, 1e-9):.0f}x")
+    print(f"静态前缀 {len(translator.get_static_prompt_prefix(LANGUAGES[0], CUSTOM_REQUIREMENTS))} 字符，同一语言下逐字节相同")
+
+
+if __name__ == "__main__":
+    main()
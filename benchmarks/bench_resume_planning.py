@@ -0,0 +1,102 @@
+# benchmarks/bench_resume_planning.py - 断点续译规划基准测试
+#
+# 生成一个 N 行、多语言的进度表（乱序完成 + 部分失败标记），对比：
+#   1) 旧版：逐行 df.at 双重循环求最小“最后已翻译行号”，再逐行扫描生成任务
+#   2) 新版：向量化完成掩码 / 从断点读取位图，直接得到待翻译 (行, 语言)
+# 的耗时，并校验新版任务集合覆盖旧版遗漏的乱序完成行。
+#
+# 运行: python benchmarks/bench_resume_planning.py [行数]
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translation_checkpoint import TranslationCheckpoint, completion_mask, pending_rows
+
+LANGUAGES = {"英文": "英文翻译结果", "日文": "日文翻译结果", "韩文": "韩文翻译结果"}
+
+
+def build_progress_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"原文": [f"第{i}行文本" for i in range(rows)]})
+    df.loc[rng.random(rows) < 0.02, "原文"] = ""
+    for column in LANGUAGES.values():
+        values = np.array([f"translation {i}" for i in range(rows)], dtype=object)
+        state = rng.random(rows)
+        # 并发翻译下完成顺序是乱序的：约 60% 完成，5% 失败，其余为空
+        values[state >= 0.65] = ""
+        values[(state >= 0.60) & (state < 0.65)] = "[翻译失败: timeout]"
+        df[column] = values
+    return df
+
+
+def legacy_plan(df):
+    start = time.perf_counter()
+    min_translated_index = len(df)
+    for column in LANGUAGES.values():
+        last_index = -1
+        for idx in range(len(df)):
+            if not pd.isna(df.at[idx, column]) and str(df.at[idx, column]).strip() != '':
+                if not str(df.at[idx, column]).startswith('[翻译失败'):
+                    last_index = idx
+        min_translated_index = min(min_translated_index, last_index + 1)
+
+    pending = set()
+    for index in range(min_translated_index, len(df)):
+        row = df.iloc[index]
+        text = str(row["原文"])
+        if pd.isna(text) or text.strip() == "" or text == "nan":
+            continue
+        for column in LANGUAGES.values():
+            existing = df.at[index, column]
+            if not pd.isna(existing) and str(existing).strip() != '' and not str(existing).startswith('[翻译失败'):
+                continue
+            pending.add((index, column))
+    return time.perf_counter() - start, min_translated_index, pending
+
+
+def mask_plan(df):
+    start = time.perf_counter()
+    masks = {column: completion_mask(df, column) for column in LANGUAGES.values()}
+    pending = pending_rows(df, "原文", masks)
+    return time.perf_counter() - start, pending
+
+
+def checkpoint_plan(df, checkpoint):
+    start = time.perf_counter()
+    masks = checkpoint.completion_masks(df, list(LANGUAGES.values()))
+    pending = pending_rows(df, "原文", masks)
+    return time.perf_counter() - start, pending
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    df = build_progress_frame(rows)
+    print(f"行数: {rows}  语言: {len(LANGUAGES)}")
+
+    legacy_time, start_index, legacy_pending = legacy_plan(df)
+    print(f"旧版双重循环   {legacy_time * 1000:9.1f} ms  起始行 {start_index}  待翻译 {len(legacy_pending)}")
+
+    mask_time, pending = mask_plan(df)
+    mask_pending = {(int(i), column) for column, indexes in pending.items() for i in indexes}
+    print(f"向量化掩码     {mask_time * 1000:9.1f} ms  待翻译 {len(mask_pending)}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = TranslationCheckpoint.create(directory, df.head(0))
+        checkpoint.completion_masks(df, list(LANGUAGES.values()))
+        checkpoint_time, pending = checkpoint_plan(df, checkpoint)
+        checkpoint_pending = {(int(i), column) for column, indexes in pending.items() for i in indexes}
+        print(f"断点位图读取   {checkpoint_time * 1000:9.1f} ms  待翻译 {len(checkpoint_pending)}")
+
+    assert legacy_pending <= mask_pending == checkpoint_pending
+    print(f"旧版按最小起始行恢复时漏掉的乱序待翻译单元格: {len(mask_pending - legacy_pending)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_role_index.py - 角色名模糊匹配基准测试
+#
+# 对比旧版 analyze_role_matches（每个说话人对全部官方角色逐对 SequenceMatcher，
+# 找到匹配后再完整扫描一遍求候选）与 RoleNameIndex 字符倒排索引预筛选的耗时，
+# 并校验两者返回的 {说话人: [(角色, 得分)]} 完全一致。
+#
+# 运行: python benchmarks/bench_role_index.py [官方角色数] [说话人数]
+
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from translator import MultiAPIExcelTranslator
+
+NAME_CHARS = [chr(c) for c in range(0x4e00, 0x4e00 + 800)]
+DECORATIONS = ["", "|旁白", "（内心）", " ", "　", "的声音", "|OS"]
+
+
+def make_roles(role_count, speaker_count, seed=42):
+    """生成官方角色名，以及带装饰、错别字、截断的说话人名称"""
+    rng = random.Random(seed)
+    roles = []
+    seen = set()
+    while len(roles) < role_count:
+        name = "".join(rng.choice(NAME_CHARS) for _ in range(rng.randint(2, 4)))
+        if name not in seen:
+            seen.add(name)
+            roles.append(name)
+
+    speakers = []
+    for _ in range(speaker_count):
+        name = rng.choice(roles)
+        kind = rng.random()
+        if kind < 0.3:
+            name = name[:-1] + rng.choice(NAME_CHARS)
+        elif kind < 0.5:
+            name = name[1:] or name
+        elif kind < 0.6:
+            name = "".join(rng.choice(NAME_CHARS) for _ in range(3))
+        speakers.append(name + rng.choice(DECORATIONS))
+    return roles, speakers
+
+
+def legacy_fuzzy_match_role(translator, role_name, threshold):
+    cleaned_role = translator.clean_role_name(role_name)
+    if not cleaned_role:
+        return None, 0
+    best_match = None
+    best_score = 0
+    for official_role in translator.role_personality_dict.keys():
+        cleaned_official = translator.clean_role_name(official_role)
+        if cleaned_role == cleaned_official:
+            return official_role, 1.0
+        score = difflib.SequenceMatcher(None, cleaned_role, cleaned_official).ratio()
+        if cleaned_role in cleaned_official or cleaned_official in cleaned_role:
+            score = max(score, 0.8)
+        if score > best_score:
+            best_score = score
+            best_match = official_role
+    if best_score >= threshold:
+        return best_match, best_score
+    return None, best_score
+
+
+def legacy_analyze_role_matches(translator, df, role_col):
+    """旧版实现（与重构前的 analyze_role_matches 一致）"""
+    fuzzy_matches = {}
+    for role in df[role_col].dropna().unique():
+        role_str = str(role).strip()
+        if not role_str or role_str in translator.role_personality_dict:
+            continue
+        matched_role, score = legacy_fuzzy_match_role(translator, role_str, translator.fuzzy_threshold)
+        if matched_role:
+            if role_str not in fuzzy_matches:
+                fuzzy_matches[role_str] = []
+            fuzzy_matches[role_str].append((matched_role, score))
+            if score < 1.0:
+                for official_role in translator.role_personality_dict.keys():
+                    if official_role == matched_role:
+                        continue
+                    alt_score = difflib.SequenceMatcher(
+                        None,
+                        translator.clean_role_name(role_str),
+                        translator.clean_role_name(official_role)
+                    ).ratio()
+                    if alt_score >= translator.fuzzy_threshold * 0.8:
+                        fuzzy_matches[role_str].append((official_role, alt_score))
+            fuzzy_matches[role_str].sort(key=lambda x: x[1], reverse=True)
+    return fuzzy_matches
+
+
+def main():
+    role_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    speaker_count = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+
+    roles, speakers = make_roles(role_count, speaker_count)
+    df = pd.DataFrame({"说话人": speakers})
+    translator = MultiAPIExcelTranslator("", "Custom", "http://localhost", "bench")
+    translator.role_personality_dict = {role: f"性格{i}" for i, role in enumerate(roles)}
+    translator.fuzzy_threshold = 0.6
+
+    print(f"官方角色: {len(roles)}  说话人: {df['说话人'].nunique()} 个不同名称")
+
+    start = time.perf_counter()
+    legacy = legacy_analyze_role_matches(translator, df, "说话人")
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = translator.analyze_role_matches(df, "说话人")
+    indexed_time = time.perf_counter() - start
+
+    assert legacy == indexed, "匹配结果不一致"
+    print(f"旧版逐对比较: {legacy_time:.2f}s")
+    print(f"倒排索引预筛: {indexed_time:.3f}s  加速比 {legacy_time / max(indexed_time, 1e-9):.0f}x（{len(indexed)} 个说话人的候选列表一致）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_startup.py - 启动耗时基准测试
+#
+# 每个模块在独立的新进程中导入并计时（不受其他模块已导入的影响），列出：
+#   - app.py 本身的导入耗时（侧边栏渲染前必须完成的部分）
+#   - 各页面模块首次进入时的导入耗时
+#   - 旧版启动方式（一次性导入全部页面）的总耗时
+#   - jieba 首次分词（加载词典）的耗时，现由后台线程预热
+# 传入 --max-app 秒数时，app.py 导入超过该值则以非零状态退出，便于发现启动回归。
+#
+# 运行: python benchmarks/bench_startup.py [--max-app 秒数]
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGE_MODULES = [
+    "prompt_generator", "translation_result", "batch_translation", "term_lookup",
+    "excel_replace", "excel_sreplace", "excel_comparison", "excel_abc", "danmu",
+    "ytdlp_downloader", "excel_matchpro", "grand_match", "jacky", "format_factory",
+    "file_scanner", "profile_analysis",
+]
+
+TIMER = """
+import sys, time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement):
+    """在新进程中执行语句并返回耗时（秒）；失败时返回异常名"""
+    result = subprocess.run(
+        [sys.executable, "-c", TIMER.format(statement=statement)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return lines[-1].split(":")[0] if lines else "失败"
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def show(label, elapsed):
+    if isinstance(elapsed, float):
+        print(f"  {label:<28} {elapsed * 1000:8.0f} ms")
+    else:
+        print(f"  {label:<28} 导入失败: {elapsed}")
+    return elapsed
+
+
+def main():
+    max_app = None
+    if "--max-app" in sys.argv:
+        max_app = float(sys.argv[sys.argv.index("--max-app") + 1])
+
+    print("基础依赖:")
+    streamlit_time = show("streamlit", measure("import streamlit"))
+
+    print("启动（侧边栏渲染前）:")
+    app_time = show("app", measure("import app"))
+
+    print("各页面首次进入:")
+    importable = []
+    for name in PAGE_MODULES:
+        if isinstance(show(f"pages.{name}", measure(f"import pages.{name}")), float):
+            importable.append(name)
+
+    print("对比:")
+    # 旧版 app.py 在模块顶层导入 jieba 和全部页面
+    eager = "\n".join(["import jieba"] + [f"import pages.{name}" for name in importable])
+    eager_time = show("旧版一次性导入全部页面", measure(eager))
+    show("jieba 导入 + 加载词典", measure("import jieba\njieba.setLogLevel(60)\njieba.initialize()"))
+
+    if isinstance(app_time, float) and isinstance(eager_time, float):
+        print(f"app 启动导入 {app_time:.2f}s（其中 streamlit {streamlit_time:.2f}s），"
+              f"旧版约 {eager_time:.2f}s，减少 {eager_time - app_time:.2f}s")
+    if max_app is not None and (not isinstance(app_time, float) or app_time > max_app):
+        print(f"❌ app 导入耗时超过 {max_app}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
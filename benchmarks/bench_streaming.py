@@ -0,0 +1,144 @@
+# benchmarks/bench_streaming.py - 流式回复基准测试
+#
+# 启动一个本地 SSE 桩服务器，模拟生成很慢的长回复（总耗时超过整体超时，但数据块
+# 之间间隔很短），对比：
+#   - 非流式 + 整体超时：等满超时后失败，整次请求需要从头重试
+#   - 流式 + 空闲超时（同步 requests 与异步 httpx 两条路径）：持续收到数据即不超时，
+#     并通过 StreamProgress 得到接收进度
+#   - 服务端中途停止输出：流式请求在空闲超时后即失败，不必等满整体超时
+#   - 服务端没有发送 [DONE] 就断开：两条路径都抛出可重试的网络错误，不完整的回复不会当作译文
+#
+# 运行: python benchmarks/bench_streaming.py [数据块数] [块间隔秒数]
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from chat_stream import StreamProgress
+from translator import MultiAPIExcelTranslator
+
+CHUNK_TEXT = "這是一段很長的對白。"
+
+
+def make_handler(chunk_count, gap, stall_after=None, close_after=None):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if not body.get("stream"):
+                time.sleep(chunk_count * gap)
+                payload = json.dumps({"choices": [{"message": {"content": CHUNK_TEXT * chunk_count}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端已超时断开
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                for i in range(chunk_count):
+                    if close_after is not None and i == close_after:
+                        return  # 没有 [DONE] 就断开连接（模拟代理提前关闭）
+                    if stall_after is not None and i == stall_after:
+                        time.sleep(chunk_count * gap)
+                    time.sleep(gap)
+                    chunk = {"choices": [{"delta": {"content": CHUNK_TEXT}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+                    self.wfile.flush()
+                usage = {"choices": [], "usage": {"prompt_tokens": 42, "completion_tokens": chunk_count * 8}}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return StubHandler
+
+
+def start_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def timed(func):
+    start = time.perf_counter()
+    try:
+        return func(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, type(e).__name__, time.perf_counter() - start
+
+
+def main():
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    gap = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    wall_timeout = chunk_count * gap * 0.6  # 模拟固定 60 秒超时：生成总耗时超过整体超时
+    idle_timeout = gap * 5
+    expected = CHUNK_TEXT * chunk_count
+
+    server, url = start_server(make_handler(chunk_count, gap))
+    print(f"回复 {chunk_count} 块，每块间隔 {gap}s（总计约 {chunk_count * gap:.1f}s）"
+          f"  整体超时 {wall_timeout:.1f}s  空闲超时 {idle_timeout:.1f}s")
+
+    translator = MultiAPIExcelTranslator("bench", "Custom", url, "bench")
+    data = {"model": "bench", "messages": [{"role": "user", "content": "hi"}]}
+    _, error, elapsed = timed(lambda: requests.post(url, json=data, timeout=wall_timeout).json())
+    print(f"非流式 + 整体超时: {error or '成功'}，耗时 {elapsed:.2f}s（失败后整次重试）")
+
+    updates = []
+    translator.stream_responses = True
+    translator.stream_idle_timeout = idle_timeout
+    translator.stream_progress = StreamProgress(updates.append, min_interval=gap * 3)
+    content, error, elapsed = timed(lambda: translator._post_chat_completion("system", "hi"))
+    assert content == expected, "流式回复内容不一致"
+    usage = translator.usage_stats.snapshot()
+    assert usage["completion_tokens"] == chunk_count * 8 and usage["estimated_requests"] == 0, "未记录服务端用量"
+    print(f"流式 + 空闲超时（requests）: 成功，耗时 {elapsed:.2f}s，"
+          f"期间 {len(updates)} 次进度更新（最后 {updates[-1]['total_chars']} 字）")
+
+    async def run_async():
+        async with translator.create_async_client(4, timeout=wall_timeout) as client:
+            return await client.chat(data["messages"], max_retries=0)
+
+    content, error, elapsed = timed(lambda: asyncio.run(run_async()))
+    assert content == expected, f"异步流式回复内容不一致: {error}"
+    print(f"流式 + 空闲超时（httpx 异步）: 成功，耗时 {elapsed:.2f}s")
+    server.shutdown()
+
+    server, url = start_server(make_handler(chunk_count, gap, stall_after=chunk_count // 3))
+    translator.api_url = url
+    _, error, elapsed = timed(lambda: translator._post_chat_completion("system", "hi"))
+    assert error is not None, "停止输出后应超时"
+    print(f"服务端中途停止输出: 流式请求 {elapsed:.2f}s 后 {error}（无需等满整体超时）")
+    server.shutdown()
+
+    server, url = start_server(make_handler(chunk_count, gap, close_after=chunk_count // 3))
+    translator.api_url = url
+    _, error, _ = timed(lambda: translator._post_chat_completion("system", "hi"))
+    assert error == "ChunkedEncodingError", f"提前断开的回复应按网络错误重试: {error}"
+    _, async_error, _ = timed(lambda: asyncio.run(run_async()))
+    assert async_error == "RemoteProtocolError", f"提前断开的回复应按网络错误重试: {async_error}"
+    print(f"服务端提前断开: requests {error} / httpx {async_error}（不完整的回复不会当作译文）")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
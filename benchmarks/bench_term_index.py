@@ -0,0 +1,107 @@
+# benchmarks/bench_term_index.py - 术语匹配基准测试
+#
+# 对比旧版 find_matched_terms（分词 × 术语 嵌套循环 + 逐条 `term in text`）
+# 与 TermAutomaton 单次线性扫描，在合成的 5 万条术语库上的耗时。
+#
+# 运行: python benchmarks/bench_term_index.py [术语条数] [文本行数]
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jieba
+
+from term_index import TermAutomaton
+
+CJK_CHARS = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+
+
+def make_glossary(term_count, seed=42):
+    """生成合成术语库（含少量一词多译）"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(term_count):
+        source = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 5)))
+        entries.append({'source': source, 'target': f"term_{i}"})
+        if i % 50 == 0:
+            entries.append({'source': source, 'target': f"term_{i}_alt"})
+    return entries
+
+
+def make_texts(entries, line_count, seed=7):
+    """生成待翻译文本，每行随机嵌入若干术语"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(line_count):
+        parts = []
+        for _ in range(rng.randint(3, 8)):
+            if rng.random() < 0.3:
+                parts.append(rng.choice(entries)['source'])
+            else:
+                parts.append("".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(1, 4))))
+        texts.append("，".join(parts))
+    return texts
+
+
+def legacy_find_matched_terms(text, term_entries):
+    """旧版实现（与重构前的 MultiAPIExcelTranslator.find_matched_terms 一致）"""
+    words = [w for w in jieba.cut(text) if w.strip() and re.search(r'[\w一-龥]', w)]
+    matched_terms = {}
+
+    for word in words:
+        for term_entry in term_entries:
+            if term_entry['source'] == word:
+                if word not in matched_terms:
+                    matched_terms[word] = []
+                if term_entry['target'] not in matched_terms[word]:
+                    matched_terms[word].append(term_entry['target'])
+
+    for term_entry in term_entries:
+        term = term_entry['source']
+        if term in text:
+            if term not in matched_terms:
+                matched_terms[term] = []
+            if term_entry['target'] not in matched_terms[term]:
+                matched_terms[term].append(term_entry['target'])
+
+    return matched_terms
+
+
+def main():
+    term_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    line_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    entries = make_glossary(term_count)
+    texts = make_texts(entries, line_count)
+    jieba.setLogLevel(60)
+    jieba.initialize()
+
+    print(f"术语条数: {len(entries)}  文本行数: {len(texts)}")
+
+    start = time.perf_counter()
+    automaton = TermAutomaton(entries)
+    build_time = time.perf_counter() - start
+    print(f"自动机编译: {build_time:.3f}s ({len(automaton)} 个唯一原文)")
+
+    start = time.perf_counter()
+    legacy_results = [legacy_find_matched_terms(t, entries) for t in texts]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_results = [automaton.match(t) for t in texts]
+    new_time = time.perf_counter() - start
+
+    for legacy, new in zip(legacy_results, new_results):
+        assert legacy == new, "匹配结果不一致"
+
+    print(f"旧版嵌套循环: {legacy_time * 1000 / len(texts):.2f} ms/行")
+    print(f"自动机扫描:   {new_time * 1000 / len(texts):.4f} ms/行")
+    print(f"加速比: {legacy_time / max(new_time, 1e-9):.0f}x  （结果一致）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# benchmarks/bench_term_loaders.py - 术语库 / 角色性格库加载基准测试
+#
+# 对比旧版逐行 df.iterrows() 加载（每种语言各遍历一次、每行都调用 jieba.add_word、
+# 每种语言各编译一个自动机）与向量化加载（原文列只清洗一次、每个原文只注册一次、
+# 各语言共用一棵字典树）在合成的多语言术语库上的耗时，并校验匹配结果一致。
+#
+# 运行: python benchmarks/bench_term_loaders.py [术语行数] [语言数]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from term_index import TermAutomaton
+from translator import MultiAPIExcelTranslator
+
+CJK_CHARS = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+LANGUAGES = ["英文", "日文", "韩文", "法文", "德文", "西班牙文", "俄文", "泰文"]
+
+
+def make_glossary(row_count, language_count, seed=42):
+    """生成合成多语言术语库：含空值、首尾空白、重复行和一词多译"""
+    rng = random.Random(seed)
+    data = {"原文": []}
+    languages = LANGUAGES[:language_count]
+    for language in languages:
+        data[language] = []
+
+    for i in range(row_count):
+        if i % 40 == 1:
+            source = data["原文"][-1]  # 同一原文的另一个译文 / 重复行
+        else:
+            source = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 5)))
+            if i % 17 == 0:
+                source = f"  {source} "
+        data["原文"].append(None if i % 97 == 0 else source)
+        for j, language in enumerate(languages):
+            if rng.random() < 0.03:
+                data[language].append(np.nan)
+            else:
+                data[language].append(f"{language}_{i // (2 if i % 40 == 1 else 1)}_{j}")
+    return pd.DataFrame(data), languages
+
+
+def legacy_load_term_base_multilang(df, source_col, target_cols_dict):
+    """旧版实现（与重构前的 load_term_base_multilang 一致，去掉界面输出）"""
+    term_base_dict = {}
+    term_index_dict = {}
+    for language, target_col in target_cols_dict.items():
+        term_base_dict[language] = []
+        for _, row in df.iterrows():
+            source = row[source_col]
+            target = row[target_col]
+            if pd.isna(source) or pd.isna(target):
+                continue
+            source = str(source).strip()
+            target = str(target).strip()
+            if source and target:
+                try:
+                    jieba.add_word(source)
+                except:
+                    pass
+                term_base_dict[language].append({'source': source, 'target': target})
+        term_index_dict[language] = TermAutomaton(term_base_dict[language])
+    return term_base_dict, term_index_dict
+
+
+def legacy_load_role_personality(df, role_col, personality_col):
+    role_personality_dict = {}
+    for _, row in df.iterrows():
+        role = row[role_col]
+        personality = row[personality_col]
+        if pd.isna(role) or pd.isna(personality):
+            continue
+        role = str(role).strip()
+        personality = str(personality).strip()
+        if role and personality:
+            role_personality_dict[role] = personality
+    return role_personality_dict
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    language_count = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+    df, languages = make_glossary(row_count, language_count)
+    target_cols = {language: language for language in languages}
+    jieba.setLogLevel(60)
+    jieba.initialize()
+    translator = MultiAPIExcelTranslator("", "Custom", "http://localhost", "bench")
+
+    print(f"术语行数: {len(df)}  语言数: {len(languages)}")
+
+    start = time.perf_counter()
+    legacy_dict, legacy_index = legacy_load_term_base_multilang(df, "原文", target_cols)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    translator.load_term_base_multilang(df, "原文", target_cols)
+    new_time = time.perf_counter() - start
+
+    rng = random.Random(7)
+    samples = [entry['source'] for entry in rng.sample(legacy_dict[languages[0]], 200)]
+    texts = ["，".join(rng.sample(samples, 4)) + "".join(rng.choice(CJK_CHARS) for _ in range(6)) for _ in range(200)]
+    for language in languages:
+        for text in texts:
+            assert legacy_index[language].match(text) == translator.find_matched_terms(text, language), "匹配结果不一致"
+
+    print(f"多语言术语库 旧版逐行: {legacy_time:.2f}s")
+    print(f"多语言术语库 向量化:   {new_time:.2f}s  加速比 {legacy_time / max(new_time, 1e-9):.1f}x（匹配结果一致）")
+
+    roles = df[["原文", languages[0]]]
+    start = time.perf_counter()
+    legacy_roles = legacy_load_role_personality(roles, "原文", languages[0])
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    translator.load_role_personality(roles, "原文", languages[0])
+    new_time = time.perf_counter() - start
+
+    assert list(legacy_roles.items()) == list(translator.role_personality_dict.items()), "角色性格库不一致"
+    print(f"角色性格库 旧版逐行: {legacy_time:.2f}s")
+    print(f"角色性格库 向量化:   {new_time:.3f}s  加速比 {legacy_time / max(new_time, 1e-9):.1f}x（结果一致）")
+
+
+if __name__ == "__main__":
+    main()
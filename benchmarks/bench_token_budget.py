@@ -0,0 +1,90 @@
+# benchmarks/bench_token_budget.py - 提示词 Token 预算基准测试
+#
+# 在术语密集、上下文很长的剧本上逐行构建提示词，对比不限预算与设置单次请求
+# Token 上限时的提示词大小；并对比固定 max_tokens 与按原文长度估算的回复上限，
+# 以及本地估算与 tiktoken（已安装时）的计数偏差和速度。
+#
+# 运行: python benchmarks/bench_token_budget.py [行数] [单次请求Token上限]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jieba
+
+from bench_term_loaders import CJK_CHARS, make_glossary
+from token_budget import HAS_TIKTOKEN, TokenCounter, completion_budget, estimate_tokens
+from translator import MultiAPIExcelTranslator
+
+LANGUAGE = "英文"
+
+
+def make_script(samples, row_count, seed=7):
+    """生成台词：每行混入若干术语，偶尔出现很长的段落"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(row_count):
+        terms = rng.sample(samples, rng.randint(1, 12))
+        filler = "".join(rng.choice(CJK_CHARS) for _ in range(rng.choice([8, 20, 40, 300])))
+        rows.append("，".join(terms) + filler)
+    return rows
+
+
+def run(translator, rows, budget):
+    translator.prompt_token_budget = budget
+    translator.context_history = {}
+    counter = translator.get_token_counter()
+    sizes = []
+    start = time.perf_counter()
+    for text in rows:
+        prompt = translator.build_translation_prompt(text, LANGUAGE)
+        sizes.append(counter.count(prompt) + counter.count(translator.get_system_prompt(LANGUAGE)))
+        translator.add_to_context(text, "line " * (len(text) // 2), None, LANGUAGE)
+    elapsed = time.perf_counter() - start
+    return sizes, elapsed
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    budget = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+
+    jieba.setLogLevel(60)
+    df, _ = make_glossary(20000, 1)
+    translator = MultiAPIExcelTranslator("", "Custom", "http://localhost", "bench")
+    translator.load_term_base_multilang(df, "原文", {LANGUAGE: df.columns[1]})
+    translator.context_size = 20
+    samples = [entry['source'] for entry in translator.term_base_dict[LANGUAGE][:2000]]
+    rows = make_script(samples, row_count)
+    print(f"行数: {row_count}  术语: {len(translator.term_base_dict[LANGUAGE])}  上下文条数: {translator.context_size}")
+
+    unlimited, unlimited_time = run(translator, rows, 0)
+    budgeted, budgeted_time = run(translator, rows, budget)
+    assert max(budgeted) <= budget, "提示词超出预算"
+    print(f"不限预算: 平均 {sum(unlimited) / row_count:.0f} Token/请求（最大 {max(unlimited)}），"
+          f"{unlimited_time * 1e6 / row_count:.0f} µs/行")
+    print(f"上限 {budget}: 平均 {sum(budgeted) / row_count:.0f} Token/请求（最大 {max(budgeted)}），"
+          f"{budgeted_time * 1e6 / row_count:.0f} µs/行  提示词减少 {1 - sum(budgeted) / sum(unlimited):.0%}")
+
+    fixed = 4000 * row_count
+    adaptive = sum(completion_budget(text, 4000) for text in rows)
+    print(f"回复上限合计: 固定 4000 → {fixed:,}，按原文估算 → {adaptive:,}（预留的回复额度减少 {1 - adaptive / fixed:.0%}）")
+
+    texts = [translator.build_translation_prompt(text, LANGUAGE) for text in rows[:500]]
+    start = time.perf_counter()
+    estimated = [estimate_tokens(text) for text in texts]
+    estimate_time = time.perf_counter() - start
+    print(f"本地估算: {estimate_time * 1e6 / len(texts):.0f} µs/提示词")
+    if HAS_TIKTOKEN:
+        counter = TokenCounter.from_tiktoken()
+        start = time.perf_counter()
+        exact = [counter.count(text) for text in texts]
+        exact_time = time.perf_counter() - start
+        error = sum(abs(e - x) / max(x, 1) for e, x in zip(estimated, exact)) / len(texts)
+        print(f"tiktoken: {exact_time * 1e6 / len(texts):.0f} µs/提示词  本地估算平均偏差 {error:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_tokenizer_cache.py - 分词缓存基准测试
+#
+# 模拟同一批文本被多个语言、多次重试和多个页面反复分词（例如 GRAND 匹配中
+# 每次“翻译选中句型”都会为相同的句型重新生成术语提示），对比直接调用 jieba.lcut
+# 与共享 CachedTokenizer 的耗时，校验分词结果一致，并验证添加词条后缓存失效。
+#
+# 运行: python benchmarks/bench_tokenizer_cache.py [不同文本数] [重复轮数]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jieba
+
+from bench_term_loaders import CJK_CHARS
+from tokenizer_cache import CachedTokenizer, format_tokenizer_stats
+
+
+def make_texts(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(8, 60))) + f"{{VAR{rng.randint(1, 3)}}}"
+        for _ in range(count)
+    ]
+
+
+def main():
+    text_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+    jieba.setLogLevel(60)
+    jieba.initialize()
+    texts = make_texts(text_count)
+    rng = random.Random(7)
+    workload = [text for _ in range(rounds) for text in rng.sample(texts, len(texts))]
+    print(f"不同文本: {text_count}  总分词次数: {len(workload)}（{rounds} 轮）")
+
+    start = time.perf_counter()
+    expected = [jieba.lcut(text) for text in workload]
+    direct_time = time.perf_counter() - start
+
+    tokenizer = CachedTokenizer(maxsize=text_count * 2)
+    start = time.perf_counter()
+    cached = [tokenizer.lcut(text) for text in workload]
+    cached_time = time.perf_counter() - start
+
+    assert cached == expected, "分词结果不一致"
+    print(f"直接 jieba.lcut: {direct_time:.2f}s")
+    print(f"共享 LRU 缓存:   {cached_time:.2f}s  加速比 {direct_time / max(cached_time, 1e-9):.1f}x（结果一致）")
+    print(format_tokenizer_stats(tokenizer.stats()))
+
+    # 通过缓存分词器添加词条：版本号递增，后续分词使用新词典
+    sample = texts[0]
+    word = sample[2:6]
+    tokenizer.add_word(word, 10 ** 6)
+    assert tokenizer.lcut(sample) == jieba.lcut(sample) and word in tokenizer.lcut(sample), "添加词条后缓存未失效"
+
+    # 绕过缓存直接修改 jieba 词典：通过词典大小 / 总词频的变化发现
+    sample = texts[1]
+    word = sample[3:7]
+    tokenizer.lcut(sample)
+    jieba.add_word(word, 10 ** 6)
+    assert tokenizer.lcut(sample) == jieba.lcut(sample) and word in tokenizer.lcut(sample), "外部修改词典后缓存未失效"
+    print(f"添加词条后缓存失效正常（词典版本 {tokenizer.stats()['version']}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# benchmarks/bench_xlsx_patch.py - 只改写命中单元格的替换引擎基准测试
+#
+# 生成一个约 30 MB 的本地化工作簿（共享字符串表、多张大工作表、带样式的单元格），
+# 替换其中几个单元格，对比：
+#   - 原来的做法：shutil.copy2 备份，openpyxl 完整模式加载、修改、保存
+#   - xlsx_patch.patch_cells：只改写目标单元格所在的工作表，其余部件复制压缩数据，备份用硬链接
+# 并校验两种方式替换后所有单元格的值完全一致、被替换单元格的样式保留、备份内容为替换前的原文件，
+# 以及工作表中不存在的坐标（过期的扫描结果）被跳过，不会让整个工作簿改走 openpyxl。
+#
+# 运行: python benchmarks/bench_xlsx_patch.py [每张表行数] [工作表数]
+
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+from openpyxl.styles import Font
+
+from bench_term_loaders import CJK_CHARS
+from excel_scan import scan_files, substring_matcher
+from xlsx_patch import link_backup, patch_cells
+
+SEARCH = "龍之剑"
+SST_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SST_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+SHEET_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             '<sheetData>{rows}</sheetData></worksheet>')
+
+
+def make_workbook(path, rows, sheet_count, seed=42):
+    """以 openpyxl 生成的文件为模板（样式 1 为加粗），替换成大工作表和共享字符串表"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    wb.active.title = "Sheet1"
+    wb.active["A1"] = "x"
+    wb.active["A1"].font = Font(bold=True)
+    for i in range(1, sheet_count):
+        wb.create_sheet(f"Sheet{i + 1}")
+    wb.save(path)
+
+    strings = ["".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(6, 24))) for _ in range(rows)]
+    strings.append(f"第一章 {SEARCH} 出鞘")
+    hit_idx = len(strings) - 1
+    targets = []
+    parts = {}
+    for sheet in range(sheet_count):
+        # 每张表有 3 个带样式的单元格含有搜索词
+        hit_rows = set(rng.sample(range(1, rows + 1), 3))
+        targets.extend((f"Sheet{sheet + 1}", r, 2) for r in sorted(hit_rows))
+        row_xml = []
+        for r in range(1, rows + 1):
+            b_idx = hit_idx if r in hit_rows else rng.randrange(rows)
+            row_xml.append(f'<row r="{r}"><c r="A{r}" t="s"><v>{rng.randrange(rows)}</v></c>'
+                           f'<c r="B{r}" s="1" t="s"><v>{b_idx}</v></c>'
+                           f'<c r="C{r}"><v>{rng.randint(0, 100000)}</v></c>'
+                           f'<c r="D{r}" t="s"><v>{rng.randrange(rows)}</v></c></row>')
+        parts[f"xl/worksheets/sheet{sheet + 1}.xml"] = SHEET_XML.format(rows="".join(row_xml)).encode()
+
+    items = "".join(f"<si><t>{text}</t></si>" for text in strings)
+    parts["xl/sharedStrings.xml"] = (
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'
+    ).encode()
+
+    with zipfile.ZipFile(path) as src:
+        original = {item.filename: src.read(item.filename) for item in src.infolist()}
+    original["[Content_Types].xml"] = original["[Content_Types].xml"].replace(
+        b"</Types>", f'<Override PartName="/xl/sharedStrings.xml" ContentType="{SST_TYPE}"/></Types>'.encode())
+    original["xl/_rels/workbook.xml.rels"] = original["xl/_rels/workbook.xml.rels"].replace(
+        b"</Relationships>",
+        f'<Relationship Id="rIdSst" Type="{SST_REL}" Target="sharedStrings.xml"/></Relationships>'.encode())
+    original.update(parts)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as dst:
+        for name, data in original.items():
+            dst.writestr(name, data)
+    return targets
+
+
+def transform(text):
+    return re.sub(re.escape(SEARCH), "龙之刃", text)
+
+
+def legacy_replace(path, cells, backup_path):
+    shutil.copy2(path, backup_path)
+    wb = openpyxl.load_workbook(path)
+    for sheet_name, row, col in cells:
+        cell = wb[sheet_name].cell(row=row, column=col)
+        if cell.value:
+            cell.value = transform(str(cell.value))
+    wb.save(path)
+    wb.close()
+
+
+def all_values(path):
+    path, sheet_names, hits, error = next(scan_files([path], substring_matcher(""), data_only=False,
+                                                     use_processes=False))
+    assert error is None, error
+    return [(sheet_names[s], r, c, v) for s, r, c, v, _ in hits]
+
+
+def expected_values(values, cells):
+    targets = set(cells)
+    return [(sheet, r, c, transform(v) if (sheet, r, c) in targets else v) for sheet, r, c, v in values]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sheet_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        legacy_path = folder / "legacy.xlsx"
+        targets = make_workbook(legacy_path, rows, sheet_count)
+        original_values = all_values(str(legacy_path))
+        size_mb = legacy_path.stat().st_size / 1e6
+        print(f"工作簿: {size_mb:.1f} MB（{sheet_count} 张表 × {rows} 行）")
+
+        # 几个单元格都在同一张表 / 分散在所有工作表
+        scenarios = [("同一张表", [cell for cell in targets if cell[0] == "Sheet1"]), ("所有工作表", targets)]
+        patch_times = []
+        for i, (label, cells) in enumerate(scenarios):
+            patch_path = folder / f"patch{i}.xlsx"
+            backup_path = folder / f"patch{i}_backup.xlsx"
+            shutil.copy2(legacy_path, patch_path)
+
+            # 附带一个工作表中不存在的坐标
+            stale = [("Sheet1", rows + 10, 2)]
+            start = time.perf_counter()
+            changes = patch_cells(patch_path, cells + stale, transform, backup_path=backup_path)
+            patch_times.append((label, len(cells), time.perf_counter() - start, patch_path))
+
+            assert len(changes) == len(cells) and all(new == transform(old) for *_, old, new in changes)
+            assert all_values(str(patch_path)) == expected_values(original_values, cells), "替换结果不正确"
+            assert all_values(str(backup_path)) == original_values, "备份不是替换前的原文件"
+            with zipfile.ZipFile(patch_path) as archive:
+                sheet_xml = archive.read("xl/worksheets/sheet1.xml")
+            assert re.search(rf'<c r="B{cells[0][1]}" s="1" t="inlineStr">'.encode(), sheet_xml), "被替换单元格的样式丢失"
+
+        start = time.perf_counter()
+        legacy_replace(legacy_path, targets, folder / "legacy_backup.xlsx")
+        legacy_time = time.perf_counter() - start
+        assert all_values(str(patch_times[-1][3])) == all_values(str(legacy_path)), "替换结果与 openpyxl 不一致"
+
+        print(f"备份方式: {link_backup(legacy_path, folder / 'probe_backup.xlsx')}（本机文件系统）")
+        print(f"openpyxl 完整加载 + 保存（copy2 备份，{len(targets)} 个单元格）: {legacy_time:.2f}s"
+              f"  文件 {legacy_path.stat().st_size / 1e6:.1f} MB")
+        for label, count, patch_time, patch_path in patch_times:
+            print(f"只改写命中单元格（{label}，{count} 个单元格）: {patch_time:.2f}s"
+                  f"  文件 {patch_path.stat().st_size / 1e6:.1f} MB  加速比 {legacy_time / patch_time:.0f}x")
+        print("结果一致，样式和备份正确")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# benchmarks/bench_xlsx_stream.py - .xlsx XML 快速扫描基准测试
+#
+# 生成一批本地化表格（数字、日期、布尔值、公式、多工作表）。openpyxl 保存时把文本写成内联字符串，
+# 这里像 Excel 保存的文件一样改写成共享字符串表（每 5 个文件保留 1 个内联字符串版本）；另手工构造
+# 特殊工作表（内联富文本、缺少 r 属性的行和单元格、乱序行、<dimension> 截断、1904 日期纪元），
+# 对比 openpyxl 只读模式逐格扫描与 xlsx_stream 直接解析 XML 的耗时，并校验：
+#   - 各种搜索词（中文子串、英文大小写、数字、日期、无结果）在 data_only 为 True / False 时
+#     两条路径产出的匹配记录完全一致（data_only=False 且含公式的文件自动改用 openpyxl）
+#
+# 运行: python benchmarks/bench_xlsx_stream.py [文件数] [每个文件行数]
+
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+
+from bench_term_loaders import CJK_CHARS
+from excel_scan import regex_matcher, scan_files, substring_matcher
+
+WORDS = ["Sword", "shield", "POTION", "Quest", "Dragon", "İstanbul"]
+
+QUERIES = [
+    (regex_matcher(re.escape("龍"), re.IGNORECASE, literal="龍"), True),
+    (regex_matcher(re.escape("sword"), re.IGNORECASE, literal="sword"), True),
+    (regex_matcher(r"\b" + re.escape("Quest") + r"\b", 0, literal="Quest"), True),
+    (regex_matcher(re.escape("12"), re.IGNORECASE, literal="12"), True),
+    (regex_matcher(re.escape("2024-03"), re.IGNORECASE, literal="2024-03"), True),
+    (regex_matcher(re.escape("true"), re.IGNORECASE, literal="true"), True),
+    (regex_matcher(re.escape("不存在的词语"), re.IGNORECASE, literal="不存在的词语"), True),
+    (substring_matcher("SUM", True), False),
+    (substring_matcher("dragon", False), False),
+    (substring_matcher("内联", False), False),
+]
+
+SPECIAL_SHEETS = {
+    # 内联字符串、公式字符串结果、错误值、缺少 r 属性的单元格
+    "inline": """<row r="1"><c r="A1" t="inlineStr"><is><t>内联文本 Sword</t></is></c>
+<c t="inlineStr"><is><r><t>富文本</t></r><r><t>龍</t></r><rPh sb="0" eb="1"><t>注音</t></rPh></is></c>
+<c t="str"><f>A1&amp;"x"</f><v>公式结果 dragon</v></c><c t="e"><v>#N/A</v></c></row>
+<row><c t="b"><v>1</v></c><c><v>12.5</v></c><c s="1"><v>45000</v></c></row>""",
+    # 乱序行和重复行（openpyxl 跳过编号不递增的行）、空 <v>
+    "unordered": """<row r="3"><c r="B3" t="inlineStr"><is><t>第三行 quest</t></is></c></row>
+<row r="2"><c r="A2" t="inlineStr"><is><t>被跳过 quest</t></is></c></row>
+<row r="5"><c r="C5"><v></v></c><c r="D5" t="inlineStr"><is><t>Quest 龍</t></is></c></row>""",
+}
+DIMENSION_SHEET = """<row r="1"><c r="A1" t="inlineStr"><is><t>范围内 sword</t></is></c>
+<c r="C1" t="inlineStr"><is><t>超出列 sword</t></is></c></row>
+<row r="2"><c r="A2" t="inlineStr"><is><t>超出行 sword</t></is></c></row>"""
+
+INLINE_CELL = re.compile(r'<c r="([A-Z]+\d+)"( s="\d+")? t="inlineStr"><is><t(?: xml:space="preserve")?>(.*?)</t></is></c>')
+SST_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SST_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+SHEET_XML = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             '{dimension}<sheetData>{rows}</sheetData></worksheet>')
+
+
+def make_corpus(folder, file_count, rows, seed=42):
+    rng = random.Random(seed)
+    for i in range(file_count):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "文本"
+        ws.append(["ID", "中文", "English", "数量", "日期", "启用", "公式"])
+        for r in range(rows):
+            zh = "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(4, 20)))
+            en = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+            ws.append([
+                f"TXT_{i}_{r}", zh, en, rng.choice([rng.randint(0, 500), rng.random() * 100]),
+                datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365), hours=rng.randint(0, 23)),
+                rng.random() < 0.5, f"=SUM(D{r + 2}:D{r + 2})" if r % 20 == 0 else None,
+            ])
+        other = wb.create_sheet("备注")
+        other.append(["龍" if rng.random() < 0.2 else "说明", None, "Dragon quest", timedelta(hours=30)])
+        other["D1"].number_format = "[h]:mm:ss"
+        if i % 7 == 0:
+            wb.epoch = openpyxl.utils.datetime.CALENDAR_MAC_1904
+        wb.save(folder / f"loc_{i:04d}.xlsx")
+        if i % 5:
+            to_shared_strings(folder / f"loc_{i:04d}.xlsx")
+
+
+def to_shared_strings(path):
+    """把 openpyxl 写出的内联字符串改写成共享字符串表（Excel 保存的文件都是这种形式）"""
+    strings = {}
+
+    def share(match):
+        idx = strings.setdefault(match.group(3), len(strings))
+        return f'<c r="{match.group(1)}"{match.group(2) or ""} t="s"><v>{idx}</v></c>'
+
+    with zipfile.ZipFile(path) as src:
+        parts = {item.filename: src.read(item.filename) for item in src.infolist()}
+    for name in parts:
+        if name.startswith("xl/worksheets/sheet"):
+            parts[name] = INLINE_CELL.sub(share, parts[name].decode("utf-8")).encode("utf-8")
+    items = "".join(f"<si><t>{text}</t></si>" for text in strings)
+    parts["xl/sharedStrings.xml"] = (
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'
+    ).encode("utf-8")
+    parts["[Content_Types].xml"] = parts["[Content_Types].xml"].replace(
+        b"</Types>", f'<Override PartName="/xl/sharedStrings.xml" ContentType="{SST_TYPE}"/></Types>'.encode())
+    parts["xl/_rels/workbook.xml.rels"] = parts["xl/_rels/workbook.xml.rels"].replace(
+        b"</Relationships>",
+        f'<Relationship Id="rIdSst" Type="{SST_REL}" Target="sharedStrings.xml"/></Relationships>'.encode())
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as dst:
+        for name, data in parts.items():
+            dst.writestr(name, data)
+
+
+def make_special(folder):
+    """以 openpyxl 生成的文件为模板，替换工作表 XML 构造特殊情况"""
+    wb = openpyxl.Workbook()
+    wb.active.title = "inline"
+    wb.active["A1"].number_format = "yyyy-mm-dd"  # 让样式 1 成为日期格式
+    wb.create_sheet("unordered")
+    wb.create_sheet("dimension")
+    template = folder / "_template.xlsx"
+    wb.save(template)
+
+    sheets = {
+        "xl/worksheets/sheet1.xml": SHEET_XML.format(dimension="", rows=SPECIAL_SHEETS["inline"]),
+        "xl/worksheets/sheet2.xml": SHEET_XML.format(dimension="", rows=SPECIAL_SHEETS["unordered"]),
+        "xl/worksheets/sheet3.xml": SHEET_XML.format(dimension='<dimension ref="A1:B1"/>', rows=DIMENSION_SHEET),
+    }
+    with zipfile.ZipFile(template) as src, zipfile.ZipFile(folder / "special.xlsx", "w") as dst:
+        for item in src.infolist():
+            dst.writestr(item, sheets.get(item.filename, src.read(item.filename)))
+    os.remove(template)
+
+
+def collect(files, matcher, data_only, fast_xml):
+    results = {}
+    for path, sheet_names, hits, error in scan_files(files, matcher, data_only=data_only,
+                                                     use_processes=False, workers=1, fast_xml=fast_xml):
+        assert error is None, error
+        if hits:
+            results[path] = (sheet_names, hits)
+    return results
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        make_corpus(folder, file_count, rows)
+        make_special(folder)
+        files = sorted(str(f) for f in folder.glob("*.xlsx"))
+        print(f"文件: {len(files)}  每个文件 {rows} 行  搜索: {len(QUERIES)} 种")
+
+        legacy_time = fast_time = 0.0
+        for matcher, data_only in QUERIES:
+            start = time.perf_counter()
+            expected = collect(files, matcher, data_only, fast_xml=False)
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = collect(files, matcher, data_only, fast_xml=True)
+            fast_time += time.perf_counter() - start
+            assert results == expected, f"XML 快速扫描结果与 openpyxl 不一致: {matcher}"
+
+            special = str(folder / "special.xlsx")
+            if special in expected:
+                print(f"  {matcher[3]!r:<14} 特殊表命中 {len(expected[special][1])} 个单元格")
+
+        print(f"openpyxl 只读模式扫描: {legacy_time:.2f}s（每种搜索 {legacy_time / len(QUERIES):.2f}s）")
+        print(f"XML 快速扫描:          {fast_time:.2f}s（每种搜索 {fast_time / len(QUERIES):.2f}s）"
+              f"  加速比 {legacy_time / fast_time:.1f}x（结果一致）")
+
+
+if __name__ == "__main__":
+    main()
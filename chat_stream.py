@@ -0,0 +1,164 @@
+# chat_stream.py - chat/completions 流式（SSE）回复的解析与进度统计
+#
+# 开启 stream 后服务端以 text/event-stream 逐块返回 "data: {...}" 行，
+# 最后一行为 "data: [DONE]"。同步（requests.iter_lines）和异步（httpx.aiter_lines）
+# 客户端共用这里的解析逻辑；超时改为两块数据之间的空闲超时，由各客户端的读超时实现。
+# 连接在 [DONE] / finish_reason 之前结束时回复不完整，由各客户端抛出可重试的异常。
+
+import json
+import threading
+import time
+
+DEFAULT_STREAM_IDLE_TIMEOUT = 30.0  # 两个数据块之间的最长等待（秒）
+STREAM_CONNECT_TIMEOUT = 10.0
+
+
+def parse_sse_line(line):
+    """解析一行 SSE，返回 data 字段内容；注释、空行和其他字段返回 None"""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    if not line.startswith("data:"):
+        return None
+    return line[5:].strip()
+
+
+def parse_chat_chunk(payload):
+    """解析一个流式数据块，返回 (增量文本, usage, finish_reason)"""
+    chunk = json.loads(payload)
+    if "error" in chunk:
+        raise RuntimeError(f"流式响应错误: {chunk['error']}")
+    delta = ""
+    finish_reason = None
+    choices = chunk.get("choices") or []
+    if choices:
+        delta = (choices[0].get("delta") or {}).get("content") or ""
+        finish_reason = choices[0].get("finish_reason")
+    return delta, chunk.get("usage"), finish_reason
+
+
+class ChatStreamReader:
+    """累积流式回复：feed() 逐行输入，content / usage 为当前结果
+
+    on_delta(已接收字符数) 在每个非空增量后调用，用于上报进度。
+    """
+
+    def __init__(self, on_delta=None):
+        self.on_delta = on_delta
+        self.parts = []
+        self.received = 0
+        self.usage = None
+        self.finish_reason = None
+        self.done = False
+
+    def feed(self, line):
+        """输入一行，收到 [DONE] 时返回 False"""
+        payload = parse_sse_line(line)
+        if payload is None:
+            return True
+        if payload == "[DONE]":
+            self.done = True
+            return False
+        delta, usage, finish_reason = parse_chat_chunk(payload)
+        if usage:
+            self.usage = usage
+        if finish_reason:
+            self.finish_reason = finish_reason
+        if delta:
+            self.parts.append(delta)
+            self.received += len(delta)
+            if self.on_delta is not None:
+                self.on_delta(self.received)
+        return True
+
+    @property
+    def complete(self):
+        """是否收到了结束标志（[DONE] 或 finish_reason）；连接提前断开时为 False"""
+        return self.done or self.finish_reason is not None
+
+    @property
+    def content(self):
+        return "".join(self.parts)
+
+    def result(self):
+        """与非流式响应结构一致的结果（仅包含 usage），供 UsageStats.record_response 使用"""
+        return {"usage": self.usage} if self.usage else {}
+
+
+def read_chat_stream(lines, on_delta=None):
+    """从同步行迭代器读取完整回复，返回 ChatStreamReader"""
+    reader = ChatStreamReader(on_delta)
+    for line in lines:
+        if not reader.feed(line):
+            break
+    return reader
+
+
+async def aread_chat_stream(lines, on_delta=None):
+    """read_chat_stream 的异步版本"""
+    reader = ChatStreamReader(on_delta)
+    async for line in lines:
+        if not reader.feed(line):
+            break
+    return reader
+
+
+class StreamProgress:
+    """进行中的流式请求的累计进度（线程安全），供界面状态栏展示
+
+    on_update(snapshot) 最多每 min_interval 秒调用一次，调用方不必自己节流。
+    """
+
+    def __init__(self, on_update=None, min_interval=0.5):
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._next_id = 0
+        self._completed = 0
+        self._completed_chars = 0
+        self._last_update = 0.0
+
+    def start(self):
+        with self._lock:
+            self._next_id += 1
+            self._active[self._next_id] = 0
+            return self._next_id
+
+    def update(self, stream_id, received):
+        with self._lock:
+            if stream_id in self._active:
+                self._active[stream_id] = received
+        self._notify()
+
+    def finish(self, stream_id):
+        with self._lock:
+            received = self._active.pop(stream_id, None)
+            if received is not None:
+                self._completed += 1
+                self._completed_chars += received
+        self._notify(force=True)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'active': len(self._active),
+                'active_chars': sum(self._active.values()),
+                'completed': self._completed,
+                'total_chars': self._completed_chars + sum(self._active.values()),
+            }
+
+    def _notify(self, force=False):
+        if self.on_update is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_update < self.min_interval:
+                return
+            self._last_update = now
+        self.on_update(self.snapshot())
+
+
+def format_stream_status(snapshot):
+    """把 StreamProgress.snapshot() 格式化为一行状态文本"""
+    return (f"🌊 流式接收中 {snapshot['active']} 个请求，已收到 {snapshot['active_chars']:,} 字"
+            f" | 累计 {snapshot['completed']} 个请求 {snapshot['total_chars']:,} 字")
@@ -0,0 +1,101 @@
+# context_window.py - 翻译上下文的环形缓冲区
+
+from collections import deque
+
+from token_budget import estimate_tokens
+
+
+class ContextWindow:
+    """单个上下文通道的最近 N 条译文
+
+    固定容量的环形缓冲区（deque），超出条数上限或 Token 预算时从最旧的一条开始淘汰。
+    每条记录在加入时就渲染好提示词片段，构建上下文提示时只需拼接缓存的片段；
+    片段的 Token 数在首次需要时（设置了 Token 预算）才估算并缓存。
+    """
+
+    def __init__(self, max_entries=10, max_tokens=0):
+        self.max_entries = max(int(max_entries), 1)
+        self.max_tokens = max_tokens or 0  # 0 表示不限
+        self.total_tokens = 0
+        # 每条记录: [原文, 译文, 说话人, 语言, 渲染好的片段, Token 数（未估算时为 None）]
+        self._entries = deque(maxlen=self.max_entries)
+        self._rendered = None  # (语言, Token 上限, 上次拼接结果)，有新记录时失效；重试时不必重新拼接
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __iter__(self):
+        """按从旧到新的顺序产出 (原文, 译文, 说话人)"""
+        for original, translation, role, _, _, _ in self._entries:
+            yield original, translation, role
+
+    @staticmethod
+    def _render(original, translation, role, language):
+        role_info = f" [{role}]" if role else ""
+        return f"{role_info}:\n原文: {original}\n{language}译文: {translation}\n\n"
+
+    def append(self, original, translation, role=None, language="英文"):
+        entry = [original, translation, role, language, self._render(original, translation, role, language), None]
+        self._rendered = None
+        if not self.max_tokens:
+            self._entries.append(entry)
+            return
+
+        if len(self._entries) == self.max_entries:
+            self.total_tokens -= self._tokens(self._entries[0])
+        self._entries.append(entry)
+        self.total_tokens += self._tokens(entry)
+        while self._entries and self.total_tokens > self.max_tokens:
+            self.total_tokens -= self._tokens(self._entries.popleft())
+
+    @staticmethod
+    def _tokens(entry):
+        if entry[5] is None:
+            entry[5] = estimate_tokens(entry[4])
+        return entry[5]
+
+    def clear(self):
+        self._entries.clear()
+        self.total_tokens = 0
+        self._rendered = None
+
+    def render(self, language="英文", max_tokens=None):
+        """拼接缓存的片段为上下文提示；为空时返回空字符串
+
+        max_tokens 限制本次渲染的 Token 数：从最新的一条往前保留，放不下的旧记录不渲染（不会被淘汰）。
+        """
+        if not self._entries:
+            return ""
+        if self._rendered is not None and self._rendered[:2] == (language, max_tokens):
+            return self._rendered[2]
+
+        entries = list(self._entries)
+        if max_tokens is not None:
+            used = estimate_tokens(self._header(language))
+            label_tokens = estimate_tokens(f"前文{len(entries)}")  # 每条的序号标签
+            keep = 0
+            for entry in reversed(entries):
+                used += self._tokens(entry) + label_tokens
+                if used > max_tokens:
+                    break
+                keep += 1
+            entries = entries[len(entries) - keep:]
+            if not entries:
+                return ""
+
+        pieces = [self._header(language)]
+        for i, (original, translation, role, entry_language, fragment, _) in enumerate(entries, 1):
+            if entry_language != language:
+                fragment = self._render(original, translation, role, language)
+            pieces.append(f"前文{i}")
+            pieces.append(fragment)
+        rendered = "".join(pieces)
+        self._rendered = (language, max_tokens, rendered)
+        return rendered
+
+    @staticmethod
+    def _header(language):
+        return f"\n\n### 重要上下文参考（{language}翻译）：\n"
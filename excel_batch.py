@@ -0,0 +1,148 @@
+# excel_batch.py - 按对照表一次完成多组词语的搜索替换
+#
+# 术语迁移通常有几百组 旧词→新词，逐组搜索替换要把整个文件夹扫几百遍、每个工作簿
+# 加载保存几百次。这里把所有搜索词编译成一个正则（每组一个捕获分组，按长度从长到短
+# 排列），每个文件只扫描一次，命中的单元格一次替换完所有词语，每个工作簿只写一次：
+#   - 同一位置能匹配多组时取最长的搜索词，长度相同时取对照表中靠前的一组
+#   - 替换一趟完成，替换结果不会被其他组再次匹配（不会出现 A→B→C 的连锁替换）
+#   - 替换文本按原样写入，不解释反斜杠等正则替换语法
+# 统计每组的命中次数、替换次数、单元格数和文件数，供页面展示。
+
+import re
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+from excel_scan import multi_matcher, scan_files
+from xlsx_patch import patch_cells
+
+
+def load_term_pairs(source):
+    """读取对照表（Excel / CSV，第一行为表头），返回 [(搜索词, 替换为), ...]
+
+    使用前两列；搜索词为空的行跳过，替换为空表示删除该词。source 为文件路径或上传的文件对象。
+    """
+    name = str(getattr(source, 'name', source))
+    if hasattr(source, 'seek'):
+        source.seek(0)  # 页面每次重新运行都会重新读取上传的文件
+    if name.lower().endswith('.csv'):
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    else:
+        df = pd.read_excel(source, dtype=str, keep_default_na=False)
+
+    if df.shape[1] < 2:
+        raise ValueError("对照表至少需要两列：搜索词、替换为")
+
+    pairs = []
+    for search, replace in zip(df.iloc[:, 0], df.iloc[:, 1]):
+        search = "" if pd.isna(search) else str(search)
+        replace = "" if pd.isna(replace) else str(replace)
+        if search:
+            pairs.append((search, replace))
+    return pairs
+
+
+class TermReplacer:
+    """多组搜索词编译成的单个匹配器"""
+
+    def __init__(self, pairs, case_sensitive=False, match_whole_word=False):
+        self.pairs = list(pairs)
+        if not self.pairs:
+            raise ValueError("对照表中没有有效的搜索词")
+        self.case_sensitive = case_sensitive
+        self.match_whole_word = match_whole_word
+
+        # 长的搜索词排在前面，同一位置优先匹配最长的一组（sorted 稳定，等长时保持对照表顺序）
+        order = sorted(range(len(self.pairs)), key=lambda i: len(self.pairs[i][0]), reverse=True)
+        self._group_pairs = order  # 第 k 个捕获分组对应的对照表序号
+        alternatives = "|".join(f"({re.escape(self.pairs[i][0])})" for i in order)
+        if match_whole_word:
+            self.pattern = r'\b(?:' + alternatives + r')\b'
+        else:
+            self.pattern = alternatives
+        self.flags = 0 if case_sensitive else re.IGNORECASE
+        self.regex = re.compile(self.pattern, self.flags)
+
+    def matcher(self):
+        """供 excel_scan.scan_files 使用的匹配器，每个匹配返回 (起, 止, 对照表序号)"""
+        return multi_matcher(self.pattern, self.flags, [search for search, _ in self.pairs], self._group_pairs)
+
+    def replace(self, text):
+        """一趟替换所有搜索词，返回 (新文本, Counter{对照表序号: 替换次数})"""
+        counts = Counter()
+
+        def substitute(match):
+            pair_idx = self._group_pairs[match.lastindex - 1]
+            counts[pair_idx] += 1
+            return self.pairs[pair_idx][1]
+
+        return self.regex.sub(substitute, text), counts
+
+
+def scan_term_pairs(files, replacer, use_processes=False, progress_callback=None):
+    """每个文件扫描一次，返回 (命中 {文件: [(工作表, 行, 列, 文本, [(起, 止, 序号), ...]), ...]}, 错误 {文件: 信息})
+
+    按 data_only=False 读取（公式单元格为公式文本），与替换时写入的单元格值一致。
+    """
+    files = list(files)
+    found = {}
+    errors = {}
+    scanned = scan_files(files, replacer.matcher(), data_only=False, use_processes=use_processes)
+    for completed, (path, sheet_names, hits, error) in enumerate(scanned, start=1):
+        if error is not None:
+            errors[path] = error
+        elif hits:
+            found[path] = [(sheet_names[sheet_idx], row_idx, col_idx, text, spans)
+                           for sheet_idx, row_idx, col_idx, text, spans in hits]
+        if progress_callback:
+            progress_callback(completed, len(files))
+
+    # 按文件列表的顺序整理（扫描结果按完成顺序返回）
+    ordered = {str(path): found[str(path)] for path in files if str(path) in found}
+    return ordered, errors
+
+
+def replace_in_workbook(file_path, cells, replacer, backup=True):
+    """对一个工作簿中命中的单元格执行全部替换，整个工作簿只写一次
+
+    cells 为 [(工作表, 行, 列), ...]。只改写这些单元格所在的工作表 XML（见 xlsx_patch），
+    公式单元格和非文本单元格（数字、日期等）不替换。返回 Counter{对照表序号: 替换次数}。
+    """
+    backup_path = f"{file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}" if backup else None
+    changes = patch_cells(file_path, cells, lambda text: replacer.replace(text)[0], backup_path=backup_path)
+
+    counts = Counter()
+    for *_, old_text, _ in changes:
+        counts.update(replacer.replace(old_text)[1])
+    return counts
+
+
+def term_pair_report(replacer, found, replaced=None):
+    """每组词语一行的统计表：命中次数 / 单元格数 / 文件数（替换后另有替换次数）"""
+    hit_counts = Counter()
+    cell_counts = Counter()
+    file_counts = Counter()
+    for cells in found.values():
+        in_file = set()
+        for *_, spans in cells:
+            in_cell = {pair_idx for _, _, pair_idx in spans}
+            for _, _, pair_idx in spans:
+                hit_counts[pair_idx] += 1
+            cell_counts.update(in_cell)
+            in_file |= in_cell
+        file_counts.update(in_file)
+
+    rows = []
+    for pair_idx, (search, replace) in enumerate(replacer.pairs):
+        row = {
+            "搜索词": search,
+            "替换为": replace,
+            "命中次数": hit_counts[pair_idx],
+            "单元格数": cell_counts[pair_idx],
+            "文件数": file_counts[pair_idx],
+        }
+        if replaced is not None:
+            row["替换次数"] = replaced[pair_idx]
+        rows.append(row)
+    return pd.DataFrame(rows)
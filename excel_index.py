@@ -0,0 +1,373 @@
+# excel_index.py - Excel 单元格文本的持久化全文索引（SQLite）
+#
+# 对文件夹中每个工作簿的单元格文本建立二元组（bigram）倒排索引，按字符切分，
+# 因此中文、日文等没有空格分词的文本也能按任意子串查找。倒排表按文件存放：
+# 每个 (二元组, 文件) 一行，值为该文件内包含此二元组的单元格序号列表。
+#
+# 搜索时先用搜索词的全部二元组求交集得到候选单元格，再只对候选单元格跑原来的
+# 正则，输出与逐个打开工作簿扫描完全相同的匹配记录。索引文本统一做大小写折叠
+# （与 re.IGNORECASE 的等价规则一致），大小写敏感搜索由最后的正则校验负责。
+#
+# 增量更新：记录每个文件的 mtime / 大小 / SHA-1，只重新解析发生变化的文件；
+# 仅 mtime 变化而内容相同（例如复制、同步工具）时比对哈希后直接沿用旧索引。
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import openpyxl
+
+from tokenizer_cache import available_cpus
+
+DEFAULT_INDEX_PATH = "./translation_saves/excel_index.db"
+QUERY_CHUNK_SIZE = 500  # 一次 IN (...) 查询的单元格数，低于 SQLite 变量个数上限
+
+# 单元格文本末尾追加的哨兵字符，让每个字符都至少作为一个二元组的首字出现，单字搜索可按前缀查找
+_END = "\x00"
+
+# 先于 str.lower() 处理：İ 的完整小写是两个字符，re 的简单小写映射为 i
+_PRE_FOLD = str.maketrans({"İ": "i"})
+# re.IGNORECASE 额外视为相同、但 str.lower() 结果不同的字符，统一折叠到同一个字符
+_FOLD = str.maketrans({
+    "ı": "i", "ſ": "s", "µ": "μ", "ς": "σ", "ϐ": "β",
+    "ϵ": "ε", "ϑ": "θ", "ϰ": "κ", "ϖ": "π", "ϱ": "ρ",
+    "ϕ": "φ", "ͅ": "ι", "ι": "ι", "ΐ": "ΐ", "ΰ": "ΰ",
+    "ᲀ": "в", "ᲁ": "д", "ᲂ": "о", "ᲃ": "с", "ᲄ": "т",
+    "ᲅ": "т", "ᲆ": "ъ", "ᲇ": "ѣ", "ᲈ": "ꙋ", "ẛ": "ṡ",
+    "ﬅ": "ﬆ",
+})
+
+
+def fold_text(text):
+    """大小写折叠：re.IGNORECASE 下能互相匹配的字符折叠后相同，且不改变文本长度"""
+    return text.translate(_PRE_FOLD).lower().translate(_FOLD)
+
+
+def text_grams(text):
+    """单元格文本的二元组集合（含末尾哨兵）"""
+    folded = fold_text(text) + _END
+    return {folded[i:i + 2] for i in range(len(folded) - 1)}
+
+
+def read_workbook_cells(file_path):
+    """按 multithreaded_search 的遍历顺序读出所有非空单元格 [(工作表, 行, 列, 文本), ...]"""
+    cells = []
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet_name in wb.sheetnames:
+            sheet = wb[sheet_name]
+            for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                for col_idx, value in enumerate(row, start=1):
+                    if value is not None:
+                        cells.append((sheet_name, row_idx, col_idx, str(value)))
+    finally:
+        wb.close()
+    return cells
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _parse_file(file_path):
+    """解析单个文件并计算其倒排表；无法读取时返回错误信息（不抛出）"""
+    try:
+        digest = file_digest(file_path)
+        cells = read_workbook_cells(file_path)
+    except Exception as e:
+        return None, [], {}, str(e) or type(e).__name__
+
+    postings = {}
+    for ordinal, cell in enumerate(cells):
+        for gram in text_grams(cell[3]):
+            postings.setdefault(gram, []).append(ordinal)
+    return digest, cells, postings, None
+
+
+class ExcelIndex:
+    """Excel 单元格全文索引
+
+    refresh(files) 增量更新索引，search(files, ...) 在索引中查找，
+    返回与 multithreaded_search 相同结构的 {文件路径: {'matches', 'match_count'}}。
+    """
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE,
+                mtime_ns INTEGER,
+                size INTEGER,
+                sha1 TEXT,
+                cell_count INTEGER,
+                error TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cells (
+                file_id INTEGER,
+                ordinal INTEGER,
+                sheet_name TEXT,
+                row INTEGER,
+                col INTEGER,
+                text TEXT,
+                PRIMARY KEY (file_id, ordinal)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS grams (
+                gram TEXT,
+                file_id INTEGER,
+                ordinals BLOB,
+                PRIMARY KEY (gram, file_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_grams_file ON grams(file_id)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(str(file_path))
+
+    def refresh(self, files, root=None, max_workers=None, progress_callback=None, use_processes=False):
+        """增量更新索引，返回 {'indexed', 'unchanged', 'failed', 'removed'} 计数
+
+        只重新解析 mtime / 大小变化且 SHA-1 也变化的文件；指定 root 时，
+        清除 root 下已不存在（不在 files 中）的文件的索引。
+        progress_callback(已完成数, 总数) 用于显示进度。use_processes 时在进程池中解析文件。
+        """
+        files = [str(f) for f in files]
+        keys = {self._key(f): f for f in files}
+        with self._lock:
+            known = {
+                path: (file_id, mtime_ns, size, sha1)
+                for file_id, path, mtime_ns, size, sha1 in
+                self._conn.execute("SELECT id, path, mtime_ns, size, sha1 FROM files")
+            }
+
+        stats = {'indexed': 0, 'unchanged': 0, 'failed': 0, 'removed': 0}
+        if root is not None:
+            prefix = os.path.join(self._key(root), "")
+            stale = [path for path in known if path.startswith(prefix) and path not in keys]
+            with self._lock:
+                for path in stale:
+                    self._delete_file(known[path][0])
+                    self._conn.execute("DELETE FROM files WHERE id = ?", (known[path][0],))
+                self._conn.commit()
+            stats['removed'] = len(stale)
+
+        total = len(keys)
+        completed = 0
+        to_parse = []
+        for key in keys:
+            try:
+                st = os.stat(key)
+            except OSError:
+                continue
+            entry = known.get(key)
+            if entry is not None and entry[1] == st.st_mtime_ns and entry[2] == st.st_size:
+                stats['unchanged'] += 1
+                completed += 1
+                continue
+            to_parse.append((key, st, entry))
+
+        if progress_callback and completed:
+            progress_callback(completed, total)
+
+        # 大小相同而 mtime 变化的文件先比对哈希，内容未变时只更新 mtime
+        changed = []
+        for key, st, entry in to_parse:
+            if entry is not None and entry[2] == st.st_size:
+                try:
+                    same = file_digest(key) == entry[3]
+                except OSError:
+                    same = False
+                if same:
+                    with self._lock:
+                        self._conn.execute("UPDATE files SET mtime_ns = ? WHERE id = ?", (st.st_mtime_ns, entry[0]))
+                        self._conn.commit()
+                    stats['unchanged'] += 1
+                    completed += 1
+                    continue
+            changed.append((key, st))
+
+        if changed:
+            if use_processes:
+                executor = ProcessPoolExecutor(max_workers=max_workers or available_cpus())
+            else:
+                executor = ThreadPoolExecutor(max_workers=max_workers or min(16, (os.cpu_count() or 4) * 2))
+            with executor:
+                futures = {executor.submit(_parse_file, key): (key, st) for key, st in changed}
+                for future in as_completed(futures):
+                    key, st = futures[future]
+                    digest, cells, postings, error = future.result()
+                    self._store(key, st, digest, cells, postings, error)
+                    stats['failed' if error else 'indexed'] += 1
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, total)
+        return stats
+
+    def _delete_file(self, file_id):
+        self._conn.execute("DELETE FROM cells WHERE file_id = ?", (file_id,))
+        self._conn.execute("DELETE FROM grams WHERE file_id = ?", (file_id,))
+
+    def _store(self, key, st, digest, cells, postings, error):
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM files WHERE path = ?", (key,)).fetchone()
+            if row is None:
+                file_id = self._conn.execute(
+                    "INSERT INTO files (path, mtime_ns, size, sha1, cell_count, error) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, st.st_mtime_ns, st.st_size, digest, len(cells), error)
+                ).lastrowid
+            else:
+                file_id = row[0]
+                self._delete_file(file_id)
+                self._conn.execute(
+                    "UPDATE files SET mtime_ns = ?, size = ?, sha1 = ?, cell_count = ?, error = ? WHERE id = ?",
+                    (st.st_mtime_ns, st.st_size, digest, len(cells), error, file_id)
+                )
+            self._conn.executemany(
+                "INSERT INTO cells (file_id, ordinal, sheet_name, row, col, text) VALUES (?, ?, ?, ?, ?, ?)",
+                ((file_id, ordinal) + cell for ordinal, cell in enumerate(cells))
+            )
+            self._conn.executemany(
+                "INSERT INTO grams (gram, file_id, ordinals) VALUES (?, ?, ?)",
+                ((gram, file_id, array('I', ordinals).tobytes()) for gram, ordinals in postings.items())
+            )
+            self._conn.commit()
+
+    def _candidates(self, term, file_ids):
+        """搜索词所有二元组的倒排表求交集，返回 {file_id: 候选单元格序号集合}"""
+        folded = fold_text(term)
+        if len(folded) == 1:
+            # 单字：所有以该字开头的二元组（含末尾哨兵）的并集
+            rows = self._conn.execute(
+                "SELECT file_id, ordinals FROM grams WHERE gram >= ? AND gram < ?",
+                (folded, folded + "\U0010ffff")
+            ).fetchall()
+            candidates = {}
+            for file_id, blob in rows:
+                if file_id in file_ids:
+                    candidates.setdefault(file_id, set()).update(array('I', blob))
+            return candidates
+
+        candidates = None
+        for gram in {folded[i:i + 2] for i in range(len(folded) - 1)}:
+            postings = {}
+            for file_id, blob in self._conn.execute("SELECT file_id, ordinals FROM grams WHERE gram = ?", (gram,)):
+                if file_id in file_ids and (candidates is None or file_id in candidates):
+                    ordinals = set(array('I', blob))
+                    if candidates is not None:
+                        ordinals &= candidates[file_id]
+                    if ordinals:
+                        postings[file_id] = ordinals
+            candidates = postings
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, files, regex, term):
+        """在已建立索引的 files 中查找 regex（由 term 构造的已编译正则）
+
+        term 用于查倒排表得到候选单元格，regex 对候选单元格做最终匹配。
+        返回 ({文件路径: {'matches', 'match_count'}}, 匹配总数)，文件路径与传入的 files 一致。
+        """
+        if not term:
+            return {}, 0
+
+        keys = {self._key(f): str(f) for f in files}
+        with self._lock:
+            ids = {
+                file_id: path for file_id, path in
+                self._conn.execute("SELECT id, path FROM files WHERE error IS NULL")
+                if path in keys
+            }
+            candidates = self._candidates(term, ids)
+
+            cells_by_file = {}
+            for file_id, ordinals in candidates.items():
+                ordinals = sorted(ordinals)
+                cells = []
+                for i in range(0, len(ordinals), QUERY_CHUNK_SIZE):
+                    chunk = ordinals[i:i + QUERY_CHUNK_SIZE]
+                    cells.extend(self._conn.execute(
+                        "SELECT ordinal, sheet_name, row, col, text FROM cells "
+                        f"WHERE file_id = ? AND ordinal IN ({','.join('?' * len(chunk))})",
+                        [file_id] + chunk
+                    ))
+                cells.sort()
+                cells_by_file[file_id] = cells
+
+        results = {}
+        total_matches = 0
+        order = {path: i for i, path in enumerate(keys)}
+        for file_id in sorted(cells_by_file, key=lambda file_id: order[ids[file_id]]):
+            file_matches = []
+            for _, sheet_name, row, col, text in cells_by_file[file_id]:
+                for match in regex.finditer(text):
+                    file_matches.append({
+                        'sheet_name': sheet_name,
+                        'row': row,
+                        'column': col,
+                        'original_text': text,
+                        'matched_text': match.group(),
+                        'start_pos': match.start(),
+                        'end_pos': match.end()
+                    })
+            if file_matches:
+                results[keys[ids[file_id]]] = {
+                    'matches': file_matches,
+                    'match_count': len(file_matches)
+                }
+                total_matches += len(file_matches)
+        return results, total_matches
+
+    def stats(self):
+        with self._lock:
+            files, failed, cells = self._conn.execute(
+                "SELECT COUNT(*), COUNT(error), COALESCE(SUM(cell_count), 0) FROM files"
+            ).fetchone()
+        return {'files': files, 'failed': failed, 'cells': cells}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM grams")
+            self._conn.execute("DELETE FROM cells")
+            self._conn.execute("DELETE FROM files")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def open_excel_index(db_path=DEFAULT_INDEX_PATH):
+    """获取（进程内共享的）Excel 全文索引实例"""
+    key = os.path.abspath(db_path)
+    with _instances_lock:
+        index = _instances.get(key)
+        if index is None:
+            index = ExcelIndex(db_path)
+            _instances[key] = index
+        return index
@@ -0,0 +1,165 @@
+# excel_scan.py - 多进程扫描文件夹中的 Excel 单元格
+#
+# openpyxl 解析是纯 Python 代码，受 GIL 限制，多线程几乎不比串行快。这里把文件分块
+# 交给进程池解析和匹配，每个文件的结果以紧凑形式返回主进程：
+#   (文件路径, 工作表名列表, [(工作表序号, 行, 列, 单元格文本, [(起, 止), ...]), ...], 错误信息)
+# 每个单元格的文本只传一次，由调用方展开成页面使用的匹配记录，
+# 不在进程间传递每个匹配一份原文的大字典。
+#
+# 分块按文件大小均衡：从大到小排序后装箱，每块的总字节数接近 总大小 /（进程数 × 4），
+# 超大的工作簿单独成块并最先提交，避免最后只剩一个进程在解析大文件而其他进程空闲；
+# 小文件合并成块，减少进程间往返次数。
+#
+# .xlsx / .xlsm 默认走 xlsx_stream 直接解析 XML 的快速路径（结果与 openpyxl 只读模式相同），
+# 快速路径不支持的文件（.xls、图表工作表等）自动改用 openpyxl。
+
+import os
+import re
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from xml.etree.ElementTree import ParseError
+
+import openpyxl
+
+from tokenizer_cache import available_cpus
+from xlsx_stream import UnsupportedWorkbook, scan_xlsx
+
+CHUNKS_PER_WORKER = 4  # 每个进程平均分到的块数，越多负载越均衡，进程间往返也越多
+
+
+def regex_matcher(pattern, flags=0, literal=None):
+    """按正则匹配：每个匹配返回一个 (起, 止)
+
+    literal 为正则对应的搜索词原文（正则由 re.escape(搜索词) 构造时），快速路径据此跳过不可能命中的单元格。
+    """
+    return ('regex', pattern, flags, literal)
+
+
+def substring_matcher(term, case_sensitive=False):
+    """按子串包含判断（与 `term in text` / `term.lower() in text.lower()` 一致），不返回位置"""
+    return ('substring', term, case_sensitive, term)
+
+
+def multi_matcher(pattern, flags, literals, group_pairs):
+    """多组搜索词编译成的正则：每个匹配返回 (起, 止, 组序号)
+
+    pattern 中每组搜索词一个捕获分组，group_pairs[k] 为第 k 个分组对应的组序号；
+    literals 为各组搜索词原文，快速路径据此预筛。
+    """
+    return ('multi', pattern, flags, tuple(literals), tuple(group_pairs))
+
+
+def _compile_matcher(matcher):
+    kind = matcher[0]
+    if kind == 'regex':
+        regex = re.compile(matcher[1], matcher[2])
+        return lambda text: [m.span() for m in regex.finditer(text)] or None
+    if kind == 'multi':
+        regex = re.compile(matcher[1], matcher[2])
+        group_pairs = matcher[4]
+        return lambda text: [m.span() + (group_pairs[m.lastindex - 1],) for m in regex.finditer(text)] or None
+
+    term, case_sensitive = matcher[1], matcher[2]
+    if case_sensitive:
+        return lambda text: [] if term in text else None
+    term = term.lower()
+    return lambda text: [] if term in text.lower() else None
+
+
+def scan_workbook(file_path, match, data_only=True):
+    """扫描单个工作簿，返回 (工作表名列表, 命中单元格列表)；match(text) 未命中时返回 None"""
+    hits = []
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=data_only)
+    try:
+        sheet_names = wb.sheetnames
+        for sheet_idx, sheet_name in enumerate(sheet_names):
+            sheet = wb[sheet_name]
+            for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                for col_idx, value in enumerate(row, start=1):
+                    if value is not None:
+                        text = str(value)
+                        spans = match(text)
+                        if spans is not None:
+                            hits.append((sheet_idx, row_idx, col_idx, text, spans))
+    finally:
+        wb.close()
+    return sheet_names, hits
+
+
+def _scan_one(path, match, literal, data_only, fast_xml):
+    if fast_xml:
+        try:
+            return scan_xlsx(path, match, data_only, literal=literal)
+        except (UnsupportedWorkbook, zipfile.BadZipFile, zlib.error, ParseError, KeyError, OSError):
+            # 快速路径不支持或文件读取失败时用 openpyxl 重新读取，失败信息与原来一致；
+            # 其他异常是快速路径自身的问题，直接报告而不是悄悄回退
+            pass
+    return scan_workbook(path, match, data_only)
+
+
+def _scan_chunk(paths, matcher, data_only, fast_xml=True):
+    match = _compile_matcher(matcher)
+    results = []
+    for path in paths:
+        try:
+            sheet_names, hits = _scan_one(path, match, matcher[3], data_only, fast_xml)
+            results.append((path, sheet_names, hits, None))
+        except Exception as e:
+            results.append((path, [], [], str(e) or type(e).__name__))
+    return results
+
+
+def plan_chunks(files, workers, chunks_per_worker=CHUNKS_PER_WORKER):
+    """按文件大小把文件分块，返回 [[路径, ...], ...]，总字节数大的块在前"""
+    sized = []
+    for path in files:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        sized.append((size, str(path)))
+    sized.sort(key=lambda item: item[0], reverse=True)
+
+    total = sum(size for size, _ in sized)
+    target = max(total // max(workers * chunks_per_worker, 1), 1)
+    chunks = []
+    current, current_size = [], 0
+    for size, path in sized:
+        current.append(path)
+        current_size += size
+        if current_size >= target:
+            chunks.append(current)
+            current, current_size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def scan_files(files, matcher, data_only=True, use_processes=True, workers=None, fast_xml=True):
+    """扫描多个工作簿，按完成顺序逐个文件产出 (路径, 工作表名列表, 命中单元格列表, 错误信息)
+
+    use_processes 为 False 时使用线程池（与原来的多线程搜索相同）；
+    fast_xml 为 False 时全部用 openpyxl 只读模式解析。
+    """
+    files = list(files)
+    if not files:
+        return
+
+    if use_processes:
+        workers = workers or available_cpus()
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        workers = workers or min(16, (os.cpu_count() or 4) * 2)
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    with executor:
+        futures = [executor.submit(_scan_chunk, chunk, matcher, data_only, fast_xml)
+                   for chunk in plan_chunks(files, workers)]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            # 调用方提前停止迭代时不再启动剩余的块
+            for future in futures:
+                future.cancel()
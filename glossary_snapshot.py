@@ -0,0 +1,191 @@
+# glossary_snapshot.py - 预编译术语库快照
+#
+# 术语库 Excel 按文件内容哈希缓存两层：
+#   <哈希>.frame.pkl         解析后的 DataFrame（重新上传同一文件时不再经过 openpyxl）
+#   <哈希>-<列配置>.glossary  已编译的术语索引 + jieba 用户词条（pickle）
+# 快照加载后缓存在进程内（LRU，只保留最近使用的几份），所有 Streamlit 会话只读共享同一份对象。
+
+import gc
+import hashlib
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_SNAPSHOT_DIR = "./translation_saves/glossary_snapshots"
+SNAPSHOT_VERSION = 1
+FRAME_SUFFIX = ".frame.pkl"
+SNAPSHOT_SUFFIX = ".glossary"
+MAX_CACHED_FRAMES = 4  # 进程内缓存的术语库 DataFrame 份数
+MAX_CACHED_SNAPSHOTS = 4  # 进程内缓存的已编译快照份数
+
+_snapshots = OrderedDict()
+_frames = OrderedDict()
+_registered_words = set()  # 已注册到 jieba 的快照键（jieba 词典为进程级全局状态）
+_cache_lock = threading.Lock()
+
+
+class GlossarySnapshot:
+    """已编译的术语库：各语言术语列表与 TermAutomaton 索引，以及需要注册到分词器的词条
+
+    多语言术语库填充 term_base_dict / term_index_dict，单语言术语库填充
+    term_base_list / term_index。jieba_words 为 [(词, 词频)]，按加载时的注册顺序排列。
+    在会话间共享，使用方不得修改其中的对象。
+    """
+
+    def __init__(self, key, term_base_dict=None, term_index_dict=None, term_base_list=None,
+                 term_index=None, jieba_words=None):
+        self.version = SNAPSHOT_VERSION
+        self.key = key
+        self.term_base_dict = term_base_dict or {}
+        self.term_index_dict = term_index_dict or {}
+        self.term_base_list = term_base_list or []
+        self.term_index = term_index
+        self.jieba_words = jieba_words or []
+
+    @property
+    def term_count(self):
+        if self.term_base_dict:
+            return sum(len(terms) for terms in self.term_base_dict.values())
+        return len(self.term_base_list)
+
+
+def content_hash(data):
+    """文件内容的 SHA-256 摘要"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def snapshot_key(file_hash, source_col, target_cols):
+    """快照键：文件内容哈希 + 列配置（同一文件选不同的列会编译出不同的索引）
+
+    target_cols 为单个列名（单语言术语库）或 {语言: 列名}。
+    """
+    columns = json.dumps([source_col, target_cols], ensure_ascii=False, sort_keys=True)
+    return f"{file_hash[:32]}-{hashlib.sha256(columns.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache, key, value, max_size, replace=False):
+    """放入 LRU 缓存并淘汰最久未用的项，返回缓存中的对象（replace=False 时保留已有的同键对象）"""
+    with _cache_lock:
+        if replace:
+            cache[key] = value
+        else:
+            value = cache.setdefault(key, value)
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+        return value
+
+
+def _write_atomic(path, write):
+    """写到同目录的独立临时文件再整体替换，多个会话同时保存同一个键也不会互相覆盖"""
+    folder, name = os.path.split(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_glossary_file(uploaded_file, directory=DEFAULT_SNAPSHOT_DIR):
+    """读取上传的术语库 Excel，返回 (DataFrame, 内容哈希)
+
+    列名会去除首尾空白和换行。同一内容的文件只解析一次，之后从进程内缓存或
+    <哈希>.frame.pkl 读取；返回的 DataFrame 为共享对象，调用方需要修改时应先 copy()。
+    """
+    data = uploaded_file.getvalue()
+    file_hash = content_hash(data)
+
+    df = _cache_get(_frames, file_hash)
+    if df is not None:
+        return df, file_hash
+
+    frame_path = os.path.join(directory, file_hash[:32] + FRAME_SUFFIX)
+    df = None
+    if os.path.exists(frame_path):
+        try:
+            df = pd.read_pickle(frame_path)
+        except Exception:
+            df = None
+    if df is None:
+        df = pd.read_excel(io.BytesIO(data))
+        df.columns = df.columns.str.strip().str.replace('\n', '').str.replace('\r', '')
+        try:
+            _write_atomic(frame_path, df.to_pickle)
+        except OSError:
+            pass
+
+    return _cache_put(_frames, file_hash, df, MAX_CACHED_FRAMES), file_hash
+
+
+def load_snapshot(key, directory=DEFAULT_SNAPSHOT_DIR):
+    """按键获取快照：先查进程内缓存，再读磁盘；不存在或版本不符时返回 None"""
+    snapshot = _cache_get(_snapshots, key)
+    if snapshot is not None:
+        return snapshot
+
+    path = os.path.join(directory, key + SNAPSHOT_SUFFIX)
+    if not os.path.exists(path):
+        return None
+    # 快照由大量小对象组成，反序列化期间暂停 GC 可明显缩短加载时间
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    if not isinstance(snapshot, GlossarySnapshot) or snapshot.version != SNAPSHOT_VERSION:
+        return None
+
+    return _cache_put(_snapshots, key, snapshot, MAX_CACHED_SNAPSHOTS)
+
+
+def save_snapshot(snapshot, directory=DEFAULT_SNAPSHOT_DIR):
+    """写入磁盘并放入进程内缓存；写盘失败时仍可在本进程内复用"""
+    _cache_put(_snapshots, snapshot.key, snapshot, MAX_CACHED_SNAPSHOTS, replace=True)
+    path = os.path.join(directory, snapshot.key + SNAPSHOT_SUFFIX)
+    try:
+        _write_atomic(path, lambda f: pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        return None
+    return path
+
+
+def register_jieba_words(snapshot, tokenizer):
+    """把快照中的词条注册到分词器（每个进程每个快照只注册一次）
+
+    词频在编译时已算好，直接传给 add_word，省去逐词 suggest_freq 的分词开销。
+    """
+    if tokenizer is None or not snapshot.jieba_words:
+        return
+    with _cache_lock:
+        if snapshot.key in _registered_words:
+            return
+        _registered_words.add(snapshot.key)
+    for word, freq in snapshot.jieba_words:
+        try:
+            tokenizer.add_word(word, freq)
+        except Exception:
+            pass
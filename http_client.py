@@ -0,0 +1,80 @@
+# http_client.py - 共享的连接池 HTTP 客户端
+#
+# 所有调用 LLM API 的地方都应通过这里获取客户端，复用 TCP/TLS 连接，
+# 避免每个请求都重新握手。
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_CONNECTIONS = 10  # 缓存的主机连接池数量
+DEFAULT_POOL_MAXSIZE = 32  # 每个主机最多保持的连接数
+DEFAULT_KEEPALIVE_EXPIRY = 60.0  # 空闲连接保持时间（秒，仅 httpx 客户端）
+
+_sessions = {}
+_openai_clients = {}
+_lock = threading.Lock()
+
+
+def get_http_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                     pool_block=True, keep_alive=True):
+    """获取共享的 requests.Session（相同配置的调用方共用同一个连接池）
+
+    pool_connections: 按主机缓存的连接池个数
+    pool_maxsize: 每个主机的最大连接数（并发线程数不应超过它）
+    pool_block: 连接池耗尽时是否等待空闲连接，True 即为严格的单主机并发上限
+    keep_alive: False 时每次请求后关闭连接（用于对比或规避有问题的代理）
+    """
+    key = (pool_connections, pool_maxsize, pool_block, keep_alive)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            if not keep_alive:
+                session.headers["Connection"] = "close"
+            _sessions[key] = session
+        return session
+
+
+def get_openai_client(api_key, base_url, max_connections=DEFAULT_POOL_MAXSIZE,
+                      keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY):
+    """获取共享的 OpenAI 客户端（底层 httpx 连接池按 api_key + base_url 复用）
+
+    SDK 自带的重试已关闭（max_retries=0）：429 / 5xx 由调用方重试，
+    这样共享限速器和熔断器才能看到每一次失败。
+    """
+    from openai import OpenAI
+    import httpx
+
+    key = (api_key, base_url, max_connections, keepalive_expiry)
+    with _lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                            http_client=httpx.Client(limits=limits))
+            _openai_clients[key] = client
+        return client
+
+
+def close_all_clients():
+    """关闭所有共享连接（例如修改代理设置后）"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        for client in _openai_clients.values():
+            client.close()
+        _sessions.clear()
+        _openai_clients.clear()
@@ -1,15 +1,18 @@
 import streamlit as st
 import pandas as pd
 import re
-import jieba
 import time
 import json
 import os
-import random
-from openai import OpenAI
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
+from http_client import get_openai_client
+from async_client import chat_completions_url, run_chat_requests
+from rate_limiter import get_shared_limiter, limiter_key
+from token_budget import get_token_counter
+from tokenizer_cache import format_tokenizer_stats, get_tokenizer
+
 # ==========================================
 # 0. 配置管理系统
 # ==========================================
@@ -22,10 +25,12 @@ def load_config():
         "api_key": "",
         "model_name": "deepseek-chat",
         "max_threads": 5,
+        "use_async": False,
         "max_retries": 3,
         "timeout": 30,
         "custom_instruction": "",
         "min_group_size": 3,
+        "glossary_token_budget": 0,
         "col_src_name": "Chinese_PRC",
         "col_tgt1_name": "English",
         "col_tgt2_name": "Japanese",
@@ -91,10 +96,12 @@ def build_glossary_dict(df, src_col, tgt1_col, tgt2_col):
             if not lookup[key]["t2"] and t2: lookup[key]["t2"] = t2
     return lookup
 
-def generate_hints_list(text, lookup_dict):
+def _hint_source_text(text):
+    return re.sub(r'\{(VAR|NUM)\d+\}', ' ', str(text))
+
+def generate_hints_list(text, lookup_dict, words=None):
     if not text: return []
-    clean_text = re.sub(r'\{(VAR|NUM)\d+\}', ' ', str(text))
-    words = jieba.lcut(clean_text)
+    if words is None: words = get_tokenizer().lcut(_hint_source_text(text))
     found = []
     seen = set()
     for w in words:
@@ -106,6 +113,12 @@ def generate_hints_list(text, lookup_dict):
                 seen.add(w)
     return found
 
+def generate_hints_lists(texts, lookup_dict):
+    """批量生成术语提示 {文本: 提示列表}；文本很多时分词在进程池中并行完成"""
+    texts = [t for t in dict.fromkeys(texts) if t]
+    words_list = get_tokenizer().lcut_many([_hint_source_text(t) for t in texts])
+    return {t: generate_hints_list(t, lookup_dict, words) for t, words in zip(texts, words_list)}
+
 # ==========================================
 # 2. AI 处理逻辑
 # ==========================================
@@ -115,37 +128,48 @@ print_lock = threading.Lock()
 def call_ai_api_with_retry(client, model, prompt, sys_prompt, max_retries=3, timeout=30):
     with print_lock:
         print(f"\n🚀 [SENDING] >>>\n{prompt[:150]}...")
-    delay = 1
+    # 同一服务商的所有线程共享限速器：429 时统一降速，连续失败时一起暂停
+    limiter = get_shared_limiter(limiter_key(str(client.base_url)))
     for attempt in range(max_retries + 1):
         try:
-            resp = client.chat.completions.create(
+            counter = get_token_counter()
+            limiter.acquire(tokens=counter.count(prompt) + counter.count(sys_prompt))
+            # 取原始响应，把真实状态码和限流响应头交给限速器
+            raw = client.chat.completions.with_raw_response.create(
                 model=model,
                 messages=[{"role": "system", "content": sys_prompt}, {"role": "user", "content": prompt}],
                 temperature=0.1,
                 timeout=timeout 
             )
+            limiter.observe(raw.status_code, raw.headers)
+            resp = raw.parse()
             result = resp.choices[0].message.content.strip().strip('"')
             with print_lock:
                 print(f"✅ [SUCCESS] <<< {result}")
             return result
         except Exception as e:
+            limiter.observe_exception(e)
             if attempt == max_retries:
                 with print_lock:
                     print(f"❌ [FAILED] Final give up. Error: {e}")
                 return None
+            delay = limiter.retry_delay(attempt)
             with print_lock:
-                print(f"⚠️ [RETRY] ({attempt+1}/{max_retries}) Error: {e}. Waiting {delay}s...")
+                print(f"⚠️ [RETRY] ({attempt+1}/{max_retries}) Error: {e}. Waiting {delay:.1f}s...")
             time.sleep(delay)
-            delay *= 2
-            delay += random.uniform(0, 1)
-
-def translate_skeleton_task(client, model, skeleton, hints, target_lang, user_instruction, max_retries, timeout):
-    glossary_text = ""
-    if hints:
-        glossary_text = "Refer to this glossary (Strictly):\n"
-        for h in hints:
-            val = h['en'] if target_lang == "English" else h['jp']
-            if val: glossary_text += f"- {h['term']} -> {val}\n"
+
+def build_glossary_text(hints, target_lang, title, glossary_budget=0):
+    """术语提示段；超出 glossary_budget 个 Token（0 为不限）的术语按出现顺序截断"""
+    lines = []
+    for h in hints:
+        val = h['en'] if target_lang == "English" else h['jp']
+        if val: lines.append(f"- {h['term']} -> {val}\n")
+    lines, _ = get_token_counter().trim_lines(lines, glossary_budget or None)
+    if not lines: return ""
+    return f"{title}\n" + "".join(lines)
+
+def build_skeleton_prompt(skeleton, hints, target_lang, user_instruction, glossary_budget=0):
+    glossary_text = build_glossary_text(hints, target_lang, "Refer to this glossary (Strictly):", glossary_budget) if hints else ""
     sys_prompt = "You are a professional game localization expert."
     extra = f"\nAdditional Instructions:\n{user_instruction}\n" if user_instruction else ""
     user_prompt = f"""
@@ -158,17 +182,16 @@ Constraints:
 {glossary_text}
 {extra}
 """
+    return sys_prompt, user_prompt
+
+def translate_skeleton_task(client, model, skeleton, hints, target_lang, user_instruction, max_retries, timeout, glossary_budget=0):
+    sys_prompt, user_prompt = build_skeleton_prompt(skeleton, hints, target_lang, user_instruction, glossary_budget)
     res = call_ai_api_with_retry(client, model, user_prompt, sys_prompt, max_retries, timeout)
     if res: return res
     return skeleton
 
-def translate_variable_task(client, model, var_text, hints, target_lang, user_instruction, max_retries, timeout):
-    glossary_text = ""
-    if hints:
-        glossary_text = "Glossary Hints:\n"
-        for h in hints:
-            val = h['en'] if target_lang == "English" else h['jp']
-            if val: glossary_text += f"- {h['term']} -> {val}\n"
+def build_variable_prompt(var_text, hints, target_lang, user_instruction, glossary_budget=0):
+    glossary_text = build_glossary_text(hints, target_lang, "Glossary Hints:", glossary_budget) if hints else ""
     sys_prompt = "You are a game translator. Translate the specific term."
     extra = f"\nInstructions: {user_instruction}" if user_instruction else ""
     user_prompt = f"""
@@ -179,16 +202,56 @@ Constraints: concise, accurate, no extra explanation.
 {glossary_text}
 {extra}
 """
+    return sys_prompt, user_prompt
+
+def translate_variable_task(client, model, var_text, hints, target_lang, user_instruction, max_retries, timeout, glossary_budget=0):
+    sys_prompt, user_prompt = build_variable_prompt(var_text, hints, target_lang, user_instruction, glossary_budget)
     res = call_ai_api_with_retry(client, model, user_prompt, sys_prompt, max_retries, timeout)
     if res: return res
     return var_text
 
-def batch_process_scope(do_skeletons, do_vars, skeletons, all_vars, glossary_lookup, api_key, base_url, model, workers, instruction, max_retries, timeout):
+def batch_process_scope_async(jobs, api_key, clean_url, model, workers, max_retries, timeout, on_progress):
+    """异步模式：所有请求在单个事件循环中并发，并发上限为 workers，不占用额外线程
+
+    jobs: [(ctype, key, lang, sys_prompt, user_prompt, fallback), ...]
+    返回 [(ctype, key, lang, 译文), ...]
+    """
+    requests_list = [
+        {
+            "messages": [{"role": "system", "content": sys_prompt}, {"role": "user", "content": user_prompt}],
+            "temperature": 0.1,
+            "timeout": timeout
+        }
+        for _, _, _, sys_prompt, user_prompt, _ in jobs
+    ]
+
+    def on_result(index, result, error):
+        if error is not None:
+            with print_lock:
+                print(f"❌ [FAILED] Final give up. Error: {error}")
+        on_progress()
+
+    results = run_chat_requests(
+        chat_completions_url(clean_url), api_key, requests_list, model=model,
+        max_concurrency=workers, timeout=timeout, max_retries=max_retries, on_result=on_result,
+        rate_limiter=get_shared_limiter(limiter_key(clean_url))
+    )
+    output = []
+    for (ctype, key, lang, _, _, fallback), res in zip(jobs, results):
+        if isinstance(res, str) and res.strip().strip('"'):
+            res = res.strip().strip('"')
+        else:
+            res = fallback
+        output.append((ctype, key, lang, res))
+    return output
+
+def batch_process_scope(do_skeletons, do_vars, skeletons, all_vars, glossary_lookup, api_key, base_url, model, workers, instruction, max_retries, timeout, use_async=False, glossary_budget=0):
     clean_url = base_url.rstrip("/").replace("/chat/completions", "").replace("/v1", "")
     if not clean_url.endswith("/v1"): clean_url += "/v1"
     
-    try: client = OpenAI(api_key=api_key, base_url=clean_url)
-    except: return {}, {}
+    if not use_async:
+        try: client = get_openai_client(api_key, clean_url, max_connections=max(int(workers), 10))
+        except: return {}, {}
 
     skel_results = {} 
     var_results = {}  
@@ -206,23 +269,56 @@ def batch_process_scope(do_skeletons, do_vars, skeletons, all_vars, glossary_loo
     prog_bar = st.progress(0)
     status = st.empty()
     completed = 0
-    print(f"🚀 [START] Tasks: {task_count_skel/2} Skels, {task_count_var/2} Vars. Threads: {workers}")
+    print(f"🚀 [START] Tasks: {task_count_skel/2} Skels, {task_count_var/2} Vars. {'Async' if use_async else 'Threads'}: {workers}")
+
+    # 分词预处理：全部句型和变量一次性批量分词（大表时多进程并行）
+    hints_by_text = generate_hints_lists((list(skeletons) if do_skeletons else []) + (vars_to_translate if do_vars else []), glossary_lookup)
+
+    if use_async:
+        jobs = []
+        if do_skeletons:
+            for sk in skeletons:
+                hints = hints_by_text.get(sk, [])
+                for lang, target_lang in (("t1", "English"), ("t2", "Japanese")):
+                    jobs.append(("skel", sk, lang) + build_skeleton_prompt(sk, hints, target_lang, instruction, glossary_budget) + (sk,))
+        if do_vars:
+            for v in vars_to_translate:
+                hints = hints_by_text.get(v, [])
+                for lang, target_lang in (("t1", "English"), ("t2", "Japanese")):
+                    jobs.append(("var", v, lang) + build_variable_prompt(v, hints, target_lang, instruction, glossary_budget) + (v,))
+
+        def on_progress():
+            nonlocal completed
+            completed += 1
+            prog_bar.progress(completed / total_tasks)
+            status.text(f"Processing... {completed}/{total_tasks}")
+
+        try:
+            outputs = batch_process_scope_async(jobs, api_key, clean_url, model, workers, max_retries, timeout, on_progress)
+        except Exception as e:
+            print(f"❌ Async Error: {e}")
+            return {}, {}
+        for ctype, key, lang, res in outputs:
+            target = skel_results if ctype == "skel" else var_results
+            target.setdefault(key, {})[lang] = res
+        status.text(f"✅ 处理完成！| {format_tokenizer_stats(get_tokenizer().stats())}")
+        return skel_results, var_results
 
     with ThreadPoolExecutor(max_workers=workers) as executor:
         futures = {}
         if do_skeletons:
             for sk in skeletons:
-                hints = generate_hints_list(sk, glossary_lookup)
-                f1 = executor.submit(translate_skeleton_task, client, model, sk, hints, "English", instruction, max_retries, timeout)
+                hints = hints_by_text.get(sk, [])
+                f1 = executor.submit(translate_skeleton_task, client, model, sk, hints, "English", instruction, max_retries, timeout, glossary_budget)
                 futures[f1] = ("skel", sk, "t1")
-                f2 = executor.submit(translate_skeleton_task, client, model, sk, hints, "Japanese", instruction, max_retries, timeout)
+                f2 = executor.submit(translate_skeleton_task, client, model, sk, hints, "Japanese", instruction, max_retries, timeout, glossary_budget)
                 futures[f2] = ("skel", sk, "t2")
         if do_vars:
             for v in vars_to_translate:
-                hints = generate_hints_list(v, glossary_lookup)
-                f3 = executor.submit(translate_variable_task, client, model, v, hints, "English", instruction, max_retries, timeout)
+                hints = hints_by_text.get(v, [])
+                f3 = executor.submit(translate_variable_task, client, model, v, hints, "English", instruction, max_retries, timeout, glossary_budget)
                 futures[f3] = ("var", v, "t1")
-                f4 = executor.submit(translate_variable_task, client, model, v, hints, "Japanese", instruction, max_retries, timeout)
+                f4 = executor.submit(translate_variable_task, client, model, v, hints, "Japanese", instruction, max_retries, timeout, glossary_budget)
                 futures[f4] = ("var", v, "t2")
         
         for f in as_completed(futures):
@@ -239,7 +335,7 @@ def batch_process_scope(do_skeletons, do_vars, skeletons, all_vars, glossary_loo
             completed += 1
             prog_bar.progress(completed / total_tasks)
             status.text(f"Processing... {completed}/{total_tasks}")
-    status.text("✅ 处理完成！")
+    status.text(f"✅ 处理完成！| {format_tokenizer_stats(get_tokenizer().stats())}")
     return skel_results, var_results
 
 def get_index(opt, val, default=0):
@@ -286,18 +382,20 @@ def grand_match():
         with c1: max_retries = st.number_input("重试", value=APP_CONFIG["max_retries"], min_value=0)
         with c2: max_threads = st.number_input("并发", value=APP_CONFIG["max_threads"], min_value=1)
         with c3: timeout_sec = st.number_input("超时(s)", value=APP_CONFIG["timeout"], min_value=5)
+        use_async = st.checkbox("异步并发（高并发时不占用线程）", value=APP_CONFIG.get("use_async", False))
 
         st.divider()
         st.header("3. 翻译控制")
         custom_inst = st.text_area("提示词", value=APP_CONFIG["custom_instruction"], height=80)
         min_group = st.number_input("最小阈值", value=APP_CONFIG["min_group_size"])
+        glossary_budget = st.number_input("术语提示Token上限（0为不限）", value=APP_CONFIG.get("glossary_token_budget", 0), min_value=0, step=100)
         
         if st.button("💾 保存配置"):
             new_cfg = APP_CONFIG.copy()
             new_cfg.update({
                 "api_base": api_base, "api_key": api_key, "model_name": model_name,
-                "max_threads": max_threads, "max_retries": max_retries, "timeout": timeout_sec,
-                "custom_instruction": custom_inst, "min_group_size": min_group,
+                "max_threads": max_threads, "max_retries": max_retries, "timeout": timeout_sec, "use_async": use_async,
+                "custom_instruction": custom_inst, "min_group_size": min_group, "glossary_token_budget": glossary_budget,
                 "col_src_name": g_src if glossary_file else "",
                 "col_tgt1_name": g_tgt1 if glossary_file else "",
                 "col_tgt2_name": g_tgt2 if glossary_file else ""
@@ -355,7 +453,7 @@ def grand_match():
                             for sk in skeletons:
                                 sub = df_proc[df_proc['__Skeleton__'] == sk]
                                 for vl in sub['__Vars__']: all_unique_vars.update(vl)
-                        skel_res, var_res = batch_process_scope(do_skeletons, do_vars, skeletons, list(all_unique_vars), glossary_lookup, api_key, api_base, model_name, max_threads, custom_inst, max_retries, timeout_sec)
+                        skel_res, var_res = batch_process_scope(do_skeletons, do_vars, skeletons, list(all_unique_vars), glossary_lookup, api_key, api_base, model_name, max_threads, custom_inst, max_retries, timeout_sec, use_async, glossary_budget)
                         
                         if do_skeletons:
                             for sk, res in skel_res.items():
@@ -1,32 +1,43 @@
 # pages 模块初始化文件
 # 导出所有页面函数
+#
+# 页面模块在首次访问对应函数时才导入（PEP 562 模块级 __getattr__），
+# 避免启动时加载所有页面及其依赖（pandas、openpyxl、jieba、yt_dlp、fitz 等）。
 
-from .prompt_generator import prompt_generator_page
-from .translation_result import translation_result_processor_page
-from .batch_translation import batch_translation_page
-from .term_lookup import term_lookup_page
-from .excel_replace import excel_replace_page
-from .excel_sreplace import excel_sreplace_page
-from .excel_comparison import excel_comparison_page
-from .excel_abc import excel_ABC_page
-from .danmu import danmu_page
-from .ytdlp_downloader import ytdlp_downloader_app
-from .excel_matchpro import excel_matchpro_page
-from .grand_match import grand_match
-from .jacky import jacky_page
+import importlib
 
-__all__ = [
-    'prompt_generator_page',
-    'translation_result_processor_page',
-    'batch_translation_page',
-    'term_lookup_page',
-    'excel_replace_page',
-    'excel_sreplace_page',
-    'excel_comparison_page',
-    'excel_ABC_page',
-    'danmu_page',
-    'ytdlp_downloader_app',
-    'excel_matchpro_page',
-    'grand_match',
-    'jacky_page',
-]
+# 页面函数名 -> 所在模块
+_PAGE_MODULES = {
+    'prompt_generator_page': 'prompt_generator',
+    'translation_result_processor_page': 'translation_result',
+    'batch_translation_page': 'batch_translation',
+    'term_lookup_page': 'term_lookup',
+    'excel_replace_page': 'excel_replace',
+    'excel_sreplace_page': 'excel_sreplace',
+    'excel_comparison_page': 'excel_comparison',
+    'excel_ABC_page': 'excel_abc',
+    'danmu_page': 'danmu',
+    'ytdlp_downloader_app': 'ytdlp_downloader',
+    'excel_matchpro_page': 'excel_matchpro',
+    'grand_match': 'grand_match',
+    'jacky_page': 'jacky',
+    'format_factory_page': 'format_factory',
+    'file_scanner_page': 'file_scanner',
+    'profile_analysis_page': 'profile_analysis',
+}
+
+__all__ = list(_PAGE_MODULES)
+
+
+def load_page(name):
+    """导入页面模块并返回页面函数（之后直接作为包属性访问，与同名子模块区分）"""
+    module = importlib.import_module(f".{_PAGE_MODULES[name]}", __name__)
+    page = getattr(module, name)
+    globals()[name] = page
+    return page
+
+
+def __getattr__(name):
+    if name not in _PAGE_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return load_page(name)
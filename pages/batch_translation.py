@@ -2,7 +2,6 @@
 
 import os
 import io
-import time
 import difflib
 from datetime import datetime
 from io import BytesIO
@@ -12,6 +11,18 @@ import pandas as pd
 import streamlit as st
 
 from translator import MultiAPIExcelTranslator
+from rate_limiter import format_limiter_status, get_shared_limiter, limiter_key
+from chat_stream import StreamProgress, format_stream_status
+from translation_scheduler import TranslationScheduler, TranslationTask
+from glossary_snapshot import load_snapshot, read_glossary_file, save_snapshot, snapshot_key
+from translation_memory import DEFAULT_MAX_ENTRIES, open_translation_memory
+from translation_checkpoint import (
+    TranslationCheckpoint,
+    checkpoint_mtime,
+    list_checkpoints,
+    pending_rows,
+    translatable_mask
+)
 from api_config import (
     get_api_providers,
     get_preset_languages,
@@ -118,8 +129,12 @@ def batch_translation_page():
         st.session_state.role_matching_confirmed = False
     if 'translation_progress' not in st.session_state:
         st.session_state.translation_progress = None
+    if 'resume_checkpoint' not in st.session_state:
+        st.session_state.resume_checkpoint = None
     if 'language_configs' not in st.session_state:
         st.session_state.language_configs = {}
+    if 'term_base_hash' not in st.session_state:
+        st.session_state.term_base_hash = None
     if 'term_language_mapping' not in st.session_state:
         st.session_state.term_language_mapping = {}
 
@@ -198,19 +213,57 @@ def batch_translation_page():
         
         auto_save_interval = st.number_input(
             "自动保存间隔（每N行）",
-            min_value=10,
+            min_value=1,
             max_value=500,
             value=50,
             step=10,
-            help="每翻译N行后自动保存一次"
+            help="每翻译N行后把新译文追加写入断点日志；完整Excel只在翻译结束时生成"
         )
         
         save_directory = st.text_input(
             "保存目录",
             value="./translation_saves",
-            help="自动保存文件的目录路径"
+            help="断点日志和翻译结果的保存目录"
         )
 
+        st.markdown("---")
+        st.header("🧠 翻译记忆")
+
+        enable_translation_memory = st.checkbox(
+            "启用翻译记忆",
+            value=True,
+            help="原文、语言、说话人、模型、匹配术语和自定义要求都相同的行直接复用已有译文，不再调用API",
+            key="batch_enable_tm"
+        )
+
+        translation_memory_max_entries = st.number_input(
+            "翻译记忆容量（条）",
+            min_value=1000,
+            max_value=10000000,
+            value=DEFAULT_MAX_ENTRIES,
+            step=10000,
+            help="超出容量时淘汰最久未使用的记录",
+            key="batch_tm_max_entries"
+        )
+        translation_memory_path = os.path.join(save_directory, "translation_memory.db")
+
+        if enable_translation_memory:
+            with st.expander("🧹 清除翻译记忆"):
+                tm_invalidate_model = st.text_input("按模型清除（留空表示不限）", value="", key="batch_tm_invalidate_model")
+                tm_invalidate_language = st.selectbox(
+                    "按语言清除",
+                    options=["全部语言"] + available_languages,
+                    index=0,
+                    key="batch_tm_invalidate_language"
+                )
+                if st.button("🗑️ 清除匹配的记忆", key="batch_tm_invalidate"):
+                    memory = open_translation_memory(translation_memory_path, translation_memory_max_entries)
+                    deleted = memory.invalidate(
+                        model=tm_invalidate_model.strip() or None,
+                        language=None if tm_invalidate_language == "全部语言" else tm_invalidate_language
+                    )
+                    st.success(f"✅ 已清除 {deleted} 条翻译记忆")
+
         st.markdown("---")
         st.header("🎭 角色匹配设置")
 
@@ -244,6 +297,43 @@ def batch_translation_page():
             key="batch_context_size"
         )
 
+        context_token_budget = st.number_input(
+            "📏 上下文Token预算（0为不限）",
+            min_value=0,
+            max_value=100000,
+            value=0,
+            step=500,
+            help="每种语言的上下文按估算的Token数累计，超出预算时从最早的记录开始丢弃，避免长文本撑大提示词",
+            key="batch_context_token_budget"
+        )
+
+        prompt_token_budget = st.number_input(
+            "🧮 单次请求提示词Token上限（0为不限）",
+            min_value=0,
+            max_value=200000,
+            value=0,
+            step=500,
+            help="逐行翻译时，提示词超出上限会先裁剪上下文（保留最近的记录），再裁剪术语匹配（按术语库顺序保留）",
+            key="batch_prompt_token_budget"
+        )
+
+        max_completion_tokens = st.number_input(
+            "✍️ 回复Token上限（max_tokens）",
+            min_value=256,
+            max_value=32000,
+            value=4000,
+            step=500,
+            help="每次请求的回复上限；开启下方估算后，逐行翻译会按原文长度使用更小的上限，不超过此值",
+            key="batch_max_completion_tokens"
+        )
+
+        adaptive_completion_budget = st.checkbox(
+            "📏 按原文长度估算逐行回复上限",
+            value=False,
+            help="短句请求使用更小的 max_tokens（最少 256）。会先输出推理内容的模型可能因此截断或返回空结果，此时请关闭",
+            key="batch_adaptive_completion_budget"
+        )
+
         max_retries = st.number_input(
             "🔄 最大重试次数",
             min_value=1,
@@ -252,35 +342,183 @@ def batch_translation_page():
             key="batch_max_retries"
         )
 
+        stream_responses = st.checkbox(
+            "🌊 流式接收回复",
+            value=False,
+            help="逐块接收模型输出：只要持续有数据返回就不会超时，适合长对话块；状态栏会显示接收进度",
+            key="batch_stream_responses"
+        )
+        stream_idle_timeout = st.number_input(
+            "流式空闲超时（秒）",
+            min_value=5,
+            max_value=600,
+            value=30,
+            help="两块数据之间超过该时间没有新内容才视为超时并重试",
+            disabled=not stream_responses,
+            key="batch_stream_idle_timeout"
+        )
+
+        st.markdown("---")
+        st.header("⚡ 并发与限速")
+
+        concurrency_engine = st.radio(
+            "并发引擎",
+            ["线程池", "异步（asyncio）"],
+            horizontal=True,
+            help="异步模式在单个事件循环中并发发送请求，数百个进行中的请求也不需要对应数量的线程（逐行翻译时生效）",
+            key="batch_concurrency_engine"
+        )
+        use_async_engine = concurrency_engine == "异步（asyncio）"
+
+        max_workers = st.number_input(
+            "最大并发请求数" if use_async_engine else "并发线程数",
+            min_value=1,
+            max_value=1000 if use_async_engine else 64,
+            value=4,
+            help="同时进行的翻译通道数；每种语言至少占用一个通道",
+            key="batch_max_workers"
+        )
+
+        window_size = st.number_input(
+            "行窗口大小（0 表示不切分）",
+            min_value=0,
+            max_value=100000,
+            value=0,
+            step=100,
+            help="将每种语言的行按窗口切分为多个并发通道；每个窗口维护独立的上下文，窗口越小并发越高但上下文连续性越弱",
+            key="batch_window_size"
+        )
+
+        requests_per_minute = st.number_input(
+            "每分钟请求数上限（RPM，0 表示不限）",
+            min_value=0,
+            max_value=100000,
+            value=60,
+            help="与同一服务商的其他页面共享；收到429时自动降速，连续失败时所有线程一起暂停",
+            key="batch_rpm"
+        )
+
+        tokens_per_minute = st.number_input(
+            "每分钟 Token 上限（TPM，0 表示不限）",
+            min_value=0,
+            max_value=100000000,
+            value=0,
+            step=10000,
+            key="batch_tpm"
+        )
+
+        price_cols = st.columns(2)
+        input_price = price_cols[0].number_input(
+            "输入单价（元/百万Token）",
+            min_value=0.0,
+            value=2.0,
+            step=0.5,
+            key="batch_input_price"
+        )
+        output_price = price_cols[1].number_input(
+            "输出单价（元/百万Token）",
+            min_value=0.0,
+            value=8.0,
+            step=0.5,
+            key="batch_output_price"
+        )
+
+        batch_rows = st.number_input(
+            "每个请求打包行数（1 表示逐行翻译）",
+            min_value=1,
+            max_value=100,
+            value=1,
+            help="批量模式：将多行打包进一个请求并要求返回JSON，大幅减少重复的提示词；缺失或格式错误的行会自动逐行重试",
+            key="batch_rows_per_request"
+        )
+
+        batch_token_budget = st.number_input(
+            "每个请求的原文Token预算",
+            min_value=200,
+            max_value=100000,
+            value=3000,
+            step=500,
+            disabled=batch_rows <= 1,
+            help="打包时按原文长度估算Token，超出预算即开启新请求",
+            key="batch_token_budget"
+        )
+
+        st.markdown("---")
+        st.header("🔁 重复行去重")
+
+        enable_dedup = st.checkbox(
+            "相同原文只翻译一次",
+            value=True,
+            help="原文、说话人、语言都相同的行只调用一次API，结果复制到所有重复行",
+            key="batch_enable_dedup"
+        )
+
+        dedup_role_rows = st.checkbox(
+            "对有说话人的行也去重",
+            value=False,
+            disabled=not enable_dedup,
+            help="有说话人的台词译文往往依赖上下文；不勾选时这些行仍逐行翻译，只对无说话人的行（如UI文本）去重",
+            key="batch_dedup_role_rows"
+        )
+
+        st.markdown("---")
+        debug_prompts = st.checkbox(
+            "🐞 在控制台打印完整提示词",
+            value=False,
+            help="调试用：每次请求前把完整提示词输出到运行窗口",
+            key="batch_debug_prompts"
+        )
+
     # 主界面
     col1, col2 = st.columns([1, 1])
 
     with col1:
         st.header("📁 文件上传")
 
-        # 检查是否有保存的进度文件
+        # 检查是否有保存的进度：断点目录（优先）和旧版进度Excel
         saved_files = []
         if os.path.exists(save_directory):
-            saved_files = [f for f in os.listdir(save_directory) if f.endswith('_progress.xlsx') or f.endswith('.xlsx')]
+            saved_files = [os.path.basename(d) for d in list_checkpoints(save_directory)]
+            saved_files += [f for f in os.listdir(save_directory) if f.endswith('_progress.xlsx') or f.endswith('.xlsx')]
         
         resume_mode = st.checkbox(
             "🔄 从上次进度继续翻译",
             value=False,
-            help="从之前保存的进度文件继续翻译"
+            help="从之前保存的断点（或进度文件）继续翻译"
         )
         
         if resume_mode and saved_files:
-            st.info("📋 找到以下进度文件：")
+            st.info("📋 找到以下进度：")
             selected_progress_file = st.selectbox(
-                "选择要继续的进度文件",
+                "选择要继续的进度",
                 options=saved_files,
-                format_func=lambda x: f"{x} ({datetime.fromtimestamp(os.path.getmtime(os.path.join(save_directory, x))).strftime('%Y-%m-%d %H:%M:%S')})"
+                format_func=lambda x: f"{x} ({datetime.fromtimestamp(checkpoint_mtime(os.path.join(save_directory, x)) if os.path.isdir(os.path.join(save_directory, x)) else os.path.getmtime(os.path.join(save_directory, x))).strftime('%Y-%m-%d %H:%M:%S')})"
             )
+            progress_path = os.path.join(save_directory, selected_progress_file)
+            is_checkpoint = os.path.isdir(progress_path)
             
-            if st.button("📂 加载进度文件"):
+            load_col, export_col = st.columns(2)
+            with load_col:
+                load_clicked = st.button("📂 加载进度", use_container_width=True)
+            with export_col:
+                export_clicked = st.button("📤 导出为Excel", use_container_width=True, disabled=not is_checkpoint)
+
+            if export_clicked:
+                try:
+                    export_path = TranslationCheckpoint(progress_path).materialize(progress_path + ".xlsx")
+                    st.success(f"✅ 已导出: {export_path}")
+                except Exception as e:
+                    st.error(f"❌ 导出失败: {e}")
+
+            if load_clicked:
                 try:
-                    progress_path = os.path.join(save_directory, selected_progress_file)
-                    df = pd.read_excel(progress_path)
+                    if is_checkpoint:
+                        # 直接读取断点日志：基础表 + 追加的译文
+                        df = TranslationCheckpoint(progress_path).load_dataframe()
+                        st.session_state.resume_checkpoint = progress_path
+                    else:
+                        df = pd.read_excel(progress_path)
+                        st.session_state.resume_checkpoint = None
                     df.columns = df.columns.str.strip().str.replace('\n', '').str.replace('\r', '')
                     st.session_state.current_file = df
                     
@@ -292,16 +530,16 @@ def batch_translation_page():
                             total_count = len(df)
                             progress_info.append(f"{lang}: {translated_count}/{total_count}")
                     
-                    st.success(f"✅ 成功加载进度文件！")
+                    st.success(f"✅ 成功加载进度！")
                     if progress_info:
                         st.info(f"📊 翻译进度: {', '.join(progress_info)}")
                     
                     with st.expander("📊 文件预览"):
                         st.dataframe(df.head(10))
                 except Exception as e:
-                    st.error(f"❌ 加载进度文件失败: {e}")
+                    st.error(f"❌ 加载进度失败: {e}")
         elif resume_mode and not saved_files:
-            st.warning("⚠️ 未找到已保存的进度文件")
+            st.warning("⚠️ 未找到已保存的进度")
         
         if not resume_mode:
             uploaded_file = st.file_uploader(
@@ -318,6 +556,7 @@ def batch_translation_page():
                         df = pd.read_excel(uploaded_file)
                     df.columns = df.columns.str.strip().str.replace('\n', '').str.replace('\r', '')
                     st.session_state.current_file = df
+                    st.session_state.resume_checkpoint = None
                     st.success(f"✅ 成功读取文件，共 {len(df)} 行数据")
 
                     with st.expander("📊 文件预览"):
@@ -357,9 +596,10 @@ def batch_translation_page():
 
         if uploaded_term_base is not None:
             try:
-                term_df = pd.read_excel(uploaded_term_base)
-                term_df.columns = term_df.columns.str.strip().str.replace('\n', '').str.replace('\r', '')
+                # 同一内容的术语库只解析一次，之后按内容哈希复用
+                term_df, term_hash = read_glossary_file(uploaded_term_base)
                 st.session_state.term_base_df = term_df
+                st.session_state.term_base_hash = term_hash
                 st.success(f"✅ 成功读取术语库，共 {len(term_df)} 条术语")
 
                 with st.expander("📋 配置术语库列映射", expanded=True):
@@ -462,6 +702,7 @@ def batch_translation_page():
                     api_key, api_provider, api_url, model,
                     context_size, max_retries
                 )
+                translator.context_token_budget = context_token_budget
                 translator.enable_fuzzy_match = enable_fuzzy
                 translator.fuzzy_threshold = fuzzy_threshold
                 translator.set_target_languages(selected_languages, language_column_names)
@@ -480,11 +721,20 @@ def batch_translation_page():
 
                 # 加载多语言术语库
                 if st.session_state.term_base_df is not None and st.session_state.term_language_mapping:
-                    if translator.load_term_base_multilang(
+                    # 同一术语库文件 + 列配置只编译一次，之后直接加载预编译快照
+                    glossary_key = snapshot_key(
+                        st.session_state.term_base_hash, source_col, st.session_state.term_language_mapping
+                    )
+                    snapshot = load_snapshot(glossary_key)
+                    if snapshot is not None:
+                        translator.load_glossary_snapshot(snapshot)
+                        st.success("✅ 多语言术语库加载成功")
+                    elif translator.load_term_base_multilang(
                         st.session_state.term_base_df, 
                         source_col, 
                         st.session_state.term_language_mapping
                     ):
+                        save_snapshot(translator.glossary_snapshot(glossary_key))
                         st.success("✅ 多语言术语库加载成功")
                 elif st.session_state.term_base_df is not None:
                     st.warning("⚠️ 术语库已上传但未配置语言映射")
@@ -541,6 +791,7 @@ def batch_translation_page():
             disabled=not translation_ready,
             key="batch_start_translation"
     ):
+        checkpoint = None
         try:
             translator = st.session_state.translator
             df = st.session_state.current_file.copy()
@@ -568,97 +819,141 @@ def batch_translation_page():
                 if col_name not in df.columns:
                     df[col_name] = ''
             
-            # 计算起始位置
-            start_index = 0
+            # 断点：继续已有断点时直接追加到原日志，否则为本次运行新建断点目录
+            checkpoint = None
+            if resume_mode and st.session_state.resume_checkpoint:
+                checkpoint = TranslationCheckpoint(st.session_state.resume_checkpoint)
+                if checkpoint.meta.get('text_col') != text_col:
+                    checkpoint = None
+            if checkpoint is None:
+                checkpoint = TranslationCheckpoint.create(
+                    save_directory, df, text_col=text_col, role_col=role_col,
+                    languages=languages, column_names=column_names
+                )
+            else:
+                checkpoint.write_meta(languages=languages, column_names=column_names)
+
+            # 每种语言的完成掩码（失败标记视为未完成），只为待翻译的 (行, 语言) 生成任务
+            result_columns = [column_names[lang] for lang in languages]
+            completion = checkpoint.completion_masks(df, result_columns)
+            pending_by_column = pending_rows(df, text_col, completion)
             if resume_mode:
-                min_translated_index = len(df)
-                for lang in languages:
-                    col_name = column_names[lang]
-                    if col_name in df.columns:
-                        last_index = -1
-                        for idx in range(len(df)):
-                            if not pd.isna(df.at[idx, col_name]) and str(df.at[idx, col_name]).strip() != '':
-                                if not str(df.at[idx, col_name]).startswith('[翻译失败'):
-                                    last_index = idx
-                        min_translated_index = min(min_translated_index, last_index + 1)
-                
-                start_index = min_translated_index
-                if start_index > 0:
-                    st.info(f"🔄 继续翻译：跳过前 {start_index} 行（已翻译）")
+                done_count = sum(int(mask.sum()) for mask in completion.values())
+                pending_count = sum(len(rows) for rows in pending_by_column.values())
+                st.info(f"🔄 继续翻译：已完成 {done_count} 个单元格，剩余 {pending_count} 个待翻译")
 
             progress_bar = st.progress(0)
             status_text = st.empty()
+            stream_text = st.empty()
             
             # 为每种语言创建统计
             stats = {lang: {'success': 0, 'error': 0} for lang in languages}
             
-            total_rows = len(df)
-            
             # 生成保存文件名
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            progress_filename = f"translation_progress_multilang_{timestamp}.xlsx"
-            progress_path = os.path.join(save_directory, progress_filename)
 
-            try:
-                for index in range(start_index, total_rows):
-                    row = df.iloc[index]
-                    progress = (index + 1) / total_rows
-                    progress_bar.progress(progress)
-                    
-                    # 构建状态信息
-                    stats_str = " | ".join([f"{lang}: ✓{stats[lang]['success']} ✗{stats[lang]['error']}" for lang in languages])
-                    status_text.text(f"📝 正在翻译第 {index + 1}/{total_rows} 行... | {stats_str}")
+            # 构建待翻译任务（按行、按语言）
+            # 去重：相同 (原文, 说话人, 语言) 只保留首次出现的行作为任务，其余行记录在 duplicate_rows 中
+            tasks = []
+            first_task_by_key = {}
+            duplicate_rows = {}  # {(首行行号, 语言): [重复行行号, ...]}
+            texts = df[text_col].to_numpy()
+            roles = df[role_col].to_numpy() if role_col and role_col in df.columns else None
+            translatable = translatable_mask(df, text_col)
+            for lang in languages:
+                col_name = column_names[lang]
+                stats[lang]['success'] += int((completion[col_name] & translatable).sum())
+
+                for index in pending_by_column[col_name].tolist():
+                    text = str(texts[index])
+                    role = roles[index] if roles is not None else None
+
+                    has_role = role is not None and not pd.isna(role) and str(role).strip() != ""
+                    if enable_dedup and (dedup_role_rows or not has_role):
+                        dedup_key = (text, str(role).strip() if has_role else "", lang)
+                        first_index = first_task_by_key.get(dedup_key)
+                        if first_index is not None:
+                            duplicate_rows.setdefault((first_index, lang), []).append(index)
+                            continue
+                        first_task_by_key[dedup_key] = index
+
+                    tasks.append(TranslationTask(index, lang, text, role))
+
+            saved_calls = sum(len(rows) for rows in duplicate_rows.values())
+            if saved_calls:
+                st.info(f"🔁 去重后共 {len(tasks)} 个翻译任务，{saved_calls} 个重复单元格将直接复用译文")
+
+            # 同一服务商的所有请求（包括其他页面）共享一个自适应限速器：429 时降速，连续失败时统一熔断暂停
+            translator.rate_limiter = get_shared_limiter(limiter_key(translator.api_url), requests_per_minute, tokens_per_minute)
+            translator.configure_http_pool(max(max_workers, 10))
+            translator.debug_prompts = debug_prompts
+            translator.prompt_token_budget = prompt_token_budget
+            translator.max_completion_tokens = max_completion_tokens
+            translator.adaptive_completion_budget = adaptive_completion_budget
+            translator.usage_stats.reset()
+            translator.stream_responses = stream_responses
+            translator.stream_idle_timeout = stream_idle_timeout
+            # 工作线程已附加脚本上下文，可直接刷新占位元素；StreamProgress 负责节流
+            translator.stream_progress = StreamProgress(
+                lambda snapshot: stream_text.caption(format_stream_status(snapshot))
+            ) if stream_responses else None
+
+            if enable_translation_memory:
+                translator.translation_memory = open_translation_memory(translation_memory_path, translation_memory_max_entries)
+                translator.translation_memory.reset_stats()
+            else:
+                translator.translation_memory = None
+            scheduler = TranslationScheduler(
+                translator, custom_requirements,
+                max_workers=max_workers, window_size=window_size,
+                batch_size=batch_rows, batch_token_budget=batch_token_budget,
+                engine="async" if use_async_engine else "thread"
+            )
 
-                    text = str(row[text_col])
-                    role = row[role_col] if role_col and role_col in row else None
+            total_tasks = len(tasks)
+            completed_tasks = 0
+            save_every = auto_save_interval * len(languages)
 
-                    # 跳过原文为空的行
-                    if pd.isna(text) or str(text).strip() == "" or text == "nan":
-                        continue
-                    
-                    # 对每种语言进行翻译（独立翻译，互不影响）
-                    for lang in languages:
-                        col_name = column_names[lang]
-                        
-                        # 如果该行该语言已经翻译过，跳过
-                        existing_translation = df.at[index, col_name]
-                        if not pd.isna(existing_translation) and str(existing_translation).strip() != '' and not str(existing_translation).startswith('[翻译失败'):
-                            stats[lang]['success'] += 1
-                            continue
+            try:
+                for result in scheduler.run(tasks):
+                    task = result.task
+                    col_name = column_names[task.language]
+                    target_rows = [task.index] + duplicate_rows.get((task.index, task.language), [])
+
+                    if result.error is None:
+                        value = result.translation
+                        stats[task.language]['success'] += len(target_rows)
+                    else:
+                        st.warning(f"⚠️ [{task.language}] 第 {task.index + 1} 行翻译失败: {result.error}")
+                        value = f"[翻译失败: {result.error}]"
+                        stats[task.language]['error'] += len(target_rows)
+                    for row_index in target_rows:
+                        df.at[row_index, col_name] = value
+                        checkpoint.record(row_index, col_name, value)
 
-                        try:
-                            # 每种语言独立翻译，使用各自的上下文和术语库
-                            translated_text = translator.translate_text(
-                                text, lang, custom_requirements, role
-                            )
-                            
-                            df.at[index, col_name] = translated_text
-                            stats[lang]['success'] += 1
-                            
-                        except Exception as e:
-                            error_msg = str(e)
-                            st.warning(f"⚠️ [{lang}] 第 {index + 1} 行翻译失败: {error_msg}")
-                            df.at[index, col_name] = f"[翻译失败: {error_msg}]"
-                            stats[lang]['error'] += 1
-                        
-                        # 短暂延迟，避免API速率限制
-                        time.sleep(0.15)
+                    completed_tasks += 1
+                    progress_bar.progress(completed_tasks / total_tasks)
+
+                    # 构建状态信息
+                    stats_str = " | ".join([f"{lang}: ✓{stats[lang]['success']} ✗{stats[lang]['error']}" for lang in languages])
+                    limiter_status = format_limiter_status(translator.rate_limiter.snapshot())
+                    status_text.text(f"📝 已完成 {completed_tasks}/{total_tasks} 个翻译任务（第 {task.index + 1} 行 {task.language}）| {stats_str} | {limiter_status}")
 
-                    # 自动保存
-                    if (index + 1) % auto_save_interval == 0:
+                    # 自动保存：只追加新译文到断点日志
+                    if completed_tasks % save_every == 0:
                         try:
-                            with pd.ExcelWriter(progress_path, engine='openpyxl') as writer:
-                                df.to_excel(writer, index=False, sheet_name='翻译进度')
-                            st.info(f"💾 已自动保存进度: {index + 1}/{total_rows} 行")
+                            checkpoint.flush()
                         except Exception as save_error:
                             st.warning(f"⚠️ 自动保存失败: {save_error}")
 
+                checkpoint.close()
+
                 # 最终保存
                 final_filename = f"translation_final_multilang_{timestamp}.xlsx"
                 final_path = os.path.join(save_directory, final_filename)
                 
-                with pd.ExcelWriter(final_path, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='翻译结果')
+                checkpoint.materialize(final_path, df)
+                checkpoint.write_meta(completed=True, final_path=final_path)
                 
                 progress_bar.progress(1.0)
                 
@@ -675,6 +970,36 @@ def batch_translation_page():
                             delta_color="inverse"
                         )
 
+                if saved_calls:
+                    st.metric("🔁 去重节省API调用", saved_calls)
+
+                limiter_stats = translator.rate_limiter.snapshot()
+                limiter_cols = st.columns(4)
+                limiter_cols[0].metric("🚦 当前吞吐（次/分）", limiter_stats['throughput_rpm'])
+                limiter_cols[1].metric("限流响应（429）", limiter_stats['rate_limited'])
+                limiter_cols[2].metric("熔断次数", limiter_stats['breaker_trips'])
+                limiter_cols[3].metric("限速等待（秒）", limiter_stats['total_wait_time'])
+
+                usage = translator.usage_stats.snapshot()
+                translated_rows = max(sum(stats[lang]['success'] for lang in languages), 1)
+                usage_cols = st.columns(4)
+                usage_cols[0].metric("🧾 提示词Token", f"{usage['prompt_tokens']:,}")
+                usage_cols[1].metric("回复Token", f"{usage['completion_tokens']:,}")
+                usage_cols[2].metric("每行Token", f"{usage['total_tokens'] / translated_rows:.0f}")
+                usage_cols[3].metric(
+                    "预估费用（元）",
+                    f"{translator.usage_stats.cost(input_price, output_price):.2f}",
+                    f"{usage['estimated_requests']}/{usage['requests']} 次请求为本地估算" if usage['estimated_requests'] else None,
+                    delta_color="off"
+                )
+
+                if translator.translation_memory is not None:
+                    tm_stats = translator.translation_memory.stats()
+                    tm_cols = st.columns(3)
+                    tm_cols[0].metric("🧠 记忆命中（节省API调用）", tm_stats['hits'])
+                    tm_cols[1].metric("记忆未命中", tm_stats['misses'])
+                    tm_cols[2].metric("命中率", f"{tm_stats['hit_rate']:.1%}", f"库内 {tm_stats['entries']} 条", delta_color="off")
+
                 st.subheader("📊 翻译结果预览")
                 
                 # 构建显示列顺序：原文列 + 角色列 + 所有翻译结果列
@@ -703,13 +1028,13 @@ def batch_translation_page():
             except KeyboardInterrupt:
                 st.warning("⚠️ 翻译被中断，正在保存当前进度...")
                 try:
-                    interrupt_filename = f"translation_interrupted_{timestamp}.xlsx"
-                    interrupt_path = os.path.join(save_directory, interrupt_filename)
-                    with pd.ExcelWriter(interrupt_path, engine='openpyxl') as writer:
-                        df.to_excel(writer, index=False, sheet_name='翻译进度')
-                    st.info(f"💾 进度已保存至: {interrupt_path}")
+                    checkpoint.close()
+                    st.info(f"💾 进度已保存至断点: {checkpoint.directory}（可在“从上次进度继续翻译”中恢复或导出）")
                 except Exception as save_error:
                     st.error(f"❌ 保存进度失败: {save_error}")
+            finally:
+                # 页面停止/重跑时也要把缓冲的译文写入断点日志
+                checkpoint.close()
 
         except Exception as e:
             st.error(f"❌ 翻译过程中出现错误: {e}")
@@ -718,10 +1043,14 @@ def batch_translation_page():
             
             # 尝试保存当前进度
             try:
-                error_filename = f"translation_error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                error_path = os.path.join(save_directory, error_filename)
-                with pd.ExcelWriter(error_path, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='翻译进度')
-                st.info(f"💾 错误前的进度已保存至: {error_path}")
+                if checkpoint is not None:
+                    checkpoint.close()
+                    st.info(f"💾 错误前的进度已保存至断点: {checkpoint.directory}")
+                else:
+                    error_filename = f"translation_error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                    error_path = os.path.join(save_directory, error_filename)
+                    with pd.ExcelWriter(error_path, engine='openpyxl') as writer:
+                        df.to_excel(writer, index=False, sheet_name='翻译进度')
+                    st.info(f"💾 错误前的进度已保存至: {error_path}")
             except Exception as save_error:
                 st.error(f"❌ 保存进度失败: {save_error}")
@@ -2,10 +2,10 @@
 
 import os
 import re
-import shutil
 import platform
 import subprocess
 import threading
+from collections import Counter, OrderedDict
 from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -15,6 +15,11 @@ import streamlit as st
 import openpyxl
 
 from utils import open_folder, open_file
+from excel_batch import TermReplacer, load_term_pairs, replace_in_workbook, scan_term_pairs, term_pair_report
+from excel_index import open_excel_index
+from excel_scan import regex_matcher, scan_files
+from tokenizer_cache import available_cpus
+from xlsx_patch import patch_cells
 
 
 class ExcelSearchReplace:
@@ -105,54 +110,49 @@ class ExcelSearchReplace:
         return matches
 
     def replace_in_excel(self, search_term, replace_term, backup=True):
-        """替换Excel文件中的词语"""
+        """替换Excel文件中的词语
+
+        只改写命中的文本单元格（见 xlsx_patch），其余内容和格式保持不变。
+        """
         replaced_files = 0
         total_replacements = 0
 
-        for file_path_str, file_data in self.search_results.items():
-            file_path = Path(file_path_str)
+        # 构建替换模式
+        if self.match_whole_word:
+            pattern = r'\b' + re.escape(search_term) + r'\b'
+        else:
+            pattern = re.escape(search_term)
+
+        flags = 0 if self.case_sensitive else re.IGNORECASE
+        regex = re.compile(pattern, flags)
+        matcher = regex_matcher(pattern, flags, literal=search_term)
+
+        # 重新扫描一遍，定位每个文件中命中的单元格（公式单元格按公式文本匹配，与写入的内容一致）
+        paths = list(self.search_results.keys())
+        for path, sheet_names, hits, error in scan_files(paths, matcher, data_only=False, use_processes=False):
+            file_path = Path(path)
+            if error is not None:
+                st.error(f"替换文件 {file_path.name} 时出错: {error}")
+                continue
 
             try:
-                # 备份原文件
+                backup_path = None
                 if backup:
                     backup_path = file_path.parent / f"{file_path.stem}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{file_path.suffix}"
-                    shutil.copy2(file_path, backup_path)
-                    st.info(f"已创建备份: {backup_path.name}")
-
-                # 读取Excel文件
-                excel_data = pd.read_excel(file_path, sheet_name=None, dtype=str)
-                replacements_in_file = 0
 
-                # 构建替换模式
-                if self.match_whole_word:
-                    pattern = r'\b' + re.escape(search_term) + r'\b'
-                else:
-                    pattern = re.escape(search_term)
-
-                flags = 0 if self.case_sensitive else re.IGNORECASE
+                changes = patch_cells(
+                    file_path,
+                    [(sheet_names[sheet_idx], row_idx, col_idx) for sheet_idx, row_idx, col_idx, _, _ in hits],
+                    lambda text: self._replace_text(text, pattern, replace_term, flags),
+                    backup_path=backup_path
+                )
+                if not changes:
+                    continue
 
-                # 对每个工作表进行替换
-                for sheet_name, df in excel_data.items():
-                    df_replaced = df.map(
-                        lambda x: self._replace_text(x, pattern, replace_term, flags)
-                        if pd.notna(x) else x
-                    )
-                    excel_data[sheet_name] = df_replaced
-
-                    # 计算替换数量
-                    for row_idx, row in df.iterrows():
-                        for col_idx, cell_value in enumerate(row):
-                            if pd.isna(cell_value):
-                                continue
-                            cell_str = str(cell_value)
-                            replacements = len(re.findall(pattern, cell_str, flags))
-                            replacements_in_file += replacements
-
-                # 保存替换后的文件
-                with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                    for sheet_name, df in excel_data.items():
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
+                if backup_path:
+                    st.info(f"已创建备份: {backup_path.name}")
 
+                replacements_in_file = sum(len(regex.findall(old_text)) for *_, old_text, _ in changes)
                 replaced_files += 1
                 total_replacements += replacements_in_file
 
@@ -173,8 +173,13 @@ class ExcelSearchReplace:
         return replaced_text
 
 
-def multithreaded_search(search_tool, search_term, case_sensitive, match_whole_word, progress_bar, status_text):
-    """使用多线程搜索Excel文件"""
+def multithreaded_search(search_tool, search_term, case_sensitive, match_whole_word, progress_bar, status_text,
+                         use_processes=False):
+    """使用多线程（use_processes 时为多进程）搜索Excel文件
+
+    .xlsx 直接解析压缩包中的 XML（见 xlsx_stream），不构造 openpyxl 单元格对象，
+    匹配记录与逐个 openpyxl 只读打开扫描完全相同。
+    """
     # 清空之前的搜索结果
     search_tool.search_results = {}
 
@@ -188,97 +193,111 @@ def multithreaded_search(search_tool, search_term, case_sensitive, match_whole_w
         pattern = re.escape(search_term)
 
     flags = 0 if case_sensitive else re.IGNORECASE
-    regex = re.compile(pattern, flags)
+    matcher = regex_matcher(pattern, flags, literal=search_term)
 
-    # 线程锁，用于安全更新共享数据
-    lock = threading.Lock()
     total_matches = 0
     completed_files = 0
     total_files = len(search_tool.excel_files)
+    paths = [str(file_path) for file_path in search_tool.excel_files]
 
-    def search_single_file(file_path):
-        """搜索单个Excel文件"""
-        nonlocal total_matches, completed_files
-
+    for path, sheet_names, hits, error in scan_files(paths, matcher, use_processes=use_processes):
+        # 展开为页面使用的匹配记录（无法读取的文件忽略）
         file_matches = []
-        match_count = 0
-
-        try:
-            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-
-                for row_idx, row in enumerate(sheet.iter_rows(values_only=False), start=1):
-                    for col_idx, cell in enumerate(row, start=1):
-                        if cell.value is not None:
-                            cell_text = str(cell.value)
-
-                            # 搜索匹配
-                            matches = list(regex.finditer(cell_text))
-
-                            if matches:
-                                for match in matches:
-                                    file_matches.append({
-                                        'sheet_name': sheet_name,
-                                        'row': row_idx,
-                                        'column': col_idx,
-                                        'original_text': cell_text,
-                                        'matched_text': match.group(),
-                                        'start_pos': match.start(),
-                                        'end_pos': match.end()
-                                    })
-                                    match_count += 1
-
-            wb.close()
-
-            # 使用锁更新共享数据
-            if file_matches:
-                with lock:
-                    search_tool.search_results[str(file_path)] = {
-                        'matches': file_matches,
-                        'match_count': match_count
-                    }
-                    total_matches += match_count
+        for sheet_idx, row_idx, col_idx, cell_text, spans in hits:
+            for start, end in spans:
+                file_matches.append({
+                    'sheet_name': sheet_names[sheet_idx],
+                    'row': row_idx,
+                    'column': col_idx,
+                    'original_text': cell_text,
+                    'matched_text': cell_text[start:end],
+                    'start_pos': start,
+                    'end_pos': end
+                })
 
-        except Exception as e:
-            # 忽略无法读取的文件
-            pass
+        if file_matches:
+            search_tool.search_results[path] = {
+                'matches': file_matches,
+                'match_count': len(file_matches)
+            }
+            total_matches += len(file_matches)
 
         # 更新进度
-        with lock:
-            completed_files += 1
-            progress = completed_files / total_files
-            progress_bar.progress(progress)
-            status_text.text(f"正在搜索... {completed_files}/{total_files} 个文件")
+        completed_files += 1
+        progress_bar.progress(completed_files / total_files)
+        status_text.text(f"正在搜索... {completed_files}/{total_files} 个文件")
 
-        return match_count
+    return total_matches
 
-    # 使用线程池执行搜索
-    # 根据CPU核心数设置线程数，最大为16
-    max_workers = min(16, (os.cpu_count() or 4) * 2)
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        futures = {executor.submit(search_single_file, file_path): file_path
-                   for file_path in search_tool.excel_files}
+def multiprocess_search(search_tool, search_term, case_sensitive, match_whole_word, progress_bar, status_text):
+    """使用多进程搜索Excel文件（openpyxl 解析受 GIL 限制，多进程才能用满多核）"""
+    return multithreaded_search(search_tool, search_term, case_sensitive, match_whole_word,
+                                progress_bar, status_text, use_processes=True)
 
-        # 等待所有任务完成
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                # 记录错误但继续处理其他文件
-                pass
 
+def indexed_search(search_tool, folder_path, search_term, case_sensitive, match_whole_word, progress_bar, status_text,
+                   use_processes=False):
+    """先增量更新全文索引（只解析新增或修改过的文件），再通过索引搜索"""
+    search_tool.search_results = {}
+
+    if not search_tool.excel_files:
+        return 0
+
+    if match_whole_word:
+        pattern = r'\b' + re.escape(search_term) + r'\b'
+    else:
+        pattern = re.escape(search_term)
+
+    flags = 0 if case_sensitive else re.IGNORECASE
+    regex = re.compile(pattern, flags)
+
+    def on_progress(completed, total):
+        progress_bar.progress(completed / total)
+        status_text.text(f"正在更新索引... {completed}/{total} 个文件")
+
+    index = open_excel_index()
+    refresh_stats = index.refresh(search_tool.excel_files, root=folder_path, progress_callback=on_progress,
+                                  use_processes=use_processes)
+    status_text.text(f"索引已更新：重新解析 {refresh_stats['indexed']} 个文件，"
+                     f"未变化 {refresh_stats['unchanged']} 个，正在搜索...")
+
+    search_tool.search_results, total_matches = index.search(search_tool.excel_files, regex, search_term)
+    progress_bar.progress(1.0)
     return total_matches
 
 
+_SHEET_FRAME_CACHE_SIZE = 4  # 缓存最近读取的工作表数
+_sheet_frames = OrderedDict()
+_sheet_frames_lock = threading.Lock()
+
+
+def _read_sheet_frame(file_path, sheet_name):
+    """读取整张工作表（header=None），按 (路径, 工作表, 修改时间, 大小) 缓存最近几张
+
+    预览时每个匹配行都要取整行数据，同一张表只需读取一次；文件被修改后自动重新读取。
+    """
+    stat = os.stat(file_path)
+    key = (str(file_path), sheet_name, stat.st_mtime_ns, stat.st_size)
+    with _sheet_frames_lock:
+        df = _sheet_frames.get(key)
+        if df is not None:
+            _sheet_frames.move_to_end(key)
+            return df
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+    with _sheet_frames_lock:
+        _sheet_frames[key] = df
+        while len(_sheet_frames) > _SHEET_FRAME_CACHE_SIZE:
+            _sheet_frames.popitem(last=False)
+    return df
+
+
 def get_row_data_as_list(file_path, sheet_name, row_num):
     """获取指定Excel文件中某一行的完整数据（以列表形式返回）"""
     try:
-        # 读取Excel文件的指定工作表
-        df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+        # 读取Excel文件的指定工作表（同一张表只读取一次）
+        df = _read_sheet_frame(file_path, sheet_name)
 
         # 获取指定行的数据（注意：row_num是1-based，需要转换为0-based）
         if row_num <= len(df):
@@ -310,62 +329,35 @@ def selective_replace(search_tool, search_term, replace_term, selected_replaceme
             if not selection['selected']:
                 return
 
-            # 创建备份
-            if backup_files:
-                backup_path = f"{file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                shutil.copy2(file_path, backup_path)
-
-            # 加载工作簿
-            wb = openpyxl.load_workbook(file_path)
-            file_replaced = False
-            file_replacement_count = 0
-
             # 获取该文件的匹配项
             matches = search_tool.search_results[file_path]['matches']
 
+            # 全部替换模式替换所有匹配项，选择特定行模式只替换选中的行
+            if selection['rows'] != 'all':
+                selected_rows = selection['selected_rows']
+                matches = [match for match in matches
+                           if f"{file_path}_{match['sheet_name']}_{match['row']}" in selected_rows]
+
             # 构建正则表达式模式
             flags = 0 if case_sensitive else re.IGNORECASE
             pattern = re.escape(search_term)
-            
-            # 如果是全部替换模式
-            if selection['rows'] == 'all':
-                for match in matches:
-                    sheet = wb[match['sheet_name']]
-                    cell = sheet.cell(row=match['row'], column=match['column'])
-
-                    if cell.value:
-                        # 使用正则表达式执行替换（支持大小写不敏感）
-                        new_value = re.sub(pattern, replace_term, str(cell.value), flags=flags)
-                        if new_value != str(cell.value):
-                            cell.value = new_value
-                            file_replacement_count += 1
-                            file_replaced = True
-
-            # 如果是选择特定行模式
-            else:
-                selected_rows = selection['selected_rows']
-                for match in matches:
-                    row_key = f"{file_path}_{match['sheet_name']}_{match['row']}"
-                    if row_key in selected_rows:
-                        sheet = wb[match['sheet_name']]
-                        cell = sheet.cell(row=match['row'], column=match['column'])
-
-                        if cell.value:
-                            # 使用正则表达式执行替换（支持大小写不敏感）
-                            new_value = re.sub(pattern, replace_term, str(cell.value), flags=flags)
-                            if new_value != str(cell.value):
-                                cell.value = new_value
-                                file_replacement_count += 1
-                                file_replaced = True
-
-            # 保存文件
-            if file_replaced:
-                wb.save(file_path)
+
+            backup_path = None
+            if backup_files:
+                backup_path = f"{file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+            # 只改写命中的单元格，工作簿只写一次（备份优先用硬链接）
+            changes = patch_cells(
+                file_path,
+                [(match['sheet_name'], match['row'], match['column']) for match in matches],
+                lambda text: re.sub(pattern, replace_term, text, flags=flags),
+                backup_path=backup_path
+            )
+
+            if changes:
                 with lock:
                     replaced_files += 1
-                    total_replacements += file_replacement_count
-
-            wb.close()
+                    total_replacements += len(changes)
 
         except Exception as e:
             st.error(f"替换文件 {Path(file_path).name} 时出错: {str(e)}")
@@ -386,6 +378,98 @@ def selective_replace(search_tool, search_term, replace_term, selected_replaceme
     return replaced_files, total_replacements
 
 
+def batch_replace_panel(excel_files, key_prefix, case_sensitive=False, match_whole_word=False, use_processes=False):
+    """按对照表（搜索词 → 替换为）批量替换：每个文件只扫描一次、每个工作簿只保存一次"""
+    st.header("📚 对照表批量替换")
+    st.caption("上传 Excel / CSV 对照表（第一行为表头，前两列为 搜索词、替换为），所有词语一次扫描、一次替换")
+
+    pairs_file = st.file_uploader(
+        "上传对照表",
+        type=['xlsx', 'xls', 'csv'],
+        key=f"{key_prefix}_pairs_file"
+    )
+    if pairs_file is None:
+        return
+
+    try:
+        pairs = load_term_pairs(pairs_file)
+        replacer = TermReplacer(pairs, case_sensitive, match_whole_word)
+    except Exception as e:
+        st.error(f"❌ 对照表读取失败: {e}")
+        return
+
+    st.success(f"✅ 读取到 {len(pairs)} 组搜索替换词")
+    with st.expander("📋 对照表预览"):
+        st.dataframe(pd.DataFrame(pairs[:100], columns=["搜索词", "替换为"]), use_container_width=True)
+
+    scan_key = f"{key_prefix}_batch_scan"
+    # 对照表或匹配选项变化后，之前的扫描结果作废
+    scan_signature = (tuple(pairs), case_sensitive, match_whole_word, tuple(str(f) for f in excel_files))
+    if st.session_state.get(scan_key, {}).get('signature') != scan_signature:
+        st.session_state[scan_key] = {'signature': scan_signature, 'found': None, 'errors': {}}
+    scan_state = st.session_state[scan_key]
+
+    backup_files = st.checkbox("创建备份文件", value=True, key=f"{key_prefix}_batch_backup")
+
+    if st.button("🔍 按对照表扫描", key=f"{key_prefix}_batch_scan_btn", use_container_width=True):
+        if not excel_files:
+            st.error("❌ 没有可扫描的Excel文件")
+            return
+
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+        def on_progress(completed, total):
+            progress_bar.progress(completed / total)
+            status_text.text(f"正在扫描... {completed}/{total} 个文件")
+
+        found, errors = scan_term_pairs(excel_files, replacer, use_processes=use_processes,
+                                        progress_callback=on_progress)
+        progress_bar.empty()
+        status_text.empty()
+        scan_state['found'] = found
+        scan_state['errors'] = errors
+
+    found = scan_state['found']
+    if found is None:
+        return
+
+    for path, error in scan_state['errors'].items():
+        st.warning(f"读取文件 {Path(path).name} 失败: {error}")
+
+    total_hits = sum(len(spans) for cells in found.values() for *_, spans in cells)
+    if not total_hits:
+        st.warning("⚠️ 对照表中的词语均未找到")
+        return
+
+    st.info(f"**统计信息:** 在 {len(found)} 个文件中找到 {total_hits} 处匹配")
+    st.dataframe(term_pair_report(replacer, found), use_container_width=True)
+
+    if st.button("🔄 执行对照表替换", key=f"{key_prefix}_batch_replace_btn", type="primary",
+                 use_container_width=True):
+        replaced = Counter()
+        replaced_files = 0
+        progress_bar = st.progress(0)
+        for i, (path, cells) in enumerate(found.items(), start=1):
+            try:
+                counts = replace_in_workbook(path, [(sheet, row, col) for sheet, row, col, _, _ in cells],
+                                             replacer, backup=backup_files)
+                if counts:
+                    replaced.update(counts)
+                    replaced_files += 1
+            except Exception as e:
+                st.error(f"替换文件 {Path(path).name} 时出错: {e}")
+            progress_bar.progress(i / len(found))
+        progress_bar.empty()
+
+        st.success(f"✅ 替换完成！在 {replaced_files} 个文件中完成了 {sum(replaced.values())} 处替换")
+        st.dataframe(term_pair_report(replacer, found, replaced), use_container_width=True)
+        if sum(replaced.values()) < total_hits:
+            st.caption("公式单元格和数字、日期等非文本单元格中的匹配不替换")
+        st.info("💡 替换完成，请重新扫描以查看更新后的内容")
+        scan_state['found'] = None
+
+
 def excel_replace_page():
     st.title("🔍 Excel文件批量搜索替换工具")
     st.markdown("### 批量搜索和替换文件夹中所有Excel文件的内容")
@@ -471,6 +555,20 @@ def excel_replace_page():
         )
         st.session_state.match_whole_word = match_whole_word
 
+        use_index = st.checkbox(
+            "使用全文索引",
+            value=st.session_state.get('use_excel_index', True),
+            help="首次搜索时为文件夹建立索引，之后只重新解析新增或修改过的文件，重复搜索大文件夹快得多"
+        )
+        st.session_state.use_excel_index = use_index
+
+        use_processes = st.checkbox(
+            "多进程解析",
+            value=st.session_state.get('excel_use_processes', available_cpus() > 1),
+            help=f"用多个进程并行解析工作簿，使用索引时用于更新索引（本机可用 CPU: {available_cpus()}），大文件夹比多线程快得多"
+        )
+        st.session_state.excel_use_processes = use_processes
+
     # 搜索按钮
     if st.button("🚀 开始搜索", key="search_btn", use_container_width=True):
         if not folder_path:
@@ -486,14 +584,35 @@ def excel_replace_page():
         status_text = st.empty()
 
         with st.spinner("正在搜索Excel文件..."):
-            total_matches = multithreaded_search(
-                search_tool,
-                search_term,
-                case_sensitive,
-                match_whole_word,
-                progress_bar,
-                status_text
-            )
+            if use_index:
+                total_matches = indexed_search(
+                    search_tool,
+                    folder_path,
+                    search_term,
+                    case_sensitive,
+                    match_whole_word,
+                    progress_bar,
+                    status_text,
+                    use_processes=use_processes
+                )
+            elif use_processes:
+                total_matches = multiprocess_search(
+                    search_tool,
+                    search_term,
+                    case_sensitive,
+                    match_whole_word,
+                    progress_bar,
+                    status_text
+                )
+            else:
+                total_matches = multithreaded_search(
+                    search_tool,
+                    search_term,
+                    case_sensitive,
+                    match_whole_word,
+                    progress_bar,
+                    status_text
+                )
 
         progress_bar.empty()
         status_text.empty()
@@ -866,6 +985,9 @@ def excel_replace_page():
                 st.session_state.replace_confirmed = False
                 st.session_state.show_confirm_checkbox = False
 
+    # 对照表批量替换
+    batch_replace_panel(search_tool.excel_files, "replace", case_sensitive, match_whole_word, use_processes)
+
     # 使用说明
     with st.expander("📖 使用说明"):
         st.markdown("""
@@ -880,16 +1002,20 @@ def excel_replace_page():
         6. **保存单个文件修改** - 在可编辑表格中修改后点击"保存修改到Excel"
         7. **快速操作** - 使用"打开文件夹"或"打开Excel"按钮快速访问文件
         8. **批量替换** - 使用批量替换功能对多个文件执行统一替换
+        9. **对照表批量替换** - 上传 搜索词→替换为 对照表，一次扫描、一次保存完成所有词语的替换
 
         ### 功能特点：
         - ✏️ **直接编辑** - 在搜索结果表格中直接修改单元格内容
         - 💾 **即时保存** - 修改后立即保存到Excel文件
-        - 🔍 **多线程批量搜索** - 自动使用多线程加速搜索，充分利用CPU资源
+        - 🔍 **多线程 / 多进程批量搜索** - 多进程模式按文件大小分块并行解析，充分利用多核CPU
+        - 🗂️ **全文索引** - 索引保存在 translation_saves/excel_index.db，文件修改后下次搜索自动增量更新
         - 📊 **原表格展示** - 以原始表格形式显示匹配行的完整数据
         - 📂 **快速访问** - 一键打开文件所在文件夹或直接打开Excel文件
         - 🎯 **选择性替换** - 可以选择特定文件、特定行进行批量替换
+        - 📚 **对照表替换** - 几百组词语编译成一个匹配器，每个文件只扫描一次，并按词语统计命中和替换次数
         - ⚙️ **灵活选项** - 支持大小写敏感和全词匹配
-        - 💾 **自动备份** - 批量替换前可自动创建备份文件
+        - 💾 **自动备份** - 批量替换前可自动创建备份文件（文件系统支持时用硬链接，不占额外空间）
+        - 🎨 **保留格式** - 替换只改写命中的单元格，其余内容和格式原样保留，大文件也能很快完成
         - 📁 **多格式支持** - 支持 .xlsx, .xls, .xlsm, .xlsb 格式
         - ⚡ **实时进度** - 显示搜索和替换的实时进度
 
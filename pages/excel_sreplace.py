@@ -2,7 +2,6 @@
 
 import os
 import re
-import shutil
 import platform
 import subprocess
 from pathlib import Path
@@ -10,7 +9,11 @@ from datetime import datetime
 
 import pandas as pd
 import streamlit as st
-import openpyxl
+
+from excel_scan import scan_files, substring_matcher
+from pages.excel_replace import batch_replace_panel
+from tokenizer_cache import available_cpus
+from xlsx_patch import patch_cells
 
 
 def excel_sreplace_page():
@@ -60,11 +63,14 @@ def excel_sreplace_page():
         )
         st.session_state.sreplace_replace_term = replace_term
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         case_sensitive = st.checkbox("大小写敏感", value=False)
     with col2:
         create_backup = st.checkbox("创建备份", value=True)
+    with col3:
+        use_processes = st.checkbox("多进程解析", value=available_cpus() > 1,
+                                    help=f"用多个进程并行解析工作簿（本机可用 CPU: {available_cpus()}）")
 
     # 搜索按钮
     if st.button("🔍 搜索", use_container_width=True):
@@ -91,43 +97,30 @@ def excel_sreplace_page():
 
         progress_bar = st.progress(0)
 
-        for i, file_path in enumerate(excel_files):
-            try:
-                wb = openpyxl.load_workbook(file_path, read_only=True)
-                file_matches = []
-
-                for sheet_name in wb.sheetnames:
-                    sheet = wb[sheet_name]
-                    for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
-                        for col_idx, cell_value in enumerate(row, start=1):
-                            if cell_value is not None:
-                                cell_str = str(cell_value)
-                                if case_sensitive:
-                                    if search_term in cell_str:
-                                        file_matches.append({
-                                            'sheet': sheet_name,
-                                            'row': row_idx,
-                                            'col': col_idx,
-                                            'value': cell_str
-                                        })
-                                else:
-                                    if search_term.lower() in cell_str.lower():
-                                        file_matches.append({
-                                            'sheet': sheet_name,
-                                            'row': row_idx,
-                                            'col': col_idx,
-                                            'value': cell_str
-                                        })
-
-                if file_matches:
-                    results[str(file_path)] = file_matches
-
-                wb.close()
-            except Exception as e:
-                st.warning(f"读取文件 {file_path.name} 失败: {e}")
+        # 各进程按文件大小分块解析，结果按完成顺序返回，最后按文件顺序整理
+        found = {}
+        matcher = substring_matcher(search_term, case_sensitive)
+        scanned = scan_files(excel_files, matcher, data_only=False, use_processes=use_processes)
+        for i, (path, sheet_names, hits, error) in enumerate(scanned):
+            if error is not None:
+                st.warning(f"读取文件 {Path(path).name} 失败: {error}")
+            elif hits:
+                found[path] = [
+                    {
+                        'sheet': sheet_names[sheet_idx],
+                        'row': row_idx,
+                        'col': col_idx,
+                        'value': cell_str
+                    }
+                    for sheet_idx, row_idx, col_idx, cell_str, _ in hits
+                ]
 
             progress_bar.progress((i + 1) / len(excel_files))
 
+        for file_path in excel_files:
+            if str(file_path) in found:
+                results[str(file_path)] = found[str(file_path)]
+
         progress_bar.empty()
         st.session_state.sreplace_results = results
 
@@ -209,27 +202,23 @@ def excel_sreplace_page():
             replaced_count = 0
             for file_path, replacements in file_replacements.items():
                 try:
-                    # 备份
+                    backup_path = None
                     if create_backup:
                         backup_path = f"{file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                        shutil.copy2(file_path, backup_path)
-
-                    # 加载并替换
-                    wb = openpyxl.load_workbook(file_path)
 
-                    for rep in replacements:
-                        sheet = wb[rep['sheet']]
-                        cell = sheet.cell(row=rep['row'], column=rep['col'])
-                        if cell.value:
-                            if case_sensitive:
-                                cell.value = str(cell.value).replace(search_term, replace_term)
-                            else:
-                                cell.value = re.sub(re.escape(search_term), replace_term,
-                                                    str(cell.value), flags=re.IGNORECASE)
-                            replaced_count += 1
+                    if case_sensitive:
+                        transform = lambda text: text.replace(search_term, replace_term)
+                    else:
+                        transform = lambda text: re.sub(re.escape(search_term), replace_term, text, flags=re.IGNORECASE)
 
-                    wb.save(file_path)
-                    wb.close()
+                    # 只改写选中的单元格，工作簿只写一次（备份优先用硬链接）
+                    changes = patch_cells(
+                        file_path,
+                        [(rep['sheet'], rep['row'], rep['col']) for rep in replacements],
+                        transform,
+                        backup_path=backup_path
+                    )
+                    replaced_count += len(changes)
 
                 except Exception as e:
                     st.error(f"替换文件 {Path(file_path).name} 失败: {e}")
@@ -238,3 +227,9 @@ def excel_sreplace_page():
             st.session_state.sreplace_results = {}
             st.session_state.sreplace_selected_rows = set()
             st.rerun()
+
+    # 对照表批量替换（多组词语一次扫描、一次保存）
+    if folder_path and Path(folder_path).exists():
+        folder = Path(folder_path)
+        excel_files = list(folder.rglob("*.xlsx")) + list(folder.rglob("*.xls"))
+        batch_replace_panel(excel_files, "sreplace", case_sensitive, use_processes=use_processes)
@@ -2,9 +2,14 @@
 import streamlit as st
 import os
 import pandas as pd
-from openai import OpenAI
 import io
 import concurrent.futures
+import time
+
+from http_client import get_openai_client
+from async_client import chat_completions_url, run_chat_requests
+from rate_limiter import format_limiter_status, get_shared_limiter, limiter_key
+from token_budget import get_token_counter
 
 # --- 1. 核心工具函数 ---
 
@@ -27,11 +32,8 @@ def get_all_code_files(root_path):
                 code_files.append(full_path)
     return code_files
 
-def analyze_code_with_llm(client_params, file_path, code_content):
-    """并发分析单个文件"""
-    base_url, api_key, model = client_params
-    client = OpenAI(base_url=base_url, api_key=api_key)
-    
+def build_analysis_messages(file_path, code_content):
+    """构建单个文件的分析请求消息"""
     file_name = os.path.basename(file_path)
     # 截断防止 Token 溢出
     if len(code_content) > 15000: 
@@ -48,19 +50,49 @@ def analyze_code_with_llm(client_params, file_path, code_content):
     代码内容:
     {code_content}
     """
+    return [
+        {"role": "system", "content": "你是一个代码审计专家。请用中文简练回答。"},
+        {"role": "user", "content": prompt}
+    ]
+
+def analyze_code_with_llm(client_params, file_path, code_content, max_retries=2):
+    """并发分析单个文件（失败时重试，与异步模式一致）"""
+    base_url, api_key, model = client_params
+    client = get_openai_client(api_key, base_url)
+    limiter = get_shared_limiter(limiter_key(base_url))
+    messages = build_analysis_messages(file_path, code_content)
+    counter = get_token_counter()
     
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "你是一个代码审计专家。请用中文简练回答。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"分析出错: {str(e)}"
+    for attempt in range(max_retries + 1):
+        try:
+            limiter.acquire(tokens=sum(counter.count(m["content"]) for m in messages))
+            raw = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=0.1,
+            )
+            limiter.observe(raw.status_code, raw.headers)
+            return raw.parse().choices[0].message.content
+        except Exception as e:
+            limiter.observe_exception(e)
+            if attempt == max_retries:
+                return f"分析出错: {str(e)}"
+            time.sleep(limiter.retry_delay(attempt))
+
+def analyze_files_async(client_params, files, max_concurrency, on_result=None):
+    """异步并发分析全部文件（单个事件循环，不为每个请求占用线程），按 files 顺序返回结果"""
+    base_url, api_key, model = client_params
+    requests_list = []
+    for f in files:
+        with open(f, 'r', encoding='utf-8', errors='ignore') as fh:
+            requests_list.append({"messages": build_analysis_messages(f, fh.read()), "temperature": 0.1})
+
+    results = run_chat_requests(
+        chat_completions_url(base_url), api_key, requests_list, model=model,
+        max_concurrency=max_concurrency, max_retries=2, on_result=on_result,
+        rate_limiter=get_shared_limiter(limiter_key(base_url))
+    )
+    return [res if isinstance(res, str) else f"分析出错: {res}" for res in results]
 
 def build_context_from_df(df):
     """从 DataFrame 重建上下文知识库字符串"""
@@ -106,7 +138,8 @@ def file_scanner_page():
         with tab_scan:
             st.caption("扫描本地文件夹生成新报告")
             target_folder = st.text_input("项目路径", placeholder="C:\\Projects\\MyCode", key="scanner_target_folder")
-            max_workers = st.slider("并发线程", 1, 10, 5, key="scanner_workers")
+            use_async = st.checkbox("异步并发（适合大量文件）", value=False, key="scanner_use_async")
+            max_workers = st.slider("最大并发请求" if use_async else "并发线程", 1, 100 if use_async else 10, 5, key="scanner_workers")
             btn_scan = st.button("开始扫描", type="primary", key="btn_scan_start")
 
         # --- 模式 B: 读取 Excel ---
@@ -139,23 +172,37 @@ def file_scanner_page():
                 temp_results = []
                 
                 client_params = (base_url, api_key, model_name)
+                limiter = get_shared_limiter(limiter_key(base_url))
                 
-                # 并发执行
-                with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    future_to_file = {executor.submit(analyze_code_with_llm, client_params, f, open(f, 'r', encoding='utf-8', errors='ignore').read()): f for f in files}
+                if use_async:
+                    completed = [0]
+
+                    def on_result(index, result, error):
+                        completed[0] += 1
+                        progress_bar.progress(completed[0] / len(files), text=f"分析中: {os.path.basename(files[index])}")
+                        status_text.caption(format_limiter_status(limiter.snapshot()))
+
+                    results = analyze_files_async(client_params, files, max_workers, on_result)
+                    for file_path, res in zip(files, results):
+                        temp_results.append({"文件名": os.path.basename(file_path), "路径": file_path, "分析详情": res})
+                else:
+                    # 并发执行
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        future_to_file = {executor.submit(analyze_code_with_llm, client_params, f, open(f, 'r', encoding='utf-8', errors='ignore').read()): f for f in files}
                     
-                    completed = 0
-                    for future in concurrent.futures.as_completed(future_to_file):
-                        file_path = future_to_file[future]
-                        file_name = os.path.basename(file_path)
-                        try:
-                            res = future.result()
-                        except:
-                            res = "Error"
+                        completed = 0
+                        for future in concurrent.futures.as_completed(future_to_file):
+                            file_path = future_to_file[future]
+                            file_name = os.path.basename(file_path)
+                            try:
+                                res = future.result()
+                            except:
+                                res = "Error"
                         
-                        temp_results.append({"文件名": file_name, "路径": file_path, "分析详情": res})
-                        completed += 1
-                        progress_bar.progress(completed / len(files), text=f"分析中: {file_name}")
+                            temp_results.append({"文件名": file_name, "路径": file_path, "分析详情": res})
+                            completed += 1
+                            progress_bar.progress(completed / len(files), text=f"分析中: {file_name}")
+                            status_text.caption(format_limiter_status(limiter.snapshot()))
 
                 progress_container.empty()
                 
@@ -232,19 +279,28 @@ def file_scanner_page():
                 if not api_key:
                      st.error("请先配置 API Key")
                 else:
-                    client = OpenAI(base_url=base_url, api_key=api_key)
+                    client = get_openai_client(api_key, base_url)
+                    limiter = get_shared_limiter(limiter_key(base_url))
+                    chat_messages = [
+                        {"role": "system", "content": system_prompt},
+                        *st.session_state.scanner_messages[-6:] # 保留最近 6 轮对话历史
+                    ]
+                    counter = get_token_counter()
+                    limiter.acquire(tokens=sum(counter.count(m["content"]) for m in chat_messages))
                     
                     with st.chat_message("assistant"):
-                        stream = client.chat.completions.create(
-                            model=model_name,
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                *st.session_state.scanner_messages[-6:] # 保留最近 6 轮对话历史
-                            ],
-                            stream=True,
-                            temperature=0.3
-                        )
-                        response = st.write_stream(stream)
+                        try:
+                            raw = client.chat.completions.with_raw_response.create(
+                                model=model_name,
+                                messages=chat_messages,
+                                stream=True,
+                                temperature=0.3
+                            )
+                        except Exception as e:
+                            limiter.observe_exception(e)
+                            raise
+                        limiter.observe(raw.status_code, raw.headers)
+                        response = st.write_stream(raw.parse())
                     
                     st.session_state.scanner_messages.append({"role": "assistant", "content": response})
                 
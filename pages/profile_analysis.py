@@ -16,6 +16,10 @@ from datetime import datetime
 import pandas as pd
 import io
 
+from http_client import get_http_session
+from rate_limiter import format_limiter_status, get_shared_limiter, limiter_key
+from token_budget import get_token_counter
+
 # --- 1. 核心逻辑函数 (移植自原 123.py) ---
 
 API_CONFIGS = {
@@ -106,6 +110,14 @@ def get_file_content(file_path):
     else:
         return f"不支持的文件类型: {file_ext}"
 
+def get_api_limiter(api_provider, custom_url=None):
+    """同一服务商共享的限速器（与其他页面共用）"""
+    if api_provider == "Custom" and custom_url:
+        url = custom_url
+    else:
+        url = API_CONFIGS.get(api_provider, API_CONFIGS["DeepSeek"])["url"]
+    return get_shared_limiter(limiter_key(url))
+
 def call_ai_api(content, api_provider, api_key, custom_url=None, model=None, custom_prompt=""):
     """调用AI API分析文档内容"""
     if api_provider == "Custom" and custom_url:
@@ -147,7 +159,14 @@ def call_ai_api(content, api_provider, api_key, custom_url=None, model=None, cus
         "temperature": 0.3
     }
 
-    response = requests.post(url, headers=headers, json=data, timeout=120)
+    limiter = get_shared_limiter(limiter_key(url))
+    limiter.acquire(tokens=get_token_counter().count(prompt))
+    try:
+        response = get_http_session().post(url, headers=headers, json=data, timeout=120)
+    except requests.exceptions.RequestException as e:
+        limiter.observe_exception(e)
+        raise
+    limiter.observe(response.status_code, response.headers)
     response.raise_for_status()
     result = response.json()
     return result["choices"][0]["message"]["content"]
@@ -214,7 +233,7 @@ def process_single_file(file_path, api_provider, api_key, custom_url, model, cus
                         "error": "用户手动终止",
                         "retry_count": retry_count - 1
                     }
-                 time.sleep(2 ** retry_count) # Backoff
+                 time.sleep(get_api_limiter(api_provider, custom_url).retry_delay(retry_count)) # Backoff
             else:
                 return {
                     "status": "failed",
@@ -374,7 +393,7 @@ def profile_analysis_page():
                 
                 completed += 1
                 progress_bar.progress(completed / total_files)
-                status_text.text(f"进度: {completed}/{total_files} | 成功: {success}")
+                status_text.text(f"进度: {completed}/{total_files} | 成功: {success} | {format_limiter_status(get_api_limiter(api_provider, custom_url).snapshot())}")
                 log_container.code("\n".join(st.session_state.pa_logs[-10:])) # Show last 10 logs
 
         # Clean up temp dir if created
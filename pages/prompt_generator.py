@@ -7,6 +7,7 @@ import pandas as pd
 import streamlit as st
 
 from translator import MultiAPIExcelTranslator
+from token_budget import get_token_counter
 from api_config import (
     get_api_providers,
     get_preset_languages,
@@ -147,6 +148,16 @@ def prompt_generator_page():
             key="prompt_batch_size"
         )
 
+        term_token_budget = st.number_input(
+            "术语部分Token上限（0为不限）",
+            min_value=0,
+            max_value=100000,
+            value=0,
+            step=500,
+            help="单批次匹配到的术语过多时按术语库顺序截断，避免提示词超出模型上下文",
+            key="prompt_term_token_budget"
+        )
+
     with col2:
         st.header("📚 术语库和性格库")
 
@@ -348,7 +359,9 @@ def prompt_generator_page():
 
             term_base_prompt = ""
             if term_base_loaded:
-                term_base_prompt = translator.build_term_base_prompt(all_text_in_batch, target_language)
+                term_base_prompt = translator.build_term_base_prompt(
+                    all_text_in_batch, target_language, term_token_budget or None
+                )
             else:
                 term_base_prompt = "\n\n### 术语库匹配：\n无术语库加载，跳过术语匹配。"
 
@@ -410,6 +423,7 @@ def prompt_generator_page():
         current_prompt = all_prompts[current_batch_index]
 
         st.code(current_prompt, language=None)
+        st.caption(f"🧮 本批次提示词约 {get_token_counter().count(current_prompt):,} Token")
         st.info("👆 请使用上方代码块右下角的复制按钮进行一键复制。")
 
         col_prev, col_info, col_next = st.columns([1, 2, 1])
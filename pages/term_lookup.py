@@ -4,6 +4,7 @@ import pandas as pd
 import streamlit as st
 
 from translator import MultiAPIExcelTranslator
+from glossary_snapshot import load_snapshot, read_glossary_file, save_snapshot, snapshot_key
 from api_config import get_api_providers, get_preset_languages
 
 
@@ -34,8 +35,7 @@ def term_lookup_page():
 
         if uploaded_term_base is not None:
             try:
-                df = pd.read_excel(uploaded_term_base)
-                df.columns = df.columns.str.strip().str.replace('\n', '').str.replace('\r', '')
+                df, term_hash = read_glossary_file(uploaded_term_base)
                 st.success(f"✅ 成功读取术语库，共 {len(df)} 条记录")
 
                 with st.expander("📊 术语库预览"):
@@ -58,7 +58,15 @@ def term_lookup_page():
                 )
 
                 if st.button("📥 加载术语库", key="lookup_load_term_base"):
-                    if translator.load_term_base(df, source_col, target_col):
+                    glossary_key = snapshot_key(term_hash, source_col, target_col)
+                    snapshot = load_snapshot(glossary_key)
+                    if snapshot is not None:
+                        loaded = translator.load_glossary_snapshot(snapshot)
+                    else:
+                        loaded = translator.load_term_base(df, source_col, target_col)
+                        if loaded:
+                            save_snapshot(translator.glossary_snapshot(glossary_key))
+                    if loaded:
                         st.session_state.lookup_term_loaded = True
                         st.success("✅ 术语库加载成功")
                         st.rerun()
@@ -0,0 +1,457 @@
+# rate_limiter.py - API 请求限速（按每分钟请求数 / Token 数）
+#
+# RateLimiter 是固定速率的令牌桶；AdaptiveRateLimiter 额外根据响应头和 429/5xx
+# 动态调整速率，并带有熔断器：连续失败时所有调用方一起暂停。
+# 各页面通过 get_shared_limiter(limiter_key(url)) 共享同一个服务商的限速器。
+
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """线程安全的令牌桶，按固定速率补充令牌"""
+
+    def __init__(self, rate_per_minute, burst_seconds=5.0):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate_per_second * burst_seconds)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+            self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """返回凑够 amount 个令牌还需等待的秒数（0 表示可立即取用）"""
+        self._refill(now)
+        # 单次请求超过桶容量时按满桶处理，避免永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """同时限制每分钟请求数（RPM）和每分钟 Token 数（TPM）
+
+    rpm / tpm 为 0 或 None 表示不限制。多个线程共享同一实例即可实现全局限速。
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, burst_seconds=5.0):
+        self.requests_per_minute = requests_per_minute or 0
+        self.tokens_per_minute = tokens_per_minute or 0
+        self._request_bucket = TokenBucket(self.requests_per_minute, burst_seconds) if self.requests_per_minute else None
+        self._token_bucket = TokenBucket(self.tokens_per_minute, burst_seconds) if self.tokens_per_minute else None
+        self._lock = threading.Lock()
+
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_wait_time = 0.0
+
+    def _try_acquire(self, tokens):
+        """尝试立即取用预算；成功返回 0，否则返回建议等待的秒数"""
+        with self._lock:
+            return self._reserve(tokens, time.monotonic())
+
+    def _reserve(self, tokens, now):
+        # 调用方需持有 self._lock
+        wait = 0.0
+        if self._request_bucket:
+            wait = max(wait, self._request_bucket.wait_time(1, now))
+        if self._token_bucket and tokens:
+            wait = max(wait, self._token_bucket.wait_time(tokens, now))
+
+        if wait <= 0:
+            if self._request_bucket:
+                self._request_bucket.consume(1)
+            if self._token_bucket and tokens:
+                self._token_bucket.consume(tokens)
+            self.total_requests += 1
+            self.total_tokens += tokens
+            return 0.0
+        return min(wait, 1.0)
+
+    def acquire(self, tokens=0):
+        """阻塞直到预算允许发出一次请求，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                with self._lock:
+                    self.total_wait_time += waited
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens=0):
+        """acquire 的协程版本：等待期间不占用线程"""
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                with self._lock:
+                    self.total_wait_time += waited
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def observe(self, status_code=None, headers=None):
+        """记录一次响应结果；固定速率限速器不做调整"""
+
+    def observe_exception(self, exc):
+        """记录一次请求异常；固定速率限速器不做调整"""
+
+    def retry_delay(self, attempt):
+        """第 attempt 次失败后建议的重试等待秒数"""
+        return min(2 ** attempt, 60)
+
+
+def _parse_duration(value):
+    """解析 "6m0s" / "1.5s" / "20ms" / "30" 形式的时长，返回秒数；无法解析返回 None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def _parse_retry_after(value):
+    """Retry-After 可以是秒数或 HTTP 日期"""
+    seconds = _parse_duration(value)
+    if seconds is not None or value is None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header(headers, name):
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.title())
+    return value
+
+
+def _is_network_error(exc):
+    """超时 / 连接类异常（requests、httpx、openai 的异常类名都遵循这些命名）"""
+    if isinstance(exc, (OSError, asyncio.TimeoutError)):
+        return True
+    name = type(exc).__name__
+    return any(word in name for word in ("Timeout", "Connect", "Protocol", "ReadError", "WriteError", "NetworkError"))
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后进入 open 状态，所有调用方一起暂停 cooldown 秒
+
+    暂停结束后进入 half_open，只放行一个探测请求：成功则恢复，失败则加倍暂停时间。
+    非线程安全，由 AdaptiveRateLimiter 在持锁状态下调用。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, cooldown=30.0, max_cooldown=300.0, probe_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+
+        self.state = self.CLOSED
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probe_started = None
+        self.trips = 0
+
+    def pause(self, seconds, now):
+        """立即暂停 seconds 秒（例如服务端返回 Retry-After）"""
+        if seconds <= 0:
+            return
+        self.open_until = max(self.open_until, now + seconds)
+        self.state = self.OPEN
+        self.probe_started = None
+
+    def wait_time(self, now):
+        """返回当前需要等待的秒数；0 表示可以发出请求"""
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return self.open_until - now
+            self.state = self.HALF_OPEN
+            self.probe_started = None
+
+        if self.state == self.HALF_OPEN:
+            if self.probe_started is None or now - self.probe_started > self.probe_timeout:
+                self.probe_started = now
+                return 0.0
+            return 0.5
+        return 0.0
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self.cooldown = self.base_cooldown
+            self.probe_started = None
+
+    def release_probe(self):
+        """探测请求没有反映服务端状态（例如本地异常）时放弃本次探测，由下一个请求重新探测"""
+        if self.state == self.HALF_OPEN:
+            self.probe_started = None
+
+    def record_failure(self, now):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._trip(now)
+        elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._trip(now)
+
+    def _trip(self, now):
+        self.trips += 1
+        self.pause(self.cooldown, now)
+
+    def remaining(self, now):
+        return max(0.0, self.open_until - now) if self.state == self.OPEN else 0.0
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """根据服务端反馈自动调整速率的限速器
+
+    - 429：请求速率减半（不低于 min_requests_per_minute），并遵守 Retry-After
+    - 成功：速率按配置上限的 5% 逐步恢复
+    - x-ratelimit-remaining-* 为 0 时暂停到 x-ratelimit-reset-*
+    - 连续 429/5xx/网络错误达到阈值时熔断，所有共享此实例的调用方一起暂停
+    - 其他 4xx（提示词或密钥有误等）说明服务端可达，结束熔断探测，但不提高速率
+    requests_per_minute 为 0 表示初始不限速，出现 429 后按最近一分钟的实际吞吐降速。
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, burst_seconds=5.0,
+                 min_requests_per_minute=6, failure_threshold=5, cooldown=30.0, max_retry_delay=10.0):
+        super().__init__(requests_per_minute, tokens_per_minute, burst_seconds)
+        self.burst_seconds = burst_seconds
+        self.min_requests_per_minute = min_requests_per_minute
+        self.max_retry_delay = max_retry_delay
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+
+        self.current_rpm = self.requests_per_minute or None  # None 表示当前不限速
+        self.header_rpm_limit = None
+        self._recent = deque()  # 最近 60 秒发出请求的时间戳
+
+        self.success_count = 0
+        self.rate_limited_count = 0
+        self.server_error_count = 0
+        self.network_error_count = 0
+
+    def configure(self, requests_per_minute=0, tokens_per_minute=0):
+        """更新配置的速率上限（页面参数变化时调用）"""
+        with self._lock:
+            if (requests_per_minute or 0) != self.requests_per_minute:
+                self.requests_per_minute = requests_per_minute or 0
+                self._set_rpm(self.requests_per_minute or None)
+            if (tokens_per_minute or 0) != self.tokens_per_minute:
+                self.tokens_per_minute = tokens_per_minute or 0
+                self._token_bucket = TokenBucket(self.tokens_per_minute, self.burst_seconds) if self.tokens_per_minute else None
+
+    def _ceiling(self):
+        limits = [limit for limit in (self.requests_per_minute, self.header_rpm_limit) if limit]
+        return min(limits) if limits else None
+
+    def _set_rpm(self, rpm):
+        ceiling = self._ceiling()
+        if rpm is not None:
+            rpm = max(self.min_requests_per_minute, rpm)
+            if ceiling:
+                rpm = min(rpm, ceiling)
+        self.current_rpm = rpm
+        if rpm is None:
+            self._request_bucket = None
+        else:
+            # 调整速率时保留桶内剩余的令牌，避免突然放出一整桶请求
+            old_tokens = self._request_bucket.tokens if self._request_bucket else None
+            self._request_bucket = TokenBucket(rpm, self.burst_seconds)
+            if old_tokens is not None:
+                self._request_bucket.tokens = min(old_tokens, self._request_bucket.capacity)
+
+    def _reserve(self, tokens, now):
+        wait = self.breaker.wait_time(now)
+        if wait > 0:
+            return min(wait, 1.0)
+        wait = super()._reserve(tokens, now)
+        if wait <= 0:
+            self._recent.append(now)
+            self._trim_recent(now)
+        return wait
+
+    def _trim_recent(self, now):
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+
+    def _observed_rpm(self, now):
+        # 最近请求跨度不足一分钟时按实际跨度折算，避免刚开始就把速率压得过低
+        self._trim_recent(now)
+        if not self._recent:
+            return self.min_requests_per_minute * 2
+        span = max(now - self._recent[0], 1.0)
+        return len(self._recent) * 60.0 / span
+
+    def throughput(self):
+        """最近一分钟实际发出的请求数"""
+        with self._lock:
+            self._trim_recent(time.monotonic())
+            return len(self._recent)
+
+    def observe(self, status_code=None, headers=None):
+        """根据响应状态码和限流响应头调整速率 / 熔断状态"""
+        with self._lock:
+            now = time.monotonic()
+            self._apply_headers(headers, now)
+
+            if status_code == 429:
+                self.rate_limited_count += 1
+                base = self.current_rpm or self._observed_rpm(now)
+                self._set_rpm(base * 0.5)
+                self.breaker.record_failure(now)
+                retry_after = _parse_retry_after(_header(headers, 'retry-after'))
+                if retry_after:
+                    self.breaker.pause(retry_after, now)
+            elif status_code is not None and status_code >= 500:
+                self.server_error_count += 1
+                self.breaker.record_failure(now)
+            elif status_code is not None and status_code < 400:
+                self.success_count += 1
+                self.breaker.record_success()
+                if self.current_rpm is not None:
+                    ceiling = self._ceiling()
+                    step = max(1.0, (ceiling or self.current_rpm) * 0.05)
+                    self._set_rpm(self.current_rpm + step)
+            elif status_code is not None:
+                # 其他 4xx 是请求本身的问题，服务端可达：半开状态下的探测按成功结束
+                self.breaker.record_success()
+
+    def _apply_headers(self, headers, now):
+        if not headers:
+            return
+        limit = _header(headers, 'x-ratelimit-limit-requests')
+        try:
+            self.header_rpm_limit = int(limit) if limit is not None else self.header_rpm_limit
+        except ValueError:
+            pass
+
+        for kind in ('requests', 'tokens'):
+            remaining = _header(headers, f'x-ratelimit-remaining-{kind}')
+            try:
+                exhausted = remaining is not None and int(float(remaining)) <= 0
+            except ValueError:
+                exhausted = False
+            if exhausted:
+                reset = _parse_duration(_header(headers, f'x-ratelimit-reset-{kind}'))
+                if reset:
+                    self.breaker.pause(reset, now)
+
+    def observe_exception(self, exc):
+        """记录请求异常：带状态码的 HTTP 错误按 observe 处理，超时 / 连接错误计入熔断"""
+        response = getattr(exc, 'response', None)
+        status_code = getattr(exc, 'status_code', None) or getattr(response, 'status_code', None)
+        if status_code:
+            self.observe(status_code, getattr(response, 'headers', None))
+            return
+        if not _is_network_error(exc):
+            # 与服务端状态无关的异常：放弃本次探测，其他调用方不必等到 probe_timeout
+            with self._lock:
+                self.breaker.release_probe()
+            return
+        with self._lock:
+            self.network_error_count += 1
+            self.breaker.record_failure(time.monotonic())
+
+    def retry_delay(self, attempt):
+        """单个调用方的重试等待：只做短暂抖动退避，长时间的暂停由共享的熔断器统一控制"""
+        return min(2 ** attempt, self.max_retry_delay) * random.uniform(0.5, 1.0)
+
+    def snapshot(self):
+        """当前吞吐与限流状态，用于界面展示"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim_recent(now)
+            return {
+                'state': self.breaker.state,
+                'paused_seconds': round(self.breaker.remaining(now), 1),
+                'current_rpm': self.current_rpm,
+                'configured_rpm': self.requests_per_minute or None,
+                'header_rpm_limit': self.header_rpm_limit,
+                'throughput_rpm': len(self._recent),
+                'total_requests': self.total_requests,
+                'total_wait_time': round(self.total_wait_time, 1),
+                'success': self.success_count,
+                'rate_limited': self.rate_limited_count,
+                'server_errors': self.server_error_count,
+                'network_errors': self.network_error_count,
+                'breaker_trips': self.breaker.trips,
+            }
+
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def limiter_key(url):
+    """同一服务商（主机名）共享一个限速器"""
+    return urlparse(url).netloc or str(url)
+
+
+def get_shared_limiter(key="default", requests_per_minute=None, tokens_per_minute=None):
+    """获取进程内共享的 AdaptiveRateLimiter；传入速率参数时同时更新其配置"""
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(requests_per_minute or 0, tokens_per_minute or 0)
+            _shared_limiters[key] = limiter
+            return limiter
+    if requests_per_minute is not None or tokens_per_minute is not None:
+        limiter.configure(
+            limiter.requests_per_minute if requests_per_minute is None else requests_per_minute,
+            limiter.tokens_per_minute if tokens_per_minute is None else tokens_per_minute
+        )
+    return limiter
+
+
+def shared_limiter_snapshots():
+    with _shared_limiters_lock:
+        limiters = dict(_shared_limiters)
+    return {key: limiter.snapshot() for key, limiter in limiters.items()}
+
+
+def format_limiter_status(snapshot):
+    """把 snapshot 格式化为一行状态文本"""
+    states = {CircuitBreaker.CLOSED: "正常", CircuitBreaker.OPEN: "熔断暂停", CircuitBreaker.HALF_OPEN: "探测恢复"}
+    text = f"吞吐 {snapshot['throughput_rpm']} 次/分"
+    if snapshot['current_rpm']:
+        text += f"（限速 {snapshot['current_rpm']:.0f}）"
+    text += f" | {states.get(snapshot['state'], snapshot['state'])}"
+    if snapshot['paused_seconds']:
+        text += f" {snapshot['paused_seconds']:.0f}s"
+    if snapshot['rate_limited']:
+        text += f" | 429×{snapshot['rate_limited']}"
+    return text
@@ -0,0 +1,107 @@
+# role_index.py - 角色名模糊匹配索引（字符倒排索引）
+
+import difflib
+from collections import Counter
+
+CONTAINMENT_SCORE = 0.8  # 一方包含另一方时的最低得分（与原逐对比较规则一致）
+
+
+class RoleNameIndex:
+    """官方角色名的字符倒排索引
+
+    SequenceMatcher.ratio() 不会超过按字符多重集交集计算的上界 2·共有字符数 / 总长度
+    （即 quick_ratio）。先用倒排索引一次算出所有候选的共有字符数，只对上界可能达到
+    目标分数的候选做精确比较，返回结果与逐个比较全部官方角色完全相同。
+    """
+
+    def __init__(self, roles, clean):
+        self.roles = list(roles)
+        self.cleaned = [clean(role) for role in self.roles]
+        self.exact = {}     # {清理后的名称: 第一个对应的官方角色序号}
+        self.postings = {}  # {字符: [(序号, 出现次数), ...]}
+        self.empty = []     # 清理后为空的官方角色（被任何名称"包含"）
+
+        for index, name in enumerate(self.cleaned):
+            if not name:
+                self.empty.append(index)
+                continue
+            self.exact.setdefault(name, index)
+            for char, count in Counter(name).items():
+                self.postings.setdefault(char, []).append((index, count))
+
+    def __len__(self):
+        return len(self.roles)
+
+    def _overlaps(self, query):
+        """{序号: 与 query 的共有字符数}，只包含至少共有一个字符的官方角色"""
+        overlaps = {}
+        for char, query_count in Counter(query).items():
+            for index, count in self.postings.get(char, ()):
+                overlaps[index] = overlaps.get(index, 0) + min(query_count, count)
+        return overlaps
+
+    def best_match(self, query):
+        """返回 (得分最高的官方角色, 得分)；同分取靠前的角色，没有任何相似时返回 (None, 0)
+
+        得分规则：清理后完全相同为 1.0；否则为 SequenceMatcher.ratio()，
+        一方包含另一方时不低于 0.8。query 为已清理的名称。
+        """
+        if not query:
+            return None, 0
+
+        index = self.exact.get(query)
+        if index is not None:
+            return self.roles[index], 1.0
+
+        query_length = len(query)
+        candidates = []
+        for index, overlap in self._overlaps(query).items():
+            length = len(self.cleaned[index])
+            bound = 2.0 * overlap / (query_length + length)
+            if overlap == min(query_length, length):
+                bound = max(bound, CONTAINMENT_SCORE)  # 可能存在包含关系
+            candidates.append((-bound, index))
+        candidates.extend((-CONTAINMENT_SCORE, index) for index in self.empty)
+        candidates.sort()
+
+        best_index = None
+        best_score = 0
+        matcher = difflib.SequenceMatcher(None, query)
+        for negative_bound, index in candidates:
+            if -negative_bound < best_score:
+                break
+            name = self.cleaned[index]
+            matcher.set_seq2(name)
+            score = matcher.ratio()
+            if query in name or name in query:
+                score = max(score, CONTAINMENT_SCORE)
+            if score > best_score or (score == best_score and best_index is not None and index < best_index):
+                best_score = score
+                best_index = index
+
+        if best_index is None:
+            return None, best_score
+        return self.roles[best_index], best_score
+
+    def similar(self, query, min_score, exclude=None):
+        """返回 ratio() >= min_score 的 [(官方角色, 得分)]，按官方角色的原始顺序排列"""
+        if min_score <= 0:
+            indexes = range(len(self.roles))
+        else:
+            query_length = len(query)
+            indexes = sorted(
+                index for index, overlap in self._overlaps(query).items()
+                if 2.0 * overlap / (query_length + len(self.cleaned[index])) >= min_score
+            )
+
+        results = []
+        matcher = difflib.SequenceMatcher(None, query)
+        for index in indexes:
+            role = self.roles[index]
+            if role == exclude:
+                continue
+            matcher.set_seq2(self.cleaned[index])
+            score = matcher.ratio()
+            if score >= min_score:
+                results.append((role, score))
+        return results
@@ -0,0 +1,140 @@
+# term_index.py - 术语匹配自动机（Aho-Corasick）
+
+from collections import deque
+
+
+class TermAutomaton:
+    """术语库的 Aho-Corasick 自动机
+
+    构建一次后，对任意文本只需线性扫描一遍即可找出所有出现的术语，
+    返回与逐条 `term in text` 比较相同的 {原文: [译文列表]} 映射。
+    """
+
+    def __init__(self, term_entries=None):
+        # 每个节点：goto 表、失败指针、输出（以该节点结尾的术语原文）
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.targets = {}  # {原文: [译文, ...]}，译文按术语库顺序去重
+        self._order = {}   # {原文: 在术语库中首次出现的序号}
+        self._shared = False  # 与其他语言共用字典树时，扫描结果需按本语言的原文过滤
+
+        if term_entries:
+            for entry in term_entries:
+                self.add_term(entry['source'], entry['target'])
+            self.build()
+
+    def __len__(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_sources(cls, sources):
+        """只用原文编译字典树（不带译文），供多语言通过 with_targets 共用"""
+        automaton = cls()
+        for source in sources:
+            if source and source not in automaton._order:
+                automaton._insert(source)
+        automaton.build()
+        return automaton
+
+    def with_targets(self, sources, targets):
+        """复用已编译的字典树，挂上一套译文（sources 必须都已在字典树中）
+
+        多语言术语库的原文大多相同，每种语言只需一个 {原文: [译文]} 映射，
+        不必各自重建一遍自动机。
+        """
+        view = TermAutomaton()
+        view._goto = self._goto
+        view._fail = self._fail
+        view._output = self._output
+        view._shared = True
+        for source, target in zip(sources, targets):
+            if source not in self._order:
+                raise KeyError(source)
+            if source not in view.targets:
+                view.targets[source] = []
+                view._order[source] = len(view._order)
+            if target not in view.targets[source]:
+                view.targets[source].append(target)
+        return view
+
+    def _insert(self, source):
+        self._order[source] = len(self._order)
+
+        node = 0
+        for char in source:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(source)
+
+    def add_term(self, source, target):
+        """添加一条术语（同一原文允许多个译文）"""
+        if not source:
+            return
+
+        if source not in self.targets:
+            self.targets[source] = []
+            self._insert(source)
+
+        if target not in self.targets[source]:
+            self.targets[source].append(target)
+
+    def build(self):
+        """按广度优先计算失败指针，并合并输出链"""
+        queue = deque()
+        for next_node in self._goto[0].values():
+            self._fail[next_node] = 0
+            queue.append(next_node)
+
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+
+                fail_node = self._fail[node]
+                while fail_node and char not in self._goto[fail_node]:
+                    fail_node = self._fail[fail_node]
+                fail_target = self._goto[fail_node].get(char, 0)
+                self._fail[next_node] = fail_target if fail_target != next_node else 0
+
+                if self._output[self._fail[next_node]]:
+                    self._output[next_node] = self._output[next_node] + self._output[self._fail[next_node]]
+
+    def find(self, text):
+        """线性扫描文本，返回出现的术语原文集合"""
+        found = set()
+        if not text or not self.targets:
+            return found
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        node = 0
+
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+
+        if self._shared:
+            found.intersection_update(self.targets)
+        return found
+
+    def match(self, text):
+        """返回 {原文: [译文列表]}，按术语在术语库中的顺序排列"""
+        found = self.find(text)
+        if not found:
+            return {}
+
+        return {
+            source: list(self.targets[source])
+            for source in sorted(found, key=self._order.__getitem__)
+        }
@@ -0,0 +1,145 @@
+# token_budget.py - Token 估算、提示词预算与用量统计
+#
+# 默认使用本地近似估算（中日韩字符约一字一 Token，英文单词约四个字母一 Token），
+# 可通过 set_token_counter(TokenCounter(encode)) 换成与模型一致的精确分词器，
+# 例如 tiktoken 的 encoding.encode。
+
+import re
+import threading
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# 中日韩文字（含假名、谚文）逐字计数；字母 / 数字按片段长度折算；其余非空白符号各算一个。
+# 各类分别用整段正则统计（连续片段一次匹配），避免逐字符产生匹配对象
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_NON_CJK_RUNS = re.compile(f'[^{_CJK}]+')
+_WORD_RUNS = re.compile(r'[A-Za-z]+')
+_DIGIT_RUNS = re.compile(r'\d+')
+_COUNTED_RUNS = re.compile(f'[\\s{_CJK}A-Za-z\\d]+')
+
+
+def estimate_tokens(text):
+    """本地近似估算文本的 Token 数"""
+    if not text:
+        return 0
+    text = str(text)
+    count = len(_NON_CJK_RUNS.sub('', text))
+    count += sum((len(word) + 3) // 4 for word in _WORD_RUNS.findall(text))
+    count += sum((len(number) + 2) // 3 for number in _DIGIT_RUNS.findall(text))
+    count += len(_COUNTED_RUNS.sub('', text))
+    return count
+
+
+class TokenCounter:
+    """Token 计数器：默认近似估算，传入 encode（文本 -> Token 列表或数量）时使用精确分词"""
+
+    def __init__(self, encode=None, name=None):
+        self.encode = encode
+        self.name = name or ("exact" if encode else "estimate")
+
+    @classmethod
+    def from_tiktoken(cls, encoding_name="cl100k_base"):
+        """使用 tiktoken 精确计数（未安装 tiktoken 时退回近似估算）"""
+        if not HAS_TIKTOKEN:
+            return cls()
+        encoding = tiktoken.get_encoding(encoding_name)
+        return cls(encoding.encode, name=encoding_name)
+
+    @property
+    def exact(self):
+        return self.encode is not None
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encode is None:
+            return estimate_tokens(text)
+        tokens = self.encode(str(text))
+        return tokens if isinstance(tokens, int) else len(tokens)
+
+    def trim_lines(self, lines, max_tokens):
+        """按顺序保留总计不超过 max_tokens 的行，返回 (保留的行, 丢弃的行数)；max_tokens 为 None 时不限"""
+        if max_tokens is None:
+            return list(lines), 0
+        kept = []
+        used = 0
+        for line in lines:
+            tokens = self.count(line)
+            if used + tokens > max_tokens:
+                break
+            kept.append(line)
+            used += tokens
+        return kept, len(lines) - len(kept)
+
+
+_default_counter = TokenCounter()
+
+
+def get_token_counter():
+    """进程内共享的 Token 计数器"""
+    return _default_counter
+
+
+def set_token_counter(counter):
+    """替换共享的 Token 计数器（例如接入模型对应的精确分词器）"""
+    global _default_counter
+    _default_counter = counter or TokenCounter()
+
+
+def completion_budget(text, max_tokens=4000, ratio=4.0, floor=256):
+    """按原文长度估算单行译文的 max_tokens 上限：不超过 max_tokens，不低于 floor"""
+    return int(min(max_tokens, max(floor, estimate_tokens(text) * ratio + 64)))
+
+
+class UsageStats:
+    """按请求累计的 Token 用量（线程安全）
+
+    服务端返回 usage 时使用实际值，否则使用本地估算值并计入 estimated_requests。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.estimated_requests = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def record(self, prompt_tokens, completion_tokens, estimated=False):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += int(prompt_tokens or 0)
+            self.completion_tokens += int(completion_tokens or 0)
+            if estimated:
+                self.estimated_requests += 1
+
+    def record_response(self, result, prompt_text, completion_text, counter=None):
+        """从 chat/completions 响应中记录用量；没有 usage 字段时估算"""
+        usage = result.get("usage") if isinstance(result, dict) else None
+        if usage and usage.get("prompt_tokens") is not None:
+            self.record(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+            return
+        counter = counter or get_token_counter()
+        self.record(counter.count(prompt_text), counter.count(completion_text), estimated=True)
+
+    def cost(self, input_price_per_million=0.0, output_price_per_million=0.0):
+        """按每百万 Token 单价估算费用"""
+        return (self.prompt_tokens * input_price_per_million
+                + self.completion_tokens * output_price_per_million) / 1_000_000
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'estimated_requests': self.estimated_requests,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.prompt_tokens + self.completion_tokens,
+            }
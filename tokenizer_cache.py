@@ -0,0 +1,290 @@
+# tokenizer_cache.py - 进程内共享的 jieba 分词缓存
+#
+# 同一段文本会在多个语言、多次重试和多个页面中被反复分词。这里把分词结果放进
+# 有界 LRU 缓存，键为 (文本, HMM, 词典版本)：通过本模块 add_word / del_word /
+# suggest_freq(tune=True) / load_userdict 修改词典时版本号递增并清空缓存；
+# 其他代码直接调用 jieba.add_word 时，通过词典大小和总词频的变化也能发现。
+#
+# jieba 在首次使用时才导入；prewarm() 可在后台线程中提前加载词典（约 1 秒），
+# 不阻塞页面渲染。
+#
+# lcut_many() 批量分词：未命中缓存的文本很多时分块交给进程池并行分词。每个工作进程
+# 启动时重放通过本模块做过的词典修改（add_word 等），保证与主进程的分词结果一致。
+
+import os
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CACHE_SIZE = 50000  # 缓存的文本条数上限
+MAX_CACHED_TEXT_LENGTH = 2000  # 更长的文本（如整篇拼接）直接分词，不占用缓存
+PARALLEL_MIN_TEXTS = 20000  # 待分词文本少于该数量时串行分词（进程池启动和加载词典约需 1~2 秒）
+PARALLEL_CHUNK_SIZE = 2000  # 每个进程池任务的文本条数
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class CachedTokenizer:
+    """带 LRU 缓存的 jieba 分词器，接口与 jieba.Tokenizer 的常用方法一致"""
+
+    def __init__(self, tokenizer=None, maxsize=DEFAULT_CACHE_SIZE):
+        self._tokenizer = tokenizer
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        # 通过本对象做过的词典修改，工作进程启动时按顺序完整重放
+        # （jieba 的总词频只增不减，重复添加同一个词也会改变分词概率，因此不能去重）
+        self._dictionary_ops = []
+        self._untracked_changes = False  # 词典被绕过本对象修改过，无法在工作进程中重现
+        self._pool = None
+        self._pool_key = None
+
+    @property
+    def tokenizer(self):
+        """底层的 jieba.Tokenizer；未指定时在首次使用时导入 jieba 并使用其默认分词器"""
+        if self._tokenizer is None:
+            self._tokenizer = import_jieba().dt
+        return self._tokenizer
+
+    def _dictionary_fingerprint(self):
+        return len(self.tokenizer.FREQ), self.tokenizer.total
+
+    def _current_version(self):
+        """当前词典版本；发现词典被外部修改时递增版本并清空缓存"""
+        fingerprint = self._dictionary_fingerprint()
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._fingerprint is not None:
+                    self.version += 1
+                    self._cache.clear()
+                    self._untracked_changes = True
+                self._fingerprint = fingerprint
+            return self.version
+
+    def _invalidate(self, op=None):
+        with self._lock:
+            if op is not None:
+                self._dictionary_ops.append(op)
+            self.version += 1
+            self._cache.clear()
+            self._fingerprint = self._dictionary_fingerprint()
+
+    def lcut(self, text, HMM=True):
+        """分词并返回列表（调用方可以修改返回的列表，不影响缓存）"""
+        return list(self._cut_cached(text, HMM))
+
+    def cut(self, text, HMM=True):
+        return iter(self._cut_cached(text, HMM))
+
+    def _cut_cached(self, text, HMM):
+        text = str(text)
+        if len(text) > MAX_CACHED_TEXT_LENGTH:
+            return tuple(self.tokenizer.cut(text, HMM=HMM))
+
+        # 首次分词会加载词典，先完成初始化再取版本号，避免加载本身被当成词典修改
+        self.tokenizer.check_initialized()
+        version = self._current_version()
+        key = (text, HMM, version)
+        with self._lock:
+            words = self._cache.get(key)
+            if words is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return words
+            self.misses += 1
+
+        words = tuple(self.tokenizer.cut(text, HMM=HMM))
+        with self._lock:
+            # 分词期间词典被修改时版本号已变化，旧版本的结果不再写入
+            if version == self.version:
+                self._cache[key] = words
+                if len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        return words
+
+    def lcut_many(self, texts, HMM=True, workers=None, min_parallel=PARALLEL_MIN_TEXTS):
+        """批量分词，按输入顺序返回 [[词, ...], ...]
+
+        先查缓存并去重；未命中的文本不少于 min_parallel 条且可用多个 CPU 时，
+        分块交给进程池并行分词（workers 默认为可用 CPU 数），否则在当前进程串行分词。
+        """
+        texts = [str(text) for text in texts]
+        self.tokenizer.check_initialized()
+        version = self._current_version()
+        found = {}
+        missing = []
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                words = self._cache.get((text, HMM, version))
+                if words is None:
+                    missing.append(text)
+                else:
+                    self._cache.move_to_end((text, HMM, version))
+                    found[text] = words
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        workers = workers or available_cpus()
+        if len(missing) >= min_parallel and workers > 1 and not self._untracked_changes:
+            cut = self._cut_parallel(missing, HMM, workers, version)
+        else:
+            cut = [tuple(self.tokenizer.cut(text, HMM=HMM)) for text in missing]
+
+        with self._lock:
+            for text, words in zip(missing, cut):
+                found[text] = words
+                if version == self.version and len(text) <= MAX_CACHED_TEXT_LENGTH:
+                    self._cache[(text, HMM, version)] = words
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return [list(found[text]) for text in texts]
+
+    def _cut_parallel(self, texts, HMM, workers, version):
+        chunks = [texts[i:i + PARALLEL_CHUNK_SIZE] for i in range(0, len(texts), PARALLEL_CHUNK_SIZE)]
+        pool = self._get_pool(workers, version)
+        cut = []
+        for words_list in pool.map(_cut_chunk, chunks, [HMM] * len(chunks)):
+            cut.extend(words_list)
+        return cut
+
+    def _get_pool(self, workers, version):
+        """按 (词典版本, 进程数) 复用进程池；词典变化后重建，让工作进程加载新的词条"""
+        with self._lock:
+            if self._pool is not None and self._pool_key == (version, workers):
+                return self._pool
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(self.tokenizer.dictionary, list(self._dictionary_ops))
+            )
+            self._pool_key = (version, workers)
+            return self._pool
+
+    def shutdown(self):
+        """关闭并行分词的进程池"""
+        with self._lock:
+            pool, self._pool, self._pool_key = self._pool, None, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def add_word(self, word, freq=None, tag=None):
+        self.tokenizer.add_word(word, freq, tag)
+        self._invalidate(("add_word", word, freq, tag))
+
+    def del_word(self, word):
+        self.tokenizer.del_word(word)
+        self._invalidate(("del_word", word))
+
+    def suggest_freq(self, segment, tune=False):
+        freq = self.tokenizer.suggest_freq(segment, tune)
+        if tune:
+            self._invalidate(("suggest_freq", segment, True))
+        return freq
+
+    def load_userdict(self, f):
+        self.tokenizer.load_userdict(f)
+        if isinstance(f, str):
+            self._invalidate(("load_userdict", f))
+        else:
+            # 文件对象无法传给工作进程，之后的批量分词只在当前进程进行
+            self._invalidate()
+            self._untracked_changes = True
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._cache),
+                'maxsize': self.maxsize,
+                'version': self.version,
+            }
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(dictionary, dictionary_ops):
+    """工作进程初始化：加载与主进程相同的词典，并按顺序重放词条修改"""
+    global _worker_tokenizer
+    jieba = import_jieba()
+    jieba.setLogLevel(60)
+    # 总是新建分词器：fork 启动的进程会继承主进程已修改过的 jieba.dt，重放会重复添加词条
+    tokenizer = jieba.Tokenizer(dictionary)
+    tokenizer.initialize()
+    for op in dictionary_ops:
+        getattr(tokenizer, op[0])(*op[1:])
+    _worker_tokenizer = tokenizer
+
+
+def _cut_chunk(texts, HMM):
+    return [tuple(_worker_tokenizer.cut(text, HMM=HMM)) for text in texts]
+
+
+def format_tokenizer_stats(stats):
+    """把 CachedTokenizer.stats() 格式化为一行状态文本"""
+    return (f"分词缓存命中率 {stats['hit_rate']:.0%}（{stats['hits']:,}/{stats['hits'] + stats['misses']:,}）"
+            f"，缓存 {stats['size']:,}/{stats['maxsize']:,} 条")
+
+
+_shared_tokenizer = None
+_shared_lock = threading.Lock()
+_prewarm_thread = None
+
+
+def import_jieba(install_missing=False):
+    """导入 jieba；install_missing 时缺少 jieba 会先用 pip 安装"""
+    try:
+        import jieba
+    except ImportError:
+        if not install_missing:
+            raise
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "jieba"])
+        import jieba
+    return jieba
+
+
+def prewarm(install_missing=False):
+    """在后台线程中导入 jieba 并加载词典（每个进程只启动一次），返回该线程
+
+    jieba.initialize 自带锁，页面在加载完成前分词会等待同一次加载，不会重复加载。
+    """
+    global _prewarm_thread
+    with _shared_lock:
+        if _prewarm_thread is None:
+            def load():
+                import_jieba(install_missing).initialize()
+
+            _prewarm_thread = threading.Thread(target=load, name="jieba-prewarm", daemon=True)
+            _prewarm_thread.start()
+        return _prewarm_thread
+
+
+def get_tokenizer():
+    """进程内共享的 CachedTokenizer（包装 jieba 默认分词器，所有页面共用一个缓存）"""
+    global _shared_tokenizer
+    if _shared_tokenizer is None:
+        with _shared_lock:
+            if _shared_tokenizer is None:
+                _shared_tokenizer = CachedTokenizer()
+    return _shared_tokenizer
@@ -0,0 +1,207 @@
+# translation_checkpoint.py - 追加写入的翻译断点日志
+#
+# 每次运行对应一个断点目录：
+#   base.pkl    翻译开始时的 DataFrame（只写一次）
+#   cells.jsonl 每个新翻译的单元格追加一行 {"i": 行号, "c": 列名, "v": 译文}
+#   meta.json   文本列、角色列、语言配置等运行信息
+#   completion.npz 每个译文列的完成位图（np.packbits），随日志一起刷新
+# 自动保存只需把缓冲的几行写入日志末尾，耗时与表格大小无关；
+# 完整的 Excel 只在翻译结束或用户主动导出时生成。
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_FILE = "base.pkl"
+CELLS_FILE = "cells.jsonl"
+META_FILE = "meta.json"
+COMPLETION_FILE = "completion.npz"
+CHECKPOINT_PREFIX = "checkpoint_"
+FAILED_PREFIX = "[翻译失败"
+
+
+def is_completed_value(value):
+    """单元格是否已有有效译文（空值和失败标记视为未完成）"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return False
+    text = str(value)
+    return text.strip() != '' and not text.startswith(FAILED_PREFIX)
+
+
+def completion_mask(df, column):
+    """向量化计算某一译文列的完成掩码（bool 数组，长度等于行数）"""
+    if column not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    values = df[column]
+    text = values.astype(object).where(values.notna(), '').astype(str)
+    done = text.str.strip().ne('') & ~text.str.startswith(FAILED_PREFIX)
+    return done.to_numpy(dtype=bool)
+
+
+def translatable_mask(df, text_col):
+    """原文非空的行（与逐行判断 str(text).strip() == "" / "nan" 一致）"""
+    values = df[text_col]
+    text = values.astype(object).where(values.notna(), 'nan').astype(str)
+    return (text.str.strip().ne('') & text.ne('nan')).to_numpy(dtype=bool)
+
+
+def pending_rows(df, text_col, masks):
+    """返回 {列名: 待翻译行号数组}：原文非空且该列尚未完成的行"""
+    translatable = translatable_mask(df, text_col)
+    return {column: np.flatnonzero(translatable & ~mask) for column, mask in masks.items()}
+
+
+class TranslationCheckpoint:
+    """单次翻译运行的断点目录"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta = {}
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        self._file = None
+        self._buffer = []
+        self.completion = {}  # {译文列: bool 数组}
+
+    @classmethod
+    def create(cls, save_directory, df, **meta):
+        """为新的一次运行创建断点目录并写入初始 DataFrame"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        directory = os.path.join(save_directory, f"{CHECKPOINT_PREFIX}{timestamp}")
+        suffix = 1
+        while os.path.exists(directory):
+            directory = os.path.join(save_directory, f"{CHECKPOINT_PREFIX}{timestamp}_{suffix}")
+            suffix += 1
+        os.makedirs(directory)
+
+        df.to_pickle(os.path.join(directory, BASE_FILE))
+        checkpoint = cls(directory)
+        checkpoint.meta = dict(meta, created_at=datetime.now().isoformat(timespec='seconds'),
+                               rows=len(df), completed=False)
+        checkpoint.write_meta()
+        return checkpoint
+
+    @property
+    def name(self):
+        return os.path.basename(self.directory)
+
+    def write_meta(self, **updates):
+        self.meta.update(updates)
+        temp_path = os.path.join(self.directory, META_FILE + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, os.path.join(self.directory, META_FILE))
+
+    def completion_masks(self, df, columns):
+        """获取各译文列的完成掩码：优先读取断点中保存的位图，缺失或行数不符时按 df 重新计算"""
+        stored = {}
+        completion_path = os.path.join(self.directory, COMPLETION_FILE)
+        if os.path.exists(completion_path):
+            with np.load(completion_path) as data:
+                stored = {key: data[key] for key in data.files}
+
+        rows = len(df)
+        self.completion = {}
+        for column in columns:
+            packed = stored.get(column)
+            if packed is not None and packed.size == (rows + 7) // 8:
+                self.completion[column] = np.unpackbits(packed, count=rows).astype(bool)
+            else:
+                self.completion[column] = completion_mask(df, column)
+        self._save_completion()
+        return self.completion
+
+    def _save_completion(self):
+        if not self.completion:
+            return
+        temp_path = os.path.join(self.directory, COMPLETION_FILE + ".tmp")
+        with open(temp_path, "wb") as f:
+            np.savez(f, **{column: np.packbits(mask) for column, mask in self.completion.items()})
+        os.replace(temp_path, os.path.join(self.directory, COMPLETION_FILE))
+
+    def record(self, index, column, value):
+        """记录一个单元格的新值（先进入内存缓冲，flush 时写入日志）"""
+        self._buffer.append(json.dumps({"i": int(index), "c": column, "v": value}, ensure_ascii=False))
+        mask = self.completion.get(column)
+        if mask is not None:
+            mask[index] = is_completed_value(value)
+
+    def flush(self):
+        """把缓冲的记录追加到日志末尾，返回本次写入条数"""
+        if not self._buffer:
+            return 0
+        if self._file is None:
+            self._file = open(os.path.join(self.directory, CELLS_FILE), "a", encoding="utf-8")
+        count = len(self._buffer)
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer = []
+        # 位图在日志之后写入：中途崩溃时位图只会落后于日志，不会把未写入的单元格标记为完成
+        self._save_completion()
+        return count
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read_cells(self):
+        """读取日志为 DataFrame(i, c, v)，同一单元格只保留最后一次写入
+
+        程序中断时最后一行可能不完整，解析失败的行直接丢弃。
+        """
+        records = []
+        cells_path = os.path.join(self.directory, CELLS_FILE)
+        if os.path.exists(cells_path):
+            with open(cells_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        cells = pd.DataFrame(records, columns=["i", "c", "v"])
+        return cells.drop_duplicates(subset=["i", "c"], keep="last")
+
+    def load_dataframe(self):
+        """基础 DataFrame + 日志重放，得到当前进度"""
+        df = pd.read_pickle(os.path.join(self.directory, BASE_FILE))
+        cells = self.read_cells()
+        for column, group in cells.groupby("c", sort=False):
+            if column not in df.columns:
+                df[column] = ''
+            elif df[column].dtype != object:
+                df[column] = df[column].astype(object)
+            df.loc[group["i"].to_numpy(), column] = group["v"].to_numpy()
+        return df
+
+    def materialize(self, path, df=None, sheet_name='翻译结果'):
+        """生成完整的 Excel 文件；df 为空时从断点重建"""
+        if df is None:
+            df = self.load_dataframe()
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name=sheet_name)
+        return path
+
+
+def list_checkpoints(save_directory):
+    """列出保存目录下的断点，按修改时间倒序"""
+    if not os.path.isdir(save_directory):
+        return []
+    checkpoints = []
+    for name in os.listdir(save_directory):
+        directory = os.path.join(save_directory, name)
+        if name.startswith(CHECKPOINT_PREFIX) and os.path.exists(os.path.join(directory, META_FILE)):
+            checkpoints.append(directory)
+    return sorted(checkpoints, key=checkpoint_mtime, reverse=True)
+
+
+def checkpoint_mtime(directory):
+    cells_path = os.path.join(directory, CELLS_FILE)
+    return os.path.getmtime(cells_path if os.path.exists(cells_path) else os.path.join(directory, META_FILE))
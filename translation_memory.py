@@ -0,0 +1,161 @@
+# translation_memory.py - 持久化翻译记忆（SQLite）
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = "./translation_saves/translation_memory.db"
+DEFAULT_MAX_ENTRIES = 200000
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+class TranslationMemory:
+    """按提示词输入缓存译文的翻译记忆库
+
+    键由原文、目标语言、说话人、模型、匹配到的术语和自定义要求共同决定，
+    任意一项变化都会视为新的翻译请求。超过 max_entries 时按最近使用时间淘汰（LRU）。
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS memory (
+                key TEXT PRIMARY KEY,
+                source TEXT,
+                language TEXT,
+                model TEXT,
+                role TEXT,
+                translation TEXT,
+                created_at REAL,
+                last_used REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_last_used ON memory(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_model ON memory(model)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_language ON memory(language)")
+        self._conn.commit()
+
+        self._count = self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    @staticmethod
+    def make_key(text, language, role, model, matched_terms, custom_requirements):
+        """根据所有影响译文的提示词输入生成缓存键"""
+        payload = json.dumps(
+            [str(text), language, "" if role is None else str(role), model,
+             matched_terms or "", custom_requirements or ""],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """命中时返回译文并刷新最近使用时间，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT translation FROM memory WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE memory SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, text, language, model, role, translation):
+        with self._lock:
+            now = time.time()
+            exists = self._conn.execute("SELECT 1 FROM memory WHERE key = ?", (key,)).fetchone()
+            if exists:
+                self._conn.execute(
+                    "UPDATE memory SET translation = ?, last_used = ? WHERE key = ?",
+                    (translation, now, key)
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO memory (key, source, language, model, role, translation, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, str(text), language, model, "" if role is None else str(role), translation, now, now)
+                )
+                self._count += 1
+                self._evict_if_needed()
+            self._conn.commit()
+
+    def _evict_if_needed(self):
+        if not self.max_entries or self._count <= self.max_entries:
+            return
+
+        # 一次多淘汰 5%，避免每次写入都触发删除
+        target = int(self.max_entries * 0.95)
+        excess = self._count - target
+        self._conn.execute(
+            "DELETE FROM memory WHERE key IN (SELECT key FROM memory ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def invalidate(self, model=None, language=None):
+        """按模型和/或语言清除记忆；两者都为空时清空全部，返回删除条数"""
+        conditions = []
+        params = []
+        if model:
+            conditions.append("model = ?")
+            params.append(model)
+        if language:
+            conditions.append("language = ?")
+            params.append(language)
+
+        sql = "DELETE FROM memory"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        with self._lock:
+            deleted = self._conn.execute(sql, params).rowcount
+            self._conn.commit()
+            self._count = self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+            return deleted
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self._count,
+            'max_entries': self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_translation_memory(db_path=DEFAULT_DB_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+    """获取（进程内共享的）翻译记忆实例"""
+    key = os.path.abspath(db_path)
+    with _instances_lock:
+        memory = _instances.get(key)
+        if memory is None:
+            memory = TranslationMemory(db_path, max_entries)
+            _instances[key] = memory
+        else:
+            memory.max_entries = max_entries
+        return memory
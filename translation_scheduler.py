@@ -0,0 +1,209 @@
+# translation_scheduler.py - 多语言 / 多行窗口并发翻译调度器
+
+import asyncio
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+
+# index: DataFrame 行号；language: 目标语言；text / role: 原文与说话人
+TranslationTask = namedtuple('TranslationTask', ['index', 'language', 'text', 'role'])
+TranslationResult = namedtuple('TranslationResult', ['task', 'translation', 'error'])
+
+_LANE_DONE = object()
+_LOOP_DONE = object()
+
+
+def build_lanes(tasks, window_size=0):
+    """将任务按语言分组，再按行窗口切分成若干条通道
+
+    同一条通道内的任务严格按行号顺序串行执行，保证该通道的上下文有序；
+    不同通道之间并发执行。window_size 为 0 表示每种语言只有一条通道。
+    返回 [(context_key, [TranslationTask, ...]), ...]
+    """
+    by_language = {}
+    for task in tasks:
+        by_language.setdefault(task.language, []).append(task)
+
+    lanes = []
+    for language, language_tasks in by_language.items():
+        language_tasks.sort(key=lambda t: t.index)
+        if not window_size or len(language_tasks) <= window_size:
+            lanes.append((language, language_tasks))
+            continue
+
+        for window_id, start in enumerate(range(0, len(language_tasks), window_size)):
+            lanes.append((f"{language}#{window_id}", language_tasks[start:start + window_size]))
+
+    return lanes
+
+
+class TranslationScheduler:
+    """并发执行翻译任务
+
+    每种语言（以及每个行窗口）使用独立的上下文通道，通道内部串行、通道之间并发，
+    请求速率由翻译器上挂载的 RateLimiter 统一控制。结果通过 run() 生成器
+    交回调用线程，由调用方在主线程中写回 DataFrame 和刷新界面。
+    batch_size > 1 时，通道内相邻的行按 batch_size / batch_token_budget 打包成一个请求。
+    engine="async" 时所有通道作为协程运行在同一个后台事件循环中，max_workers 表示
+    同时进行中的请求上限，不再对应线程数（batch_size > 1 时仍使用线程池）。
+    """
+
+    def __init__(self, translator, custom_requirements="", max_workers=4, window_size=0,
+                 batch_size=1, batch_token_budget=3000, engine="thread"):
+        self.translator = translator
+        self.custom_requirements = custom_requirements
+        self.max_workers = max(1, int(max_workers))
+        self.window_size = max(0, int(window_size))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_token_budget = max(1, int(batch_token_budget))
+        self.engine = engine
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """请求停止：各通道在当前任务完成后退出"""
+        self._stop_event.set()
+
+    def _run_lane(self, context_key, lane_tasks, results):
+        if self.batch_size > 1:
+            self._run_batched_lane(context_key, lane_tasks, results)
+            return
+
+        try:
+            for task in lane_tasks:
+                if self._stop_event.is_set():
+                    break
+                try:
+                    translation = self.translator.translate_text(
+                        task.text, task.language, self.custom_requirements, task.role,
+                        context_key=context_key
+                    )
+                    results.put(TranslationResult(task, translation, None))
+                except Exception as e:
+                    results.put(TranslationResult(task, None, str(e)))
+        finally:
+            results.put(_LANE_DONE)
+
+    def _run_batched_lane(self, context_key, lane_tasks, results):
+        try:
+            language = lane_tasks[0].language
+            items = [(position, task.text, task.role) for position, task in enumerate(lane_tasks)]
+            for batch in self.translator.plan_batches(items, self.batch_size, self.batch_token_budget):
+                if self._stop_event.is_set():
+                    break
+                batch_tasks = [lane_tasks[position] for position, _, _ in batch]
+                try:
+                    translations = self.translator.translate_batch(
+                        batch, language, self.custom_requirements, context_key=context_key
+                    )
+                    for (position, _, _), task in zip(batch, batch_tasks):
+                        results.put(TranslationResult(task, translations[position], None))
+                except Exception as e:
+                    for task in batch_tasks:
+                        results.put(TranslationResult(task, None, str(e)))
+        finally:
+            results.put(_LANE_DONE)
+
+    async def _run_lane_async(self, client, context_key, lane_tasks, results):
+        try:
+            for task in lane_tasks:
+                if self._stop_event.is_set():
+                    break
+                try:
+                    translation = await self.translator.translate_text_async(
+                        client, task.text, task.language, self.custom_requirements, task.role,
+                        context_key=context_key
+                    )
+                    results.put(TranslationResult(task, translation, None))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    results.put(TranslationResult(task, None, str(e)))
+        finally:
+            results.put(_LANE_DONE)
+
+    async def _run_async(self, lanes, results):
+        async with self.translator.create_async_client(self.max_workers) as client:
+            lane_futures = [
+                asyncio.ensure_future(self._run_lane_async(client, context_key, lane_tasks, results))
+                for context_key, lane_tasks in lanes
+            ]
+            # 轮询停止标志，收到停止请求时直接取消进行中的请求
+            while not all(future.done() for future in lane_futures):
+                if self._stop_event.is_set():
+                    for future in lane_futures:
+                        future.cancel()
+                    break
+                await asyncio.sleep(0.1)
+            await asyncio.gather(*lane_futures, return_exceptions=True)
+
+    def run(self, tasks):
+        """执行全部任务，按完成顺序逐个产出 TranslationResult"""
+        lanes = build_lanes(tasks, self.window_size)
+        if not lanes:
+            return
+
+        # 为每个通道准备独立的上下文，避免不同窗口互相污染
+        for context_key, _ in lanes:
+            self.translator.get_context_window(context_key)
+
+        results = queue.Queue()
+        script_ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+        def attach_script_ctx():
+            # 让工作线程中的 st.warning 等调用能正常显示在当前页面
+            if script_ctx is not None:
+                add_script_run_ctx(threading.current_thread(), script_ctx)
+
+        self._stop_event.clear()
+        if self.engine == "async" and self.batch_size == 1:
+            yield from self._drain_async(lanes, results, attach_script_ctx)
+            return
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(lanes)),
+            initializer=attach_script_ctx
+        )
+        try:
+            for context_key, lane_tasks in lanes:
+                executor.submit(self._run_lane, context_key, lane_tasks, results)
+
+            pending_lanes = len(lanes)
+            while pending_lanes:
+                item = results.get()
+                if item is _LANE_DONE:
+                    pending_lanes -= 1
+                    continue
+                yield item
+        finally:
+            self._stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _drain_async(self, lanes, results, attach_script_ctx):
+        def loop_thread():
+            attach_script_ctx()
+            try:
+                asyncio.run(self._run_async(lanes, results))
+            finally:
+                # 被取消的通道可能来不及放入 _LANE_DONE，以事件循环结束为准
+                results.put(_LOOP_DONE)
+
+        thread = threading.Thread(target=loop_thread, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _LOOP_DONE:
+                    break
+                if item is _LANE_DONE:
+                    continue
+                yield item
+        finally:
+            self._stop_event.set()
@@ -1,12 +1,55 @@
 # translator.py - 核心翻译器类
 
 import re
+import json
+import asyncio
 import time
-import difflib
 import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
-import jieba
+
+from term_index import TermAutomaton
+from context_window import ContextWindow
+from token_budget import UsageStats, completion_budget, get_token_counter
+from role_index import RoleNameIndex
+from tokenizer_cache import get_tokenizer
+from glossary_snapshot import GlossarySnapshot, register_jieba_words
+from http_client import get_http_session
+from async_client import AsyncChatClient
+from chat_stream import DEFAULT_STREAM_IDLE_TIMEOUT, STREAM_CONNECT_TIMEOUT, read_chat_stream
+
+# 单行提示词中动态部分的固定标题，计入 Token 预算
+_PROMPT_SECTION_TITLES = "## 角色信息：\n## 待翻译文本：\n"
+
+
+def _clean_text(series):
+    """整列转为去除首尾空白的字符串，空值变为空字符串（与逐行 str(x).strip() 一致）"""
+    na = series.isna().to_numpy()
+    text = series.astype(str).str.strip().to_numpy(dtype=object)
+    text[na] = ""
+    return text
+
+
+def _clean_pairs(source, target, dedupe=True, cleaned_source=None):
+    """向量化清洗 (原文, 译文) 两列
+
+    返回 (原文数组, 译文数组, 缺失条数)：丢弃任一侧为空值或空白的行，
+    dedupe 时去掉完全相同的 (原文, 译文) 组合，保留首次出现的顺序。
+    已清洗过的原文列可通过 cleaned_source=(文本数组, 空值掩码) 传入，避免多语言重复清洗。
+    """
+    if cleaned_source is None:
+        cleaned_source = (_clean_text(source), source.isna().to_numpy())
+    source_text, source_na = cleaned_source
+    target_na = target.isna().to_numpy()
+    target_text = _clean_text(target)
+
+    missing_count = int((source_na | target_na).sum())
+    keep = (source_text != "") & (target_text != "")
+    pairs = pd.DataFrame({'source': source_text[keep], 'target': target_text[keep]})
+    if dedupe:
+        pairs = pairs.drop_duplicates()
+    return pairs['source'].to_numpy(dtype=object), pairs['target'].to_numpy(dtype=object), missing_count
 
 
 class MultiAPIExcelTranslator:
@@ -19,15 +62,19 @@ class MultiAPIExcelTranslator:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
-        self.context_history = {}  # 按语言分别存储上下文
+        self.context_history = {}  # {上下文通道: ContextWindow}，按语言分别存储上下文
         self.term_dict = {}
         self.role_column = None
         self.context_size = context_size
+        self.context_token_budget = 0  # 每个上下文通道的 Token 预算，0 表示只按条数限制
         self.max_retries = max_retries
 
         # 改为按语言存储术语库
         self.term_base_dict = {}  # {语言: [{source: xxx, target: xxx}]}
         self.term_base_list = []  # 单语言术语库列表
+        self.term_index_dict = {}  # {语言: TermAutomaton}，加载术语库时编译
+        self.term_index = None  # 单语言术语库的 TermAutomaton
+        self.jieba_user_words = []  # [(词, 词频)]，加载术语库时注册到分词器的词条
 
         self.role_personality_dict = {}
         self.current_text_terms = {}
@@ -40,12 +87,43 @@ class MultiAPIExcelTranslator:
         self.role_mapping = {}
         self.enable_fuzzy_match = False
         self.fuzzy_threshold = 0.6
+        self.role_index = None  # RoleNameIndex，按需从 role_personality_dict 构建
+        self.role_index_source = None
+
+        # 可选：共享的 RateLimiter，所有请求发出前先申请预算
+        self.rate_limiter = None
+        # 可选：持久化翻译记忆（TranslationMemory），命中时不再调用 API
+        self.translation_memory = None
+        # 提示词缓存：静态前缀 / 结尾说明 / 系统提示词 / 角色信息块
+        self._prompt_prefix_cache = {}
+        self._prompt_suffix_cache = {}
+        self._system_prompt_cache = {}
+        self._role_prompt_cache = {}
+        self._role_prompt_state = None
+        self._static_token_cache = {}
+        # Token 预算：单次请求提示词上限（0 表示不限，超出时裁剪术语和上下文）与回复上限
+        self.prompt_token_budget = 0
+        self.max_completion_tokens = 4000
+        # 逐行翻译时按原文长度估算更小的回复上限（推理模型会先消耗回复预算，默认关闭）
+        self.adaptive_completion_budget = False
+        self.token_counter = None  # 未设置时使用 token_budget.get_token_counter()
+        # 每次请求的提示词 / 回复 Token 用量
+        self.usage_stats = UsageStats()
+        # 流式接收回复：超时按两块数据之间的空闲时间计算，长回复不会因总耗时超过 60 秒被整体重试
+        self.stream_responses = False
+        self.stream_idle_timeout = DEFAULT_STREAM_IDLE_TIMEOUT
+        self.stream_progress = None  # 可选的 chat_stream.StreamProgress，用于界面显示接收进度
+        # 调试：在控制台打印每次请求的完整提示词
+        self.debug_prompts = False
+        # 连接池复用的 HTTP 会话（keep-alive），并发较高时可通过 configure_http_pool 调整
+        self.session = get_http_session()
 
         self.init_chinese_tokenizer()
 
     def init_chinese_tokenizer(self):
         try:
-            self.chinese_tokenizer = jieba
+            # 共享的带缓存分词器：同一文本跨语言、重试和页面只分词一次，添加术语词条时缓存自动失效
+            self.chinese_tokenizer = get_tokenizer()
             st.success("✅ 中文分词器初始化成功")
         except Exception as e:
             st.warning(f"⚠️ 中文分词器初始化失败: {e}")
@@ -96,29 +174,21 @@ class MultiAPIExcelTranslator:
         if role_name in self.role_mapping:
             return self.role_mapping[role_name], 1.0
 
-        best_match = None
-        best_score = 0
-
-        for official_role in self.role_personality_dict.keys():
-            cleaned_official = self.clean_role_name(official_role)
-
-            if cleaned_role == cleaned_official:
-                return official_role, 1.0
-
-            score = difflib.SequenceMatcher(None, cleaned_role, cleaned_official).ratio()
-
-            if cleaned_role in cleaned_official or cleaned_official in cleaned_role:
-                score = max(score, 0.8)
+        best_match, best_score = self.get_role_index().best_match(cleaned_role)
 
-            if score > best_score:
-                best_score = score
-                best_match = official_role
-
-        if best_score >= threshold:
+        if best_match is not None and best_score >= threshold:
             return best_match, best_score
 
         return None, best_score
 
+    def get_role_index(self):
+        """获取角色名模糊匹配索引（角色性格库变化后按需重建）"""
+        if self.role_index is None or self.role_index_source is not self.role_personality_dict \
+                or len(self.role_index) != len(self.role_personality_dict):
+            self.role_index = RoleNameIndex(self.role_personality_dict.keys(), self.clean_role_name)
+            self.role_index_source = self.role_personality_dict
+        return self.role_index
+
     def analyze_role_matches(self, df, role_col):
         """分析数据中的所有角色名称"""
         if not role_col or role_col not in df.columns:
@@ -146,17 +216,11 @@ class MultiAPIExcelTranslator:
                 fuzzy_matches[role_str].append((matched_role, score))
 
                 if score < 1.0:
-                    for official_role in self.role_personality_dict.keys():
-                        if official_role == matched_role:
-                            continue
-                        alt_score = difflib.SequenceMatcher(
-                            None,
-                            self.clean_role_name(role_str),
-                            self.clean_role_name(official_role)
-                        ).ratio()
-
-                        if alt_score >= self.fuzzy_threshold * 0.8:
-                            fuzzy_matches[role_str].append((official_role, alt_score))
+                    fuzzy_matches[role_str].extend(self.get_role_index().similar(
+                        self.clean_role_name(role_str),
+                        self.fuzzy_threshold * 0.8,
+                        exclude=matched_role
+                    ))
 
                 fuzzy_matches[role_str].sort(key=lambda x: x[1], reverse=True)
 
@@ -185,92 +249,77 @@ class MultiAPIExcelTranslator:
 
         return None
 
-    def add_to_context(self, original, translation, role=None, language="英文"):
-        """为指定语言添加上下文（确保语言独立）"""
-        if language not in self.context_history:
-            self.context_history[language] = []
+    def get_context_window(self, context_key):
+        """获取（不存在时创建）指定上下文通道的环形缓冲区"""
+        window = self.context_history.get(context_key)
+        if window is None:
+            window = ContextWindow(self.context_size, self.context_token_budget)
+            self.context_history[context_key] = window
+        return window
 
-        self.context_history[language].append((original, translation, role))
-        if len(self.context_history[language]) > self.context_size:
-            self.context_history[language].pop(0)
+    def add_to_context(self, original, translation, role=None, language="英文", context_key=None):
+        """为指定语言添加上下文（确保语言独立）
+
+        context_key: 上下文通道，默认与语言相同；并发调度时同一语言可拆成多个通道
+        """
+        self.get_context_window(context_key or language).append(original, translation, role, language)
 
-    def build_context_prompt(self, language="英文"):
-        """为指定语言构建上下文提示（确保语言独立）"""
-        if language not in self.context_history or not self.context_history[language]:
+    def build_context_prompt(self, language="英文", context_key=None, max_tokens=None):
+        """为指定语言构建上下文提示（确保语言独立）；max_tokens 限制时只保留最近的若干条"""
+        window = self.context_history.get(context_key or language)
+        if not window:
             return ""
+        return window.render(language, max_tokens)
 
-        context_str = f"\n\n### 重要上下文参考（{language}翻译）：\n"
-        for i, (orig, trans, role) in enumerate(self.context_history[language], 1):
-            role_info = f" [{role}]" if role else ""
-            context_str += f"前文{i}{role_info}:\n原文: {orig}\n{language}译文: {trans}\n\n"
-        return context_str
+    def get_term_index(self, language):
+        """获取指定语言的术语自动机（未编译时按需编译）"""
+        terms = self.term_base_dict.get(language)
+        if not terms:
+            return None
+
+        term_index = self.term_index_dict.get(language)
+        if term_index is None:
+            term_index = TermAutomaton(terms)
+            self.term_index_dict[language] = term_index
+        return term_index
 
     def find_matched_terms(self, text, language):
         """为指定语言查找匹配的术语"""
-        if language not in self.term_base_dict or not self.term_base_dict[language]:
+        term_index = self.get_term_index(language)
+        if term_index is None or not text or pd.isna(text):
             return {}
 
-        words = self.tokenize_chinese_text(text)
-        matched_terms = {}
-
-        # 词级别匹配
-        for word in words:
-            for term_entry in self.term_base_dict[language]:
-                if term_entry['source'] == word:
-                    if word not in matched_terms:
-                        matched_terms[word] = []
-                    if term_entry['target'] not in matched_terms[word]:
-                        matched_terms[word].append(term_entry['target'])
-
-        # 短语级别匹配
-        for term_entry in self.term_base_dict[language]:
-            term = term_entry['source']
-            if term in text:
-                if term not in matched_terms:
-                    matched_terms[term] = []
-                if term_entry['target'] not in matched_terms[term]:
-                    matched_terms[term].append(term_entry['target'])
-
-        return matched_terms
-
-    def build_term_base_prompt(self, text, language="英文"):
-        """为指定语言构建术语库提示"""
+        return term_index.match(str(text))
+
+    def build_term_base_prompt(self, text, language="英文", max_tokens=None):
+        """为指定语言构建术语库提示；max_tokens 限制术语段的 Token 数（按术语库顺序保留）"""
         # 尝试使用多语言术语库
         matched_terms = self.find_matched_terms(text, language)
 
         # 如果没有多语言术语库，使用单语言术语库
         if not matched_terms and self.term_base_list:
-            words = self.tokenize_chinese_text(text)
-            matched_terms = {}
-
-            for word in words:
-                for term_entry in self.term_base_list:
-                    if term_entry['source'] == word:
-                        if word not in matched_terms:
-                            matched_terms[word] = []
-                        if term_entry['target'] not in matched_terms[word]:
-                            matched_terms[word].append(term_entry['target'])
-
-            for term_entry in self.term_base_list:
-                term = term_entry['source']
-                if term in text:
-                    if term not in matched_terms:
-                        matched_terms[term] = []
-                    if term_entry['target'] not in matched_terms[term]:
-                        matched_terms[term].append(term_entry['target'])
+            if self.term_index is None:
+                self.term_index = TermAutomaton(self.term_base_list)
+            matched_terms = self.term_index.match(str(text))
 
         if not matched_terms:
             return ""
 
-        term_base_str = f"\n\n### 术语库匹配：\n"
-
+        header = f"\n\n### 术语库匹配：\n"
+        lines = []
         for orig, trans_list in matched_terms.items():
             if len(trans_list) == 1:
-                term_base_str += f"- 「{orig}」 → {language}译名：「{trans_list[0]}」\n"
+                lines.append(f"- 「{orig}」 → {language}译名：「{trans_list[0]}」\n")
             else:
-                term_base_str += f"- 「{orig}」 → {language}译名候选：{' / '.join([f'「{t}」' for t in trans_list])} （根据上下文选择最合适的）\n"
+                lines.append(f"- 「{orig}」 → {language}译名候选：{' / '.join([f'「{t}」' for t in trans_list])} （根据上下文选择最合适的）\n")
 
-        return term_base_str
+        if max_tokens is not None:
+            counter = self.get_token_counter()
+            lines, _ = counter.trim_lines(lines, max(max_tokens - counter.count(header), 0))
+            if not lines:
+                return ""
+
+        return header + "".join(lines)
 
     def build_role_personality_prompt(self, role_name):
         if not role_name:
@@ -296,8 +345,11 @@ class MultiAPIExcelTranslator:
         self.language_column_names = column_names
         # 为每种语言初始化独立的上下文历史
         for lang in languages:
-            if lang not in self.context_history:
-                self.context_history[lang] = []
+            self.get_context_window(lang)
+
+    def configure_http_pool(self, pool_maxsize, keep_alive=True):
+        """按并发数调整连接池大小（每个主机的最大连接数）"""
+        self.session = get_http_session(pool_maxsize=max(int(pool_maxsize), 1), keep_alive=keep_alive)
 
     def set_target_language(self, language):
         self.target_language = language
@@ -349,17 +401,46 @@ class MultiAPIExcelTranslator:
             return True
         return False
 
-    def translate_text_with_retry(self, text, target_language, custom_requirements="", role=None):
+    def retry_delay(self, attempt):
+        """重试等待：挂载共享限速器时由其决定（限流暂停由熔断器统一控制），否则指数退避"""
+        if self.rate_limiter is not None:
+            return self.rate_limiter.retry_delay(attempt)
+        return min(2 ** attempt, 60)
+
+    def _lookup_translation_memory(self, text, target_language, custom_requirements, role, context_key):
+        """查询翻译记忆，返回 (memory_key, 命中的译文或 None)；未启用时 memory_key 为 None"""
+        if self.translation_memory is None:
+            return None, None
+
+        # 键包含原文、语言、说话人、模型、匹配术语和自定义要求
+        memory_key = self.translation_memory.make_key(
+            text, target_language, role, self.model,
+            self.build_term_base_prompt(text, target_language), custom_requirements
+        )
+        cached_translation = self.translation_memory.get(memory_key)
+        if cached_translation is not None:
+            self.add_to_context(text, cached_translation, role, target_language, context_key)
+        return memory_key, cached_translation
+
+    def translate_text_with_retry(self, text, target_language, custom_requirements="", role=None, context_key=None):
         if not text or pd.isna(text) or str(text).strip() == "":
             return text
 
+        memory_key, cached_translation = self._lookup_translation_memory(
+            text, target_language, custom_requirements, role, context_key
+        )
+        if cached_translation is not None:
+            return cached_translation
+
         last_exception = None
 
         for attempt in range(self.max_retries):
             try:
-                translated_text = self._translate_single_attempt(text, target_language, custom_requirements, role)
+                translated_text = self._translate_single_attempt(text, target_language, custom_requirements, role, context_key)
 
                 if not self.is_translation_error(translated_text, text):
+                    if memory_key is not None:
+                        self.translation_memory.put(memory_key, text, target_language, self.model, role, translated_text)
                     return translated_text
                 else:
                     st.warning(f"⚠️ [{target_language}] 第 {attempt + 1} 次翻译结果异常，准备重试...")
@@ -381,8 +462,7 @@ class MultiAPIExcelTranslator:
                 st.warning(f"⚠️ [{target_language}] API错误 (第 {attempt + 1} 次尝试): {e}")
 
             if attempt < self.max_retries - 1:
-                wait_time = min(2 ** attempt, 60)
-                time.sleep(wait_time)
+                time.sleep(self.retry_delay(attempt))
 
         st.error(f"❌ [{target_language}] 翻译失败，已达到最大重试次数 {self.max_retries}")
         if last_exception:
@@ -390,22 +470,76 @@ class MultiAPIExcelTranslator:
 
         return text
 
-    def _translate_single_attempt(self, text, target_language, custom_requirements="", role=None):
-        # 为当前语言构建独立的上下文和术语提示
-        context_prompt = self.build_context_prompt(target_language)
-        term_base_prompt = self.build_term_base_prompt(text, target_language)
-        role_personality_prompt = self.build_role_personality_prompt(role) if role else ""
-        language_requirements = self.get_language_specific_requirements(target_language)
+    def completion_tokens_for(self, text):
+        """单行请求的 max_tokens：开启估算时按原文长度计算，否则使用 max_completion_tokens"""
+        if self.adaptive_completion_budget:
+            return completion_budget(text, self.max_completion_tokens)
+        return self.max_completion_tokens
 
-        role_prompt = ""
-        if role and not pd.isna(role) and str(role).strip() != "":
-            role_prompt = f"\n当前文本的说话人: {role}\n"
+    def _translate_single_attempt(self, text, target_language, custom_requirements="", role=None, context_key=None):
+        prompt = self.build_translation_prompt(text, target_language, custom_requirements, role, context_key)
+        translated_text = self._post_chat_completion(
+            self.get_system_prompt(target_language), prompt,
+            self.completion_tokens_for(text)
+        )
 
-        prompt = f"""
-请将以下文本翻译成{target_language}。
+        translated_text = self.clean_translation(translated_text)
+        # 将翻译结果添加到该语言的独立上下文中
+        self.add_to_context(text, translated_text, role, target_language, context_key)
 
-## 角色信息：
-{role_prompt}{role_personality_prompt}
+        return translated_text
+
+    def build_translation_prompt(self, text, target_language, custom_requirements="", role=None, context_key=None):
+        # 静态前缀（任务说明、语言规范、自定义要求）在前，同一语言和要求下逐字节相同，
+        # 便于服务端前缀缓存；每行只拼接角色、上下文、术语和原文等动态部分
+        prefix = self.get_static_prompt_prefix(target_language, custom_requirements)
+        suffix = self.get_static_prompt_suffix(target_language)
+        role_block = self.get_role_prompt_block(role) if role else ""
+
+        if self.prompt_token_budget:
+            # 固定部分之外的预算先给术语（影响译名一致性），剩余的给上下文
+            counter = self.get_token_counter()
+            remaining = self.prompt_token_budget - (
+                self._static_prompt_tokens(target_language, custom_requirements)
+                + counter.count(role_block) + counter.count(text) + counter.count(_PROMPT_SECTION_TITLES)
+            )
+            term_base_prompt = self.build_term_base_prompt(text, target_language, max(remaining, 0))
+            remaining -= counter.count(term_base_prompt)
+            context_prompt = self.build_context_prompt(target_language, context_key, max(remaining, 0))
+        else:
+            term_base_prompt = self.build_term_base_prompt(text, target_language)
+            context_prompt = self.build_context_prompt(target_language, context_key)
+
+        return (
+            prefix
+            + f"## 角色信息：\n{role_block}\n\n{context_prompt}\n\n{term_base_prompt}\n\n## 待翻译文本：\n{text}\n"
+            + suffix
+        )
+
+    def get_token_counter(self):
+        """当前使用的 Token 计数器（未单独设置时使用进程内共享的计数器）"""
+        return self.token_counter or get_token_counter()
+
+    def _static_prompt_tokens(self, target_language, custom_requirements=""):
+        """静态前缀 + 结尾说明 + 系统提示词的 Token 数，按 (语言, 自定义要求) 缓存"""
+        key = (target_language, custom_requirements, id(self.get_token_counter()))
+        tokens = self._static_token_cache.get(key)
+        if tokens is None:
+            counter = self.get_token_counter()
+            tokens = (counter.count(self.get_static_prompt_prefix(target_language, custom_requirements))
+                      + counter.count(self.get_static_prompt_suffix(target_language))
+                      + counter.count(self.get_system_prompt(target_language)))
+            self._static_token_cache[key] = tokens
+        return tokens
+
+    def get_static_prompt_prefix(self, target_language, custom_requirements=""):
+        """提示词的静态前缀，按 (语言, 自定义要求) 缓存"""
+        key = (target_language, custom_requirements)
+        prefix = self._prompt_prefix_cache.get(key)
+        if prefix is None:
+            language_requirements = self.get_language_specific_requirements(target_language)
+            prefix = f"""
+请将以下文本翻译成{target_language}。
 
 ## {target_language}翻译规范（优先级最低）：
 {language_requirements}
@@ -413,13 +547,15 @@ class MultiAPIExcelTranslator:
 ## 用户自定义要求（优先级第一高）：
 {custom_requirements}
 
-{context_prompt}
-
-{term_base_prompt}
-
-## 待翻译文本：
-{text}
-
+"""
+            self._prompt_prefix_cache[key] = prefix
+        return prefix
+
+    def get_static_prompt_suffix(self, target_language):
+        """提示词末尾的固定说明，按语言缓存"""
+        suffix = self._prompt_suffix_cache.get(target_language)
+        if suffix is None:
+            suffix = f"""
 ## 重要说明（优先级第二高）：
 1. 请只返回{target_language}翻译结果，不要添加任何解释或备注
 2. 术语库中的特定词汇翻译，如果是人名或者固定特殊名称需要严格采用相同的翻译,但注意如果是一些普通的词汇则看句子翻译不必一定按照术语库来
@@ -429,13 +565,48 @@ class MultiAPIExcelTranslator:
 
 {target_language}翻译结果：
 """
+            self._prompt_suffix_cache[target_language] = suffix
+        return suffix
+
+    def get_role_prompt_block(self, role):
+        """说话人 + 角色性格描述块，按说话人缓存
 
+        角色性格库被替换或模糊匹配设置变化时整体失效；角色映射按说话人计入缓存键。
+        """
+        state = (id(self.role_personality_dict), len(self.role_personality_dict),
+                 self.enable_fuzzy_match, self.fuzzy_threshold)
+        if state != self._role_prompt_state:
+            self._role_prompt_cache = {}
+            self._role_prompt_state = state
+
+        role_str = str(role).strip()
+        key = (role, self.role_mapping.get(role_str))
+        cached = self._role_prompt_cache.get(key)
+        if cached is None:
+            role_prompt = ""
+            if not pd.isna(role) and role_str != "":
+                role_prompt = f"\n当前文本的说话人: {role}\n"
+            role_personality_prompt = self.build_role_personality_prompt(role)
+            cached = (role_prompt + role_personality_prompt, self.current_role_personality)
+            self._role_prompt_cache[key] = cached
+        self.current_role_personality = cached[1]
+        return cached[0]
+
+    def get_system_prompt(self, target_language):
+        system_prompt = self._system_prompt_cache.get(target_language)
+        if system_prompt is None:
+            system_prompt = f"你是一名专业的{target_language}翻译专家，擅长游戏本地化、UI界面翻译和角色文案翻译。你正在进行中文到{target_language}的翻译工作。请确保术语一致性和风格统一，并根据角色特点调整翻译风格。"
+            self._system_prompt_cache[target_language] = system_prompt
+        return system_prompt
+
+    def _post_chat_completion(self, system_content, prompt, max_tokens=None):
+        """发送一次 chat/completions 请求并返回回复文本，同时记录 Token 用量"""
         data = {
             "model": self.model,
             "messages": [
                 {
                     "role": "system",
-                    "content": f"你是一名专业的{target_language}翻译专家，擅长游戏本地化、UI界面翻译和角色文案翻译。你正在进行中文到{target_language}的翻译工作。请确保术语一致性和风格统一，并根据角色特点调整翻译风格。"
+                    "content": system_content
                 },
                 {
                     "role": "user",
@@ -443,22 +614,293 @@ class MultiAPIExcelTranslator:
                 }
             ],
             "temperature": 0.2,
-            "max_tokens": 4000
+            "max_tokens": max_tokens or self.max_completion_tokens
         }
-        print(str(prompt))
-        response = requests.post(self.api_url, headers=self.headers, json=data, timeout=60)
-        response.raise_for_status()
-        result = response.json()
-        translated_text = result["choices"][0]["message"]["content"].strip()
+        request_options = {"timeout": 60}
+        if self.stream_responses:
+            data["stream"] = True
+            # 要求服务端在最后一块返回 usage，否则用量统计只能使用本地估算
+            data["stream_options"] = {"include_usage": True}
+            # (连接超时, 读超时)：流式响应的读超时即两块数据之间的最长间隔
+            request_options = {"stream": True, "timeout": (STREAM_CONNECT_TIMEOUT, self.stream_idle_timeout)}
+        if self.debug_prompts:
+            print(str(prompt))
+        if self.rate_limiter is None:
+            response = self.session.post(self.api_url, headers=self.headers, json=data, **request_options)
+        else:
+            counter = self.get_token_counter()
+            self.rate_limiter.acquire(tokens=counter.count(prompt) + counter.count(system_content))
+            try:
+                response = self.session.post(self.api_url, headers=self.headers, json=data, **request_options)
+            except requests.exceptions.RequestException as e:
+                self.rate_limiter.observe_exception(e)
+                raise
+            # 状态码和限流响应头反馈给共享限速器（429 降速 / 连续失败熔断）
+            self.rate_limiter.observe(response.status_code, response.headers)
 
-        translated_text = self.clean_translation(translated_text)
-        # 将翻译结果添加到该语言的独立上下文中
-        self.add_to_context(text, translated_text, role, target_language)
+        if self.stream_responses:
+            content, result = self._read_chat_stream(response)
+        else:
+            response.raise_for_status()
+            result = response.json()
+            content = result["choices"][0]["message"]["content"].strip()
+        self.usage_stats.record_response(result, system_content + prompt, content, self.get_token_counter())
+        return content
+
+    def _read_chat_stream(self, response):
+        """逐块读取流式回复，返回 (回复文本, 含 usage 的结果)；空闲超时或连接中断时抛出 RequestException"""
+        progress = self.stream_progress
+        stream_id = progress.start() if progress is not None else None
+        on_delta = (lambda received: progress.update(stream_id, received)) if progress is not None else None
+        try:
+            with response:
+                response.raise_for_status()
+                reader = read_chat_stream(response.iter_lines(), on_delta)
+                if not reader.complete:
+                    # 代理或服务端提前断开连接：不完整的回复不能当作译文，按网络错误重试
+                    raise requests.exceptions.ChunkedEncodingError("流式回复在结束标志之前中断，回复不完整")
+        except requests.exceptions.RequestException as e:
+            if self.rate_limiter is not None and e.response is None:
+                self.rate_limiter.observe_exception(e)
+            raise
+        finally:
+            if progress is not None:
+                progress.finish(stream_id)
+        return reader.content.strip(), reader.result()
+
+    def plan_batches(self, items, max_rows=20, token_budget=3000):
+        """将 [(id, text, role), ...] 按行数上限和 Token 预算切分为多个批次
+
+        预算按原文字符数估算（中文约一字一 Token，译文长度与原文相当），
+        单行超出预算时独立成批。
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for item in items:
+            item_tokens = len(str(item[1])) * 2 + 20
+            if current and (len(current) >= max_rows or current_tokens + item_tokens > token_budget):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(item)
+            current_tokens += item_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _build_batch_prompt(self, items, target_language, custom_requirements="", context_key=None):
+        context_prompt = self.build_context_prompt(target_language, context_key)
+        term_base_prompt = self.build_term_base_prompt("\n".join(str(text) for _, text, _ in items), target_language)
+        language_requirements = self.get_language_specific_requirements(target_language)
 
-        return translated_text
+        role_personality_prompt = ""
+        seen_roles = set()
+        for _, _, role in items:
+            if not role or pd.isna(role) or str(role).strip() == "" or role in seen_roles:
+                continue
+            seen_roles.add(role)
+            role_personality_prompt += self.build_role_personality_prompt(role)
+
+        rows = [
+            {
+                "id": str(item_id),
+                "role": "" if not role or pd.isna(role) else str(role).strip(),
+                "text": str(text)
+            }
+            for item_id, text, role in items
+        ]
+
+        return f"""
+请将以下多行文本逐行翻译成{target_language}。
+
+## 角色信息：
+{role_personality_prompt}
+
+## {target_language}翻译规范（优先级最低）：
+{language_requirements}
+
+## 用户自定义要求（优先级第一高）：
+{custom_requirements}
+
+{context_prompt}
+
+{term_base_prompt}
+
+## 待翻译文本（JSON 数组，role 为说话人，可能为空）：
+{json.dumps(rows, ensure_ascii=False, indent=1)}
+
+## 重要说明（优先级第二高）：
+1. 每一行独立翻译，不要合并或拆分行，不要遗漏任何 id
+2. 术语库中的特定词汇翻译，如果是人名或者固定特殊名称需要严格采用相同的翻译,但注意如果是一些普通的词汇则看句子翻译不必一定按照术语库来
+3. 如果一个术语有多个候选译名，请根据上下文选择最合适的
+4. 请根据每行说话人的角色性格描述调整翻译风格和语气
+5. 只返回 JSON，不要添加任何解释或代码块标记，格式为：
+{{"translations": [{{"id": "行id", "translation": "{target_language}译文"}}]}}
+"""
+
+    def _parse_batch_response(self, response_text, items):
+        """解析批量翻译的 JSON 回复，返回 {id: 译文}（只包含校验通过的行）"""
+        text = response_text.strip()
+        text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text)
+
+        start = min([i for i in (text.find('{'), text.find('[')) if i != -1], default=-1)
+        if start == -1:
+            return {}
+        try:
+            parsed, _ = json.JSONDecoder().raw_decode(text[start:])
+        except ValueError:
+            return {}
+
+        if isinstance(parsed, dict):
+            parsed = parsed.get("translations", [])
+        if not isinstance(parsed, list):
+            return {}
+
+        originals = {str(item_id): text for item_id, text, _ in items}
+        translations = {}
+        for entry in parsed:
+            if not isinstance(entry, dict):
+                continue
+            item_id = str(entry.get("id", "")).strip()
+            translation = entry.get("translation")
+            if item_id not in originals or not isinstance(translation, str):
+                continue
+            translation = self.clean_translation(translation.strip())
+            if self.is_translation_error(translation, str(originals[item_id])):
+                continue
+            translations[item_id] = translation
+        return translations
+
+    def translate_batch(self, items, target_language, custom_requirements="", context_key=None):
+        """批量翻译：将多行打包进一个请求，要求模型返回 JSON
+
+        items: [(id, text, role), ...]，id 需在批次内唯一
+        返回 {id: 译文}；回复中缺失或格式错误的行回退到逐行翻译（带重试）。
+        """
+        results = {}
+        pending = []
+        memory_keys = {}
+
+        for item_id, text, role in items:
+            if not text or pd.isna(text) or str(text).strip() == "":
+                results[item_id] = text
+                continue
+            if self.translation_memory is not None:
+                memory_key = self.translation_memory.make_key(
+                    text, target_language, role, self.model,
+                    self.build_term_base_prompt(text, target_language), custom_requirements
+                )
+                cached_translation = self.translation_memory.get(memory_key)
+                if cached_translation is not None:
+                    results[item_id] = cached_translation
+                    continue
+                memory_keys[item_id] = memory_key
+            pending.append((item_id, text, role))
+
+        batch_translations = {}
+        if len(pending) > 1:
+            prompt = self._build_batch_prompt(pending, target_language, custom_requirements, context_key)
+            batch_attempts = min(self.max_retries, 3)
+            for attempt in range(batch_attempts):
+                try:
+                    response_text = self._post_chat_completion(self.get_system_prompt(target_language), prompt)
+                    batch_translations = self._parse_batch_response(response_text, pending)
+                    break
+                except Exception as e:
+                    st.warning(f"⚠️ [{target_language}] 批量请求失败 (第 {attempt + 1} 次尝试): {e}")
+                    if attempt < batch_attempts - 1:
+                        time.sleep(self.retry_delay(attempt))
+
+            missing = len(pending) - len(batch_translations)
+            if missing:
+                st.warning(f"⚠️ [{target_language}] 批量回复缺少 {missing}/{len(pending)} 行，改为逐行翻译")
+
+        # 按原顺序写入上下文；缺失的行逐行重试（逐行翻译会自行写入上下文）
+        for item_id, text, role in pending:
+            translation = batch_translations.get(str(item_id))
+            if translation is None:
+                results[item_id] = self.translate_text_with_retry(text, target_language, custom_requirements, role, context_key)
+                continue
+
+            self.add_to_context(text, translation, role, target_language, context_key)
+            if item_id in memory_keys:
+                self.translation_memory.put(memory_keys[item_id], text, target_language, self.model, role, translation)
+            results[item_id] = translation
+
+        return results
+
+    def translate_text(self, text, target_language, custom_requirements="", role=None, context_key=None):
+        return self.translate_text_with_retry(text, target_language, custom_requirements, role, context_key)
+
+    def create_async_client(self, max_concurrency=32, timeout=60):
+        """创建与当前翻译器配置一致的 AsyncChatClient（共享 RateLimiter）"""
+        return AsyncChatClient(
+            self.api_url, self.api_key, self.model, max_concurrency=max_concurrency,
+            timeout=timeout, max_retries=0, rate_limiter=self.rate_limiter,
+            usage_stats=self.usage_stats, stream=self.stream_responses,
+            stream_idle_timeout=self.stream_idle_timeout, stream_progress=self.stream_progress
+        )
+
+    async def translate_text_async(self, client, text, target_language, custom_requirements="", role=None,
+                                   context_key=None):
+        """translate_text 的协程版本，通过 AsyncChatClient 发送请求
+
+        重试等待使用 asyncio.sleep，并发量由 client 的信号量控制；
+        同一 context_key 的调用需由调用方串行 await，以保证上下文顺序。
+        """
+        if not text or pd.isna(text) or str(text).strip() == "":
+            return text
+
+        memory_key, cached_translation = self._lookup_translation_memory(
+            text, target_language, custom_requirements, role, context_key
+        )
+        if cached_translation is not None:
+            return cached_translation
+
+        system_content = self.get_system_prompt(target_language)
+        last_exception = None
+
+        for attempt in range(self.max_retries):
+            try:
+                prompt = self.build_translation_prompt(text, target_language, custom_requirements, role, context_key)
+                messages = [
+                    {"role": "system", "content": system_content},
+                    {"role": "user", "content": prompt}
+                ]
+                translated_text = await client.chat(
+                    messages, model=self.model, max_retries=0,
+                    max_tokens=self.completion_tokens_for(text)
+                )
+                translated_text = self.clean_translation(translated_text)
+
+                if not self.is_translation_error(translated_text, text):
+                    self.add_to_context(text, translated_text, role, target_language, context_key)
+                    if memory_key is not None:
+                        self.translation_memory.put(memory_key, text, target_language, self.model, role, translated_text)
+                    return translated_text
+                else:
+                    st.warning(f"⚠️ [{target_language}] 第 {attempt + 1} 次翻译结果异常，准备重试...")
 
-    def translate_text(self, text, target_language, custom_requirements="", role=None):
-        return self.translate_text_with_retry(text, target_language, custom_requirements, role)
+            except asyncio.CancelledError:
+                raise
+
+            except asyncio.TimeoutError as e:
+                last_exception = e
+                st.warning(f"⚠️ [{target_language}] 请求超时 (第 {attempt + 1} 次尝试)")
+
+            except Exception as e:
+                last_exception = e
+                st.warning(f"⚠️ [{target_language}] API错误 (第 {attempt + 1} 次尝试): {e}")
+
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(self.retry_delay(attempt))
+
+        st.error(f"❌ [{target_language}] 翻译失败，已达到最大重试次数 {self.max_retries}")
+        if last_exception:
+            st.error(f"最后错误: {last_exception}")
+
+        return text
 
     def clean_translation(self, text):
         if text.startswith('"') and text.endswith('"'):
@@ -483,35 +925,18 @@ class MultiAPIExcelTranslator:
         self.context_history = {}
         self.term_dict = {}
         self.term_base_dict = {}
+        self.term_index_dict = {}
         self.role_column = None
         self.current_text_terms = {}
         self.current_role_personality = None
         self.role_mapping = {}
 
     def load_term_base(self, df, source_col, target_col):
-        """加载术语库 - 支持重复术语"""
+        """加载术语库 - 支持重复术语（同一原文多个译文），完全相同的条目只保留一条"""
         try:
-            # 构建术语库列表，支持重复术语
-            self.term_base_list = []
-            missing_count = 0
-
-            for _, row in df.iterrows():
-                source = row[source_col]
-                target = row[target_col]
-
-                if pd.isna(source) or pd.isna(target):
-                    missing_count += 1
-                    continue
-
-                source = str(source).strip()
-                target = str(target).strip()
-
-                if source and target:
-                    # 不再检查重复，直接添加到列表
-                    self.term_base_list.append({
-                        'source': source,
-                        'target': target
-                    })
+            sources, targets, missing_count = _clean_pairs(df[source_col], df[target_col])
+            self.term_base_list = [{'source': s, 'target': t} for s, t in zip(sources, targets)]
+            self.term_index = TermAutomaton.from_sources(sources).with_targets(sources, targets)
 
             st.success(f"✅ 成功加载术语: {len(self.term_base_list)} 条")
             if missing_count > 0:
@@ -528,40 +953,42 @@ class MultiAPIExcelTranslator:
         df: 术语库DataFrame
         source_col: 原文列名
         target_cols_dict: {语言: 列名} 例如 {"英文": "English", "日文": "Japanese"}
+
+        原文列只清洗一次；各语言共用一棵按原文编译的字典树，每个原文只向分词器注册一次。
         """
         try:
             self.term_base_dict = {}
+            self.term_index_dict = {}
 
+            cleaned_source = (_clean_text(df[source_col]), df[source_col].isna().to_numpy())
+
+            language_pairs = {}
             for language, target_col in target_cols_dict.items():
                 if target_col not in df.columns:
                     st.warning(f"⚠️ 术语库中未找到 {language} 对应的列: {target_col}")
                     continue
-
-                self.term_base_dict[language] = []
-                missing_count = 0
-
-                for _, row in df.iterrows():
-                    source = row[source_col]
-                    target = row[target_col]
-
-                    if pd.isna(source) or pd.isna(target):
-                        missing_count += 1
-                        continue
-
-                    source = str(source).strip()
-                    target = str(target).strip()
-
-                    if source and target:
-                        # 将原文添加到分词词典
-                        try:
-                            self.chinese_tokenizer.add_word(source)
-                        except:
-                            pass
-
-                        self.term_base_dict[language].append({
-                            'source': source,
-                            'target': target
-                        })
+                language_pairs[language] = _clean_pairs(
+                    df[source_col], df[target_col], cleaned_source=cleaned_source
+                )
+
+            all_sources = pd.unique(np.concatenate(
+                [sources for sources, _, _ in language_pairs.values()] or [np.empty(0, dtype=object)]
+            ))
+            # 记录注册时的词频，快照重载时可直接 add_word(词, 词频)
+            self.jieba_user_words = []
+            if self.chinese_tokenizer is not None:
+                for source in all_sources:
+                    try:
+                        freq = self.chinese_tokenizer.suggest_freq(source, False)
+                        self.chinese_tokenizer.add_word(source, freq)
+                        self.jieba_user_words.append((source, freq))
+                    except Exception:
+                        pass
+            shared_index = TermAutomaton.from_sources(all_sources)
+
+            for language, (sources, targets, missing_count) in language_pairs.items():
+                self.term_base_dict[language] = [{'source': s, 'target': t} for s, t in zip(sources, targets)]
+                self.term_index_dict[language] = shared_index.with_targets(sources, targets)
 
                 st.success(f"✅ {language} 术语加载成功: {len(self.term_base_dict[language])} 条")
                 if missing_count > 0:
@@ -589,24 +1016,37 @@ class MultiAPIExcelTranslator:
             st.error(traceback.format_exc())
             return False
 
+    def glossary_snapshot(self, key):
+        """把当前已加载的术语库打包为 GlossarySnapshot（不复制，之后不应再修改这些对象）"""
+        return GlossarySnapshot(
+            key,
+            term_base_dict=self.term_base_dict,
+            term_index_dict=self.term_index_dict,
+            term_base_list=self.term_base_list,
+            term_index=self.term_index,
+            jieba_words=self.jieba_user_words
+        )
+
+    def load_glossary_snapshot(self, snapshot):
+        """从预编译快照加载术语库，跳过清洗和编译；快照对象在会话间只读共享"""
+        self.term_base_dict = snapshot.term_base_dict
+        self.term_index_dict = snapshot.term_index_dict
+        self.term_base_list = snapshot.term_base_list
+        self.term_index = snapshot.term_index
+        self.jieba_user_words = snapshot.jieba_words
+        register_jieba_words(snapshot, self.chinese_tokenizer)
+
+        if snapshot.term_base_dict:
+            st.success(f"⚡ 已从术语库快照加载: {snapshot.term_count} 条，覆盖 {len(snapshot.term_base_dict)} 种语言")
+        else:
+            st.success(f"⚡ 已从术语库快照加载: {snapshot.term_count} 条术语")
+        return True
+
     def load_role_personality(self, df, role_col, personality_col):
         try:
-            self.role_personality_dict = {}
-            missing_count = 0
-
-            for _, row in df.iterrows():
-                role = row[role_col]
-                personality = row[personality_col]
-
-                if pd.isna(role) or pd.isna(personality):
-                    missing_count += 1
-                    continue
-
-                role = str(role).strip()
-                personality = str(personality).strip()
-
-                if role and personality:
-                    self.role_personality_dict[role] = personality
+            roles, personalities, missing_count = _clean_pairs(df[role_col], df[personality_col], dedupe=False)
+            # 重复角色以最后一条描述为准（与逐行赋值的结果一致）
+            self.role_personality_dict = dict(zip(roles, personalities))
 
             st.success(f"✅ 成功加载角色性格: {len(self.role_personality_dict)} 条")
             if missing_count > 0:
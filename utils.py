@@ -22,13 +22,8 @@ import concurrent.futures
 import pandas as pd
 import streamlit as st
 import openpyxl
-import jieba
 
-try:
-    from wordcloud import WordCloud
-    HAS_WORDCLOUD = True
-except ImportError:
-    HAS_WORDCLOUD = False
+from tokenizer_cache import get_tokenizer
 
 import xml.etree.ElementTree as ET
 
@@ -91,13 +86,16 @@ class Utils:
 
     @staticmethod
     def generate_wordcloud_img(text_list):
-        if not HAS_WORDCLOUD:
+        # wordcloud（及其依赖的 matplotlib）较重，生成词云时才导入
+        try:
+            from wordcloud import WordCloud
+        except ImportError:
             return None
         if not text_list:
             return None
 
         full_text = " ".join([str(t) for t in text_list if str(t)])
-        cut_text = " ".join(jieba.cut(full_text))
+        cut_text = " ".join(get_tokenizer().cut(full_text))
 
         font_path = Utils.get_chinese_font()
         params = {
@@ -0,0 +1,390 @@
+# xlsx_patch.py - 只改写命中单元格的 .xlsx 替换引擎
+#
+# openpyxl 完整模式加载再保存一个大工作簿，要为每个单元格构造对象并重新生成所有部件，
+# 几十 MB 的文件往返一次要几十秒甚至几分钟，而替换往往只改其中几个单元格。这里直接
+# 修改压缩包中的 XML：
+#   - 在工作表 XML 原文中按 r="B12" 定位目标单元格，只把这几个 <c> 元素换成内联字符串
+#     （保留样式等其他属性），工作表其余字节原样保留
+#   - 共享字符串表只在需要取某个序号的原文时按序号定位，不解析整张表，也不改写
+#   - 新压缩包中未改动的部件直接复制原来的压缩数据，只有改动过的工作表重新压缩
+#   - 写入同目录的临时文件后整体替换原文件；原文件的 inode 不再被写入，备份用硬链接
+#     （或写时复制 reflink）即可，不必复制整个文件
+# 只替换文本单元格（共享字符串、内联字符串、无公式的字符串结果），公式和数字、日期等
+# 单元格不动，工作表中不存在的目标单元格按空单元格跳过。遇到无法直接修改的情况（.xls、
+# 单元格缺少 r 属性、图表工作表等）抛出 UnsupportedWorkbook，patch_cells 自动改用 openpyxl 加载保存。
+
+import os
+import re
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils.cell import get_column_letter
+from openpyxl.utils.exceptions import IllegalCharacterError
+from openpyxl.xml.functions import fromstring
+
+from tokenizer_cache import available_cpus
+from xlsx_stream import IS_TAG, UnsupportedWorkbook, V_TAG, XlsxPackage, _NS, _text_content
+
+PATCH_COMPRESS_LEVEL = 1  # 改动过的工作表重新压缩时的级别：压缩率略低，速度快几倍
+
+F_TAG = _NS + 'f'
+_ROOT_TAG = re.compile(rb"<(?:(\w+):)?(worksheet|sst)\b[^>]*>")
+_CELL_START = re.compile(rb"<(?:(\w+):)?c\s")
+_CELL_OPEN_TAG = re.compile(rb"<(?:\w+:)?c(?=[\s/>])[^>]*>")
+_REF_ATTR = re.compile(rb"""\sr=["']""")  # 与 _find 查找的写法相同（等号两边没有空白）
+_TYPE_ATTR = re.compile(rb"""\st\s*=\s*(?:"[^"]*"|'[^']*')""")
+
+_MASK_ENCRYPTED = 0x01
+_MASK_UTF8 = 0x800
+_FH_FILENAME_LENGTH = 10  # 本地文件头中文件名长度、扩展字段长度的位置（与 zipfile 相同）
+_FH_EXTRA_FIELD_LENGTH = 11
+_ZIP_LIMIT = 0xFFFFFFFF
+
+
+class _SharedStrings:
+    """按序号取共享字符串原文：只按 <si> 切开原文，取值时只解析对应的一段"""
+
+    def __init__(self, data):
+        root = _ROOT_TAG.search(data)
+        if root is None or root.group(2) != b'sst':
+            raise UnsupportedWorkbook("sharedStrings")
+        prefix = root.group(1) + b':' if root.group(1) else b''
+        self._root_open = data[:root.end()]
+        self._root_close = b'</' + prefix + b'sst>'
+        self._si_open = b'<' + prefix + b'si'
+        # 切开后第一段是第一个 <si> 之前的空白，之后每段是一个去掉开头 "<si" 的 <si> 元素
+        self._items = data[root.end():data.rfind(self._root_close)].split(self._si_open)[1:]
+
+    def __getitem__(self, idx):
+        node = fromstring(self._root_open + self._si_open + self._items[idx] + self._root_close)[0]
+        # 与 openpyxl.reader.strings.read_string_table 相同
+        return _text_content(node).replace('x005F_', '')
+
+
+def _cell_xml_text(text):
+    if ILLEGAL_CHARACTERS_RE.search(text):
+        raise IllegalCharacterError(f"{text} cannot be used in worksheets.")
+    # \r 必须写成字符引用，否则读取时会被 XML 解析器规范化为 \n
+    return escape(text).replace('\r', '&#13;').encode('utf-8')
+
+
+class _SheetPatcher:
+    """在一张工作表的 XML 原文中定位并改写单元格"""
+
+    def __init__(self, data, shared_strings):
+        root = _ROOT_TAG.search(data)
+        if root is None or root.group(2) != b'worksheet':
+            raise UnsupportedWorkbook("worksheet")
+        self.data = data
+        self._shared_strings = shared_strings
+        self._root_open = data[:root.end()]
+        self._root_close = b'</' + (root.group(1) + b':' if root.group(1) else b'') + b'worksheet>'
+        self.edits = []
+        self._pos = 0
+        self._refs_complete = None
+
+    def _all_cells_have_refs(self):
+        """工作表中的单元格是否都带有 _find 能定位的 r="…" 属性（只在找不到目标单元格时检查一次）
+
+        r = "A1" 这类等号两边带空白的写法也算缺少，交给 openpyxl，以免目标单元格被当作不存在而跳过。
+        """
+        if self._refs_complete is None:
+            self._refs_complete = all(_REF_ATTR.search(tag.group())
+                                      for tag in _CELL_OPEN_TAG.finditer(self.data))
+        return self._refs_complete
+
+    def _find(self, ref):
+        """返回 (元素起点, 起始标签终点, 元素终点, 名称空间前缀)，单元格不存在时返回 None
+
+        目标多按行列顺序给出，从上次的位置往后找。
+        """
+        data = self.data
+        for start_at in (self._pos, 0):
+            for quote in (b'"', b"'"):
+                needle = b'r=' + quote + ref + quote
+                pos = data.find(needle, start_at)
+                while pos != -1:
+                    tag_start = data.rfind(b'<', 0, pos)
+                    tag = _CELL_START.match(data, tag_start)
+                    gt = data.find(b'>', pos)
+                    if (tag is not None and data[pos - 1:pos].isspace()
+                            and data.find(b'>', tag_start, pos) == -1 and gt != -1):
+                        self._pos = gt
+                        prefix = tag.group(1) + b':' if tag.group(1) else b''
+                        if data[gt - 1:gt] == b'/':
+                            return tag_start, gt + 1, gt + 1, prefix
+                        close_tag = b'</' + prefix + b'c>'
+                        close = data.find(close_tag, gt)
+                        if close == -1:
+                            raise UnsupportedWorkbook("cell")
+                        return tag_start, gt + 1, close + len(close_tag), prefix
+                    pos = data.find(needle, pos + 1)
+        # 有单元格省略了 r 属性（或写法不同）时无法按坐标定位，交给 openpyxl；否则单元格确实不存在
+        # （坐标来自过期的索引或扫描后文件被修改），按空单元格跳过
+        if not self._all_cells_have_refs():
+            raise UnsupportedWorkbook(f"cell {ref.decode()}")
+        return None
+
+    def cell_text(self, element):
+        """文本单元格的值（与 openpyxl 完整模式读出的 cell.value 相同），其他单元格返回 None"""
+        cell = fromstring(self._root_open + element + self._root_close)[0]
+        if cell.find(F_TAG) is not None:
+            return None
+        data_type = cell.get('t', 'n')
+        if data_type == 's':
+            value = cell.findtext(V_TAG)
+            return self._shared_strings()[int(value)] if value is not None else None
+        if data_type == 'inlineStr':
+            child = cell.find(IS_TAG)
+            return _text_content(child) if child is not None else None
+        if data_type == 'str':
+            return cell.findtext(V_TAG)
+        return None
+
+    def patch(self, row, col, transform):
+        """对单元格文本执行 transform，返回 (原文, 新文本)；不是文本单元格或未改变时返回 None"""
+        ref = f"{get_column_letter(col)}{row}".encode()
+        found = self._find(ref)
+        if found is None:
+            return None
+        start, open_end, end, prefix = found
+        element = self.data[start:end]
+        if open_end == end:  # <c .../> 空单元格
+            return None
+        text = self.cell_text(element)
+        if text is None:
+            return None
+        new_text = transform(text)
+        if new_text is None or new_text == text:
+            return None
+
+        open_tag = self.data[start:open_end].rstrip(b'>').rstrip()
+        open_tag = _TYPE_ATTR.sub(b'', open_tag) + b' t="inlineStr">'
+        self.edits.append((start, end, b''.join([
+            open_tag, b'<', prefix, b'is><', prefix, b't xml:space="preserve">', _cell_xml_text(new_text),
+            b'</', prefix, b't></', prefix, b'is></', prefix, b'c>',
+        ])))
+        return text, new_text
+
+    def result(self):
+        pieces = []
+        last = 0
+        for start, end, replacement in sorted(self.edits):
+            pieces.append(self.data[last:start])
+            pieces.append(replacement)
+            last = end
+        pieces.append(self.data[last:])
+        return b''.join(pieces)
+
+
+def _dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _write_entry(out, name, compress_type, crc, compressed, file_size, date_time, external_attr, central):
+    """写一个压缩包条目（本地文件头 + 压缩数据），中央目录记录追加到 central"""
+    if file_size > _ZIP_LIMIT or len(compressed) > _ZIP_LIMIT or out.tell() > _ZIP_LIMIT:
+        raise UnsupportedWorkbook("zip64")
+    try:
+        filename = name.encode('ascii')
+        flags = 0
+    except UnicodeEncodeError:
+        filename = name.encode('utf-8')
+        flags = _MASK_UTF8
+    dos_date, dos_time = _dos_datetime(date_time)
+    offset = out.tell()
+    out.write(struct.pack(zipfile.structFileHeader, zipfile.stringFileHeader, 20, 0, flags, compress_type,
+                          dos_time, dos_date, crc, len(compressed), file_size, len(filename), 0))
+    out.write(filename)
+    out.write(compressed)
+    central.append(struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir, 20, 0, 20, 0, flags,
+                               compress_type, dos_time, dos_date, crc, len(compressed), file_size,
+                               len(filename), 0, 0, 0, 0, external_attr, offset) + filename)
+
+
+def _raw_data(src, info):
+    """读出条目原来的压缩数据（不解压）"""
+    if info.flag_bits & _MASK_ENCRYPTED:
+        raise UnsupportedWorkbook("encrypted")
+    src.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, src.read(zipfile.sizeFileHeader))
+    if header[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad magic number for file header: {info.filename}")
+    src.seek(header[_FH_FILENAME_LENGTH] + header[_FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+    return src.read(info.compress_size)
+
+
+def _compress(data):
+    compressor = zlib.compressobj(PATCH_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _write_package(out, file_path, infos, patched):
+    """按原顺序写出新压缩包：patched 中的部件重新压缩，其余部件复制原压缩数据"""
+    # 改动过的部件可能有好几张大表，zlib 压缩时释放 GIL，多线程并行压缩
+    workers = min(len(patched), available_cpus())
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            compressed = dict(zip(patched, executor.map(_compress, patched.values())))
+    else:
+        compressed = {name: _compress(data) for name, data in patched.items()}
+
+    central = []
+    with open(file_path, 'rb') as src:
+        for info in infos:
+            data = patched.get(info.filename)
+            if data is None:
+                _write_entry(out, info.filename, info.compress_type, info.CRC, _raw_data(src, info),
+                             info.file_size, info.date_time, info.external_attr, central)
+            else:
+                _write_entry(out, info.filename, zipfile.ZIP_DEFLATED, zlib.crc32(data), compressed[info.filename],
+                             len(data), info.date_time, info.external_attr, central)
+
+    start = out.tell()
+    for record in central:
+        out.write(record)
+    if len(central) > 0xFFFF or out.tell() > _ZIP_LIMIT:
+        raise UnsupportedWorkbook("zip64")
+    out.write(struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0, len(central), len(central),
+                          out.tell() - start, start, 0))
+
+
+def link_backup(file_path, backup_path):
+    """为即将被整体替换的文件创建备份：优先硬链接，其次 reflink，最后才完整复制
+
+    调用方随后用新文件替换原路径（os.replace），原 inode 保持不变，硬链接即是一份完整的备份。
+    返回使用的方式 'hardlink' / 'reflink' / 'copy'。
+    """
+    try:
+        os.link(file_path, backup_path)
+        return 'hardlink'
+    except OSError:
+        pass
+
+    try:
+        import fcntl
+        FICLONE = 0x40049409
+        with open(file_path, 'rb') as src, open(backup_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(file_path, backup_path)
+        return 'reflink'
+    except (ImportError, OSError):
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
+
+    shutil.copy2(file_path, backup_path)
+    return 'copy'
+
+
+def _replace_file(file_path, write, backup_path=None):
+    """write(文件对象) 写出新内容到同目录临时文件，再整体替换原文件（先创建备份）"""
+    file_path = str(file_path)
+    folder, name = os.path.split(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            write(out)
+        shutil.copymode(file_path, tmp_path)
+        if backup_path:
+            link_backup(file_path, backup_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _group_cells(cells):
+    """去重并按 工作表 → (行, 列) 排序"""
+    grouped = {}
+    for sheet_name, row, col in cells:
+        grouped.setdefault(sheet_name, set()).add((int(row), int(col)))
+    return {sheet_name: sorted(targets) for sheet_name, targets in grouped.items()}
+
+
+def _patch_xml(file_path, grouped, transform, backup_path):
+    package = XlsxPackage(file_path)
+    try:
+        sheet_parts = dict(package.sheets)
+        shared_strings = None
+
+        def get_shared_strings():
+            nonlocal shared_strings
+            if shared_strings is None:
+                if package.shared_strings_path is None:
+                    raise UnsupportedWorkbook("sharedStrings")
+                shared_strings = _SharedStrings(package.read_part(package.shared_strings_path))
+            return shared_strings
+
+        changes = []
+        patched = {}
+        for sheet_name, targets in grouped.items():
+            if sheet_name not in sheet_parts:
+                raise UnsupportedWorkbook(f"sheet {sheet_name}")
+            part = sheet_parts[sheet_name]
+            patcher = _SheetPatcher(package.read_part(part), get_shared_strings)
+            for row, col in targets:
+                change = patcher.patch(row, col, transform)
+                if change is not None:
+                    changes.append((sheet_name, row, col) + change)
+            if patcher.edits:
+                patched[part] = patcher.result()
+        infos = package.archive.infolist()
+    finally:
+        # 替换原文件前必须关闭：Windows 上原文件仍有打开的句柄时 os.replace 会失败
+        # （_write_package 自己重新打开原文件复制压缩数据）
+        package.close()
+
+    if patched:
+        _replace_file(file_path, lambda out: _write_package(out, file_path, infos, patched), backup_path)
+    return changes
+
+
+def _patch_openpyxl(file_path, grouped, transform, backup_path):
+    """无法直接修改 XML 时的后备方案：openpyxl 完整加载，替换规则相同，只保存一次"""
+    changes = []
+    wb = openpyxl.load_workbook(file_path, keep_vba=Path(file_path).suffix.lower() == '.xlsm')
+    try:
+        for sheet_name, targets in grouped.items():
+            ws = wb[sheet_name]
+            for row, col in targets:
+                cell = ws.cell(row=row, column=col)
+                if cell.data_type == 'f' or not isinstance(cell.value, str):
+                    continue
+                text = cell.value
+                new_text = transform(text)
+                if new_text is None or new_text == text:
+                    continue
+                cell.value = new_text
+                changes.append((sheet_name, row, col, text, new_text))
+
+        if changes:
+            _replace_file(file_path, wb.save, backup_path)
+    finally:
+        wb.close()
+    return changes
+
+
+def patch_cells(file_path, cells, transform, backup_path=None):
+    """对工作簿中指定的文本单元格执行 transform(原文) -> 新文本，只写一次文件
+
+    cells 为 [(工作表, 行, 列), ...]（可重复，每个单元格只处理一次）；transform 返回 None
+    或原文表示不修改。有修改时先在 backup_path 创建备份（硬链接优先）再替换原文件。
+    返回 [(工作表, 行, 列, 原文, 新文本), ...]。
+    """
+    grouped = _group_cells(cells)
+    if not grouped:
+        return []
+    try:
+        return _patch_xml(file_path, grouped, transform, backup_path)
+    except UnsupportedWorkbook:
+        return _patch_openpyxl(file_path, grouped, transform, backup_path)
@@ -0,0 +1,350 @@
+# xlsx_stream.py - 直接读取 .xlsx 压缩包中的 XML 扫描单元格（不经过 openpyxl 对象模型）
+#
+# 只为搜索而打开工作簿时，openpyxl 为每个单元格构造字典 / 单元格对象是多余的开销。
+# 这里只借用 openpyxl 解析工作簿级的小文件（[Content_Types].xml、workbook.xml、styles.xml），
+# 共享字符串表自己解析一次并预先匹配，工作表 XML 用 iterparse 流式解析：
+#   - 共享字符串单元格只需查“命中的字符串序号”集合，不再逐格匹配文本
+#   - 搜索词含有数字 / 日期 / 布尔值文本中不可能出现的字符（如中日文）时，只有字符串单元格
+#     可能命中；共享字符串表中没有命中、工作表 XML 中也找不到该词（内联字符串等）时，整张表不解析
+#
+# 行列编号、空行填充、<dimension> 截断、数字 / 日期转换与 openpyxl 只读模式
+# （read_only=True 时 iter_rows(values_only=True) 的遍历）完全一致。遇到无法保证一致的情况
+# （图表工作表、data_only=False 时含公式的表等）抛出 UnsupportedWorkbook，由调用方改用 openpyxl。
+
+import posixpath
+import re
+import zipfile
+from io import BytesIO
+from xml.etree.ElementTree import iterparse
+
+from openpyxl.packaging.manifest import Manifest
+from openpyxl.reader.excel import SUPPORTED_FORMATS, _find_workbook_part
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
+from openpyxl.packaging.workbook import WorkbookPackage
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH, from_excel, from_ISO8601
+from openpyxl.worksheet._reader import _cast_number
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, ARC_STYLE, SHARED_STRINGS, SHEET_MAIN_NS
+from openpyxl.xml.functions import fromstring
+
+from excel_index import fold_text
+
+_NS = '{%s}' % SHEET_MAIN_NS
+SI_TAG = _NS + 'si'
+T_TAG = _NS + 't'
+R_TAG = _NS + 'r'
+V_TAG = _NS + 'v'
+IS_TAG = _NS + 'is'
+ROW_TAG = _NS + 'row'
+DIMENSION_TAG = _NS + 'dimension'
+
+# 数字、日期、时间间隔、布尔值转成文本后可能出现的全部字符（折叠大小写后比较）
+_VALUE_CHARS = set(fold_text("0123456789+-.:, eE infinity nan days TrueFalse #VALUE!"))
+# 工作表中可能含有非共享字符串文本的单元格类型（内联字符串、公式字符串结果、错误值）
+_TEXT_CELL_TYPES = re.compile(rb"""\bt=["'](?:inlineStr|str|e)["']""")
+_FORMULA = re.compile(rb"<(?:\w+:)?f[\s>/]")
+_TAG = re.compile(rb"<[^>]*>")
+# 字符引用（&#...;）、CDATA、XML 转义字符、会被 XML 解析器规范化的 \r 和共享字符串中会被删除的 x005F_
+# 都使 XML 原文与单元格文本不再逐字对应，此时不做原文预筛
+_XML_SPECIAL = set('&<>"\'\r')
+
+
+class UnsupportedWorkbook(Exception):
+    """无法保证与 openpyxl 结果一致，应改用 openpyxl 读取"""
+
+
+def _literals(literal):
+    return (literal,) if isinstance(literal, str) else tuple(literal)
+
+
+def values_may_match(literal):
+    """搜索词是否可能出现在数字 / 日期 / 布尔值转成的文本中（literal 为 None 时无法判断，按可能处理）
+
+    literal 也可以是多个搜索词，任意一个可能出现即为 True。
+    """
+    return literal is None or any(set(fold_text(term)) <= _VALUE_CHARS for term in _literals(literal))
+
+
+def _literal_finder(literal):
+    """返回 may_contain(XML 字节)：去掉标签后的文本中找不到搜索词（不区分大小写）时为 False
+
+    去掉标签后相邻单元格 / 富文本分段的文本连在一起，只会多出候选，不会漏掉真正的匹配。
+    literal 为多个搜索词时任意一个可能出现即为 True；有搜索词无法在 XML 原文中直接查找时返回 None。
+    """
+    if literal is None:
+        return None
+    terms = _literals(literal)
+    if not terms or not all(terms) or any(_XML_SPECIAL.intersection(term) for term in terms):
+        return None
+    regex = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    lowered = [term.lower() for term in terms]
+
+    def may_contain(data):
+        if b"&#" in data or b"\r" in data or b"x005F_" in data or b"<![CDATA[" in data:
+            return True
+        head = data[:100].lower()
+        if head[:2] in (b"\xff\xfe", b"\xfe\xff") or (b"encoding=" in head and b"utf-8" not in head):
+            return True
+        text = _TAG.sub(b"", data).decode('utf-8', errors='replace')
+        if regex.search(text) is not None:
+            return True
+        text = text.lower()
+        return any(term in text for term in lowered)
+
+    return may_contain
+
+
+def _text_content(node):
+    """与 openpyxl Text.content 相同：<t> 加上各 <r> 中的 <t>，不含注音 <rPh>"""
+    snippets = []
+    plain = node.find(T_TAG)
+    if plain is not None and plain.text is not None:
+        snippets.append(plain.text)
+    for run in node.iterfind(R_TAG):
+        t = run.find(T_TAG)
+        if t is not None and t.text is not None:
+            snippets.append(t.text)
+    return "".join(snippets)
+
+
+def read_shared_strings(source):
+    """读取共享字符串表，结果与 openpyxl.reader.strings.read_string_table 一致"""
+    strings = []
+    for _, node in iterparse(source):
+        if node.tag == SI_TAG:
+            strings.append(_text_content(node).replace('x005F_', ''))
+            node.clear()
+    return strings
+
+
+class XlsxPackage:
+    """.xlsx 压缩包的工作簿级信息：工作表顺序与路径、共享字符串、日期格式、日期纪元"""
+
+    def __init__(self, file_path):
+        if posixpath.splitext(str(file_path))[1].lower() not in SUPPORTED_FORMATS:
+            raise UnsupportedWorkbook(file_path)
+        self.archive = zipfile.ZipFile(file_path)
+        self._date_formats = None
+        self._timedelta_formats = None
+        try:
+            self.valid_files = set(self.archive.namelist())
+            manifest = Manifest.from_tree(fromstring(self.archive.read(ARC_CONTENT_TYPES)))
+
+            ct = manifest.find(SHARED_STRINGS)
+            self.shared_strings_path = ct.PartName[1:] if ct is not None else None
+
+            # 与 openpyxl WorkbookParser.parse / find_sheets 相同，但不创建 Workbook 对象
+            workbook_part = _find_workbook_part(manifest).PartName[1:]
+            package = WorkbookPackage.from_tree(fromstring(self.archive.read(workbook_part)))
+            self.epoch = CALENDAR_MAC_1904 if package.properties.date1904 else WINDOWS_EPOCH
+            rels = get_dependents(self.archive, get_rels_path(workbook_part)).to_dict()
+
+            self.sheets = []
+            for sheet in package.sheets:
+                if not sheet.id:
+                    continue
+                rel = rels[sheet.id]
+                if rel.target not in self.valid_files:
+                    continue
+                if "chartsheet" in rel.Type:
+                    raise UnsupportedWorkbook("chartsheet")
+                self.sheets.append((sheet.name, rel.target))
+        except Exception:
+            self.archive.close()
+            raise
+
+    @property
+    def sheet_names(self):
+        return [name for name, _ in self.sheets]
+
+    def _load_number_formats(self):
+        self._date_formats = set()
+        self._timedelta_formats = set()
+        if ARC_STYLE in self.valid_files:
+            stylesheet = Stylesheet.from_tree(fromstring(self.archive.read(ARC_STYLE)))
+            if stylesheet.cell_styles:
+                self._date_formats = stylesheet.date_formats
+                self._timedelta_formats = stylesheet.timedelta_formats
+
+    @property
+    def date_formats(self):
+        """日期格式的样式序号集合（首次转换数字单元格时才解析 styles.xml）"""
+        if self._date_formats is None:
+            self._load_number_formats()
+        return self._date_formats
+
+    @property
+    def timedelta_formats(self):
+        if self._timedelta_formats is None:
+            self._load_number_formats()
+        return self._timedelta_formats
+
+    def read_part(self, path):
+        return self.archive.read(path)
+
+    def read_shared_strings(self):
+        if self.shared_strings_path is None:
+            return []
+        with self.archive.open(self.shared_strings_path) as src:
+            return read_shared_strings(src)
+
+    def close(self):
+        self.archive.close()
+
+
+_column_cache = {}
+
+
+def _column_index(coordinate):
+    letters = coordinate.rstrip("0123456789")
+    column = _column_cache.get(letters)
+    if column is None:
+        if not (letters.isascii() and letters.isalpha() and len(letters) <= 3):
+            return coordinate_to_tuple(coordinate)[1]
+        column = _column_cache[letters] = column_index_from_string(letters.upper())
+    return column
+
+
+def _row_values(row, shared_strings, package, keep_cell):
+    """解析一行，返回 [(列, 值), ...]；与 openpyxl WorkSheetParser.parse_cell（data_only）一致
+
+    keep_cell(类型, <v> 文本) 为 False 的单元格跳过转换（值记为 None）。
+    """
+    cells = []
+    col_counter = 0
+    for element in row:
+        data_type = element.get('t', 'n')
+        coordinate = element.get('r')
+        if coordinate:
+            col_counter = _column_index(coordinate)
+        else:
+            col_counter += 1
+
+        if data_type == "inlineStr":
+            value = None
+            child = element.find(IS_TAG)
+            if child is not None:
+                value = _text_content(child)
+        else:
+            value = element.findtext(V_TAG, None) or None
+            if value is None or not keep_cell(data_type, value):
+                value = None
+            elif data_type == 'n':
+                value = _cast_number(value)
+                style_id = element.get('s', 0)
+                if style_id:
+                    style_id = int(style_id)
+                if style_id in package.date_formats:
+                    try:
+                        value = from_excel(value, package.epoch, timedelta=style_id in package.timedelta_formats)
+                    except (OverflowError, ValueError):
+                        value = "#VALUE!"
+            elif data_type == 's':
+                value = shared_strings[int(value)]
+            elif data_type == 'b':
+                value = bool(int(value))
+            elif data_type == 'd':
+                value = from_ISO8601(value)
+        cells.append((col_counter, value))
+    return cells
+
+
+def _iter_sheet_cells(data, shared_strings, package, keep_cell):
+    """按 openpyxl 只读模式 iter_rows(values_only=True) 的规则产出 (行, 列, 值)"""
+    max_row = max_col = None
+    seen_row = False
+    row_counter = 0
+    counter = 1  # openpyxl _cells_by_row 中下一行的编号
+    for _, element in iterparse(BytesIO(data)):
+        tag = element.tag
+        # openpyxl 只认 <sheetData> 之前的 <dimension>
+        if tag == DIMENSION_TAG and not seen_row:
+            _, _, max_col, max_row = range_boundaries(element.get('ref'))
+        elif tag == ROW_TAG:
+            seen_row = True
+            r = element.get('r')
+            if r is not None:
+                try:
+                    row_counter = int(r)
+                except ValueError:
+                    value = float(r)
+                    if not value.is_integer():
+                        raise
+                    row_counter = int(value)
+            else:
+                row_counter += 1
+
+            if max_row is not None and row_counter > max_row:
+                break
+            if counter <= row_counter:
+                cells = _row_values(element, shared_strings, package, keep_cell)
+                counter = row_counter + 1
+                if cells:
+                    last = max_col or cells[-1][0]
+                    by_column = {}
+                    for column, value in cells:
+                        if 1 <= column <= last:
+                            by_column[column] = value
+                    for column in sorted(by_column):
+                        if by_column[column] is not None:
+                            yield row_counter, column, by_column[column]
+            element.clear()
+
+
+def scan_xlsx(file_path, match, data_only=True, literal=None):
+    """扫描 .xlsx，返回 (工作表名列表, [(工作表序号, 行, 列, 文本, 匹配位置), ...])
+
+    match(text) 未命中时返回 None；literal 为搜索词原文（多组搜索词时为元组），用于预筛不可能命中的
+    共享字符串表、工作表和单元格。结果与 excel_scan.scan_workbook（openpyxl 只读模式）相同。
+    """
+    package = XlsxPackage(file_path)
+    try:
+        may_contain = _literal_finder(literal)
+        check_values = values_may_match(literal)
+
+        # data_only=False 时含公式的工作簿交给 openpyxl，先检查以免白白解析共享字符串表
+        sheet_data = None
+        if not data_only:
+            sheet_data = [package.read_part(sheet_path) for _, sheet_path in package.sheets]
+            if any(_FORMULA.search(data) for data in sheet_data):
+                raise UnsupportedWorkbook("formula")
+
+        # 共享字符串表的原文中找不到搜索词时不必解析，所有共享字符串单元格都不会命中
+        shared_strings = []
+        shared_hits = {}
+        if package.shared_strings_path is not None and (
+                may_contain is None or may_contain(package.read_part(package.shared_strings_path))):
+            shared_strings = package.read_shared_strings()
+            for idx, text in enumerate(shared_strings):
+                spans = match(text)
+                if spans is not None:
+                    shared_hits[idx] = spans
+        count = len(shared_strings)
+
+        def keep_cell(data_type, value):
+            if data_type == 's':
+                # 越界的序号照常交给转换步骤抛出异常，与 openpyxl 一致（未解析共享字符串表时不检查）
+                idx = int(value)
+                if -count <= idx < 0:
+                    return idx + count in shared_hits
+                return idx in shared_hits or (count > 0 and idx >= count)
+            return check_values or data_type in ('str', 'e')
+
+        hits = []
+        for sheet_idx, (_, sheet_path) in enumerate(package.sheets):
+            data = sheet_data[sheet_idx] if sheet_data is not None else package.read_part(sheet_path)
+            # 共享字符串表没有命中、数字等单元格也不可能命中时，只有直接写在工作表中的文本
+            # （内联字符串、公式字符串结果、错误值）可能命中
+            if not shared_hits and not check_values and (
+                    not _TEXT_CELL_TYPES.search(data) or (may_contain is not None and not may_contain(data))):
+                continue
+
+            for row_idx, col_idx, value in _iter_sheet_cells(data, shared_strings, package, keep_cell):
+                text = str(value)
+                spans = match(text)
+                if spans is not None:
+                    hits.append((sheet_idx, row_idx, col_idx, text, spans))
+        return package.sheet_names, hits
+    finally:
+        package.close()